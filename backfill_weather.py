@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backfill historical hourly weather from the Open-Meteo archive API.
+The date range is split into chunks per town batch which run on a worker
+pool; completed chunks are recorded in a checkpoint table so an interrupted
+backfill resumes where it stopped. Results are bulk-loaded into the weather table
+and the hourly and daily rollups of every chunk are recomputed.
+
+Usage:
+    python backfill_weather.py --start 2020-01-01 --end 2024-12-31
+    python backfill_weather.py --start 2020-01-01 --end 2024-12-31 --rebuild-rollups
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, datetime, timedelta
+from pymysql import Error
+import openmeteo_client
+import weather_data_version
+import weather_rollups
+import weather_variables
+from fetch_forecast_from_openmeteo import fetch_hourly_batch, hourly_columns
+from fetch_weather_from_openmeteo import (
+    ALLOW_POST, BATCH_SIZE, FETCH_MAX_WORKERS, WEATHER_TABLE,
+    create_connection, create_weather_table, get_all_towns, insert_chunk_rows, max_batch_for_url,
+    plan_grid_cells, weather_code_to_description, weather_row_columns
+)
+from weather_loader import load_chunks, select_loader
+from weather_parser import WeatherColumns
+
+# Checkpoint table recording completed chunks
+CHECKPOINT_TABLE = os.getenv('DB_BACKFILL_CHECKPOINT_TABLE', 'weather_backfill_checkpoint')
+BACKFILL_CHUNK_DAYS = int(os.getenv('BACKFILL_CHUNK_DAYS', 31))
+
+ARCHIVE_VARIABLES = weather_variables.archive_profile()
+HOURLY_VARIABLES = weather_variables.api_parameter(ARCHIVE_VARIABLES)
+
+def create_checkpoint_table(connection):
+    """Create the checkpoint table for completed backfill chunks."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{CHECKPOINT_TABLE}` (
+            chunk_key CHAR(40) PRIMARY KEY,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            town_count INT NOT NULL,
+            rows_written INT NOT NULL,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        connection.commit()
+        print(f"✅ Table '{CHECKPOINT_TABLE}' created or already exists.")
+    finally:
+        cursor.close()
+
+def completed_chunks(connection):
+    """Keys of all chunks finished by earlier runs."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT chunk_key FROM `{CHECKPOINT_TABLE}`")
+        return {row['chunk_key'] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def record_chunk(connection, chunk, rows_written):
+    """Mark a chunk as completed."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"INSERT INTO `{CHECKPOINT_TABLE}` (chunk_key, start_date, end_date, town_count, rows_written) "
+            f"VALUES (%s, %s, %s, %s, %s) "
+            f"ON DUPLICATE KEY UPDATE rows_written = VALUES(rows_written), completed_at = CURRENT_TIMESTAMP",
+            (chunk['key'], chunk['start'], chunk['end'], chunk['town_count'], rows_written)
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+
+def archive_params(towns_data, start, end):
+    """Build the Open-Meteo archive parameters for a batch of towns and date range."""
+    return {
+        'latitude': ','.join(str(town['latitude']) for town in towns_data),
+        'longitude': ','.join(str(town['longitude']) for town in towns_data),
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'hourly': HOURLY_VARIABLES,
+        'timeformat': 'unixtime',
+        'timezone': 'GMT'
+    }
+
+def plan_chunks(cells, start, end, chunk_days=BACKFILL_CHUNK_DAYS):
+    """
+    Split the backfill into (town batch, date range) chunks. The key of a
+    chunk depends only on its town ids and dates, so the same plan is
+    produced again on resume.
+    """
+    cells = sorted(cells, key=lambda cell: cell['id'])
+    days = min(chunk_days, (end - start).days + 1)
+    limit = min(BATCH_SIZE, openmeteo_client.max_locations_per_request(len(ARCHIVE_VARIABLES), days))
+    batches = []
+    position = 0
+    while position < len(cells):
+        batch_size = limit if ALLOW_POST else max_batch_for_url(
+            cells, position, limit,
+            build_params=lambda towns_data: archive_params(towns_data, start, end),
+            url=openmeteo_client.ARCHIVE_API_URL)
+        batches.append(cells[position:position + batch_size])
+        position += batch_size
+
+    chunks = []
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=chunk_days - 1))
+        for batch in batches:
+            town_ids = sorted(town_id for cell in batch for town_id in cell['town_ids'])
+            key_source = f"{chunk_start}:{chunk_end}:{','.join(map(str, town_ids))}"
+            chunks.append({
+                'key': hashlib.sha1(key_source.encode()).hexdigest(),
+                'start': chunk_start,
+                'end': chunk_end,
+                'cells': batch,
+                'town_count': len(town_ids)
+            })
+        chunk_start = chunk_end + timedelta(days=1)
+    return chunks
+
+def weather_rows(towns_data, locations):
+    """
+    Turn archive hourly arrays into weather table rows (town_id, timestamp, ...,
+    description, weather_main); the compact layout has scaled values and no descriptions.
+    """
+    compact = weather_variables.WEATHER_COMPACT
+    town_ids, timestamps, columns = hourly_columns(towns_data, locations, ARCHIVE_VARIABLES, compact)
+    if compact:
+        return list(zip(town_ids, timestamps, *columns))
+    by_column = dict(zip((variable.column for variable in ARCHIVE_VARIABLES), columns))
+    codes = by_column.get('weather_code', [None] * len(town_ids))
+    descriptions = {code: weather_code_to_description(code) for code in set(codes)}
+    descriptions_column = [descriptions[code][0] for code in codes]
+    main_column = [descriptions[code][1] for code in codes]
+    return list(zip(town_ids, timestamps, *columns, descriptions_column, main_column))
+
+def fetch_chunk(chunk, limiter):
+    """Fetch one chunk from the archive API, respecting the shared quota."""
+    days = (chunk['end'] - chunk['start']).days + 1
+
+    def build_params(towns_data):
+        return archive_params(towns_data, chunk['start'], chunk['end'])
+
+    openmeteo_client.charge(openmeteo_client.ARCHIVE_API_URL, build_params(chunk['cells']),
+                            len(ARCHIVE_VARIABLES), days, limiter=limiter)
+    return fetch_hourly_batch(chunk['cells'], openmeteo_client.ARCHIVE_API_URL, build_params)
+
+def run_backfill(connection, chunks, workers=FETCH_MAX_WORKERS):
+    """
+    Fetch chunks on a worker pool and bulk-load each result as it arrives,
+    checkpointing every chunk after its rows are committed.
+    Returns (chunks completed, chunks failed, rows written).
+    """
+    limiter = openmeteo_client.get_rate_limiter()
+    columns = weather_row_columns(ARCHIVE_VARIABLES)
+    chunk_rows = insert_chunk_rows(connection, WeatherColumns(ARCHIVE_VARIABLES))
+    done_count = failed_count = rows_total = 0
+    pending = iter(chunks)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Only a few chunks in flight, so memory stays bounded for long ranges
+            while len(in_flight) < workers * 2:
+                chunk = next(pending, None)
+                if chunk is None:
+                    break
+                in_flight[executor.submit(fetch_chunk, chunk, limiter)] = chunk
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                chunk = in_flight.pop(future)
+                label = f"{chunk['start']}..{chunk['end']} ({chunk['town_count']} towns)"
+                locations = future.result()
+                if not locations:
+                    failed_count += 1
+                    print(f"  ⚠️  Chunk {label} failed, will be retried on the next run")
+                    continue
+
+                rows = weather_rows(chunk['cells'], locations)
+                try:
+                    loader = select_loader(len(rows))
+                    written = load_chunks(connection, loader, WEATHER_TABLE, columns, rows, columns[2:], chunk_rows,
+                                          migrate=create_weather_table)
+                    weather_rollups.update_rollups(connection, WEATHER_TABLE, rows)
+                    # Bumped before the checkpoint: a chunk that is not recorded is simply written again
+                    if written:
+                        weather_data_version.bump(connection)
+                    record_chunk(connection, chunk, written)
+                except Error as e:
+                    connection.rollback()
+                    failed_count += 1
+                    print(f"  ❌ Error writing chunk {label}: {e}")
+                    continue
+
+                done_count += 1
+                rows_total += written
+                print(f"  Chunk {label} done: {written} rows "
+                      f"({done_count + failed_count}/{len(chunks)} chunks processed)")
+
+    return done_count, failed_count, rows_total
+
+def rebuild_rollups(connection, towns, start, end, chunk_days=BACKFILL_CHUNK_DAYS):
+    """Recompute the rollups of the stored history between `start` and `end`, chunk_days at a time."""
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=chunk_days - 1))
+        # Only the first and last time per town matter for the recomputed span
+        first = datetime.combine(chunk_start, datetime.min.time())
+        last = datetime.combine(chunk_end, datetime.min.time()) + timedelta(hours=23)
+        rows = [(town['id'], timestamp) for town in towns for timestamp in (first, last)]
+        weather_rollups.update_rollups(connection, WEATHER_TABLE, rows)
+        print(f"  Rollups {chunk_start}..{chunk_end} recomputed for {len(towns)} towns")
+        chunk_start = chunk_end + timedelta(days=1)
+
+def parse_date(value):
+    """argparse type for YYYY-MM-DD dates."""
+    return date.fromisoformat(value)
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Backfill historical hourly weather from the Open-Meteo archive API.")
+    parser.add_argument('--start', type=parse_date, required=True, help="First day (YYYY-MM-DD)")
+    parser.add_argument('--end', type=parse_date, required=True, help="Last day (YYYY-MM-DD)")
+    parser.add_argument('--chunk-days', type=int, default=BACKFILL_CHUNK_DAYS, help="Days per chunk")
+    parser.add_argument('--workers', type=int, default=FETCH_MAX_WORKERS, help="Concurrent chunk requests")
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                        help="Only recompute the hourly and daily rollups of the stored history in the range")
+    args = parser.parse_args()
+
+    if args.end < args.start:
+        parser.error("--end must not be before --start")
+
+    print(f"Starting backfill {args.start}..{args.end} from the Open-Meteo archive API...\n")
+    connection = None
+    try:
+        connection = create_connection()
+        create_weather_table(connection)
+        create_checkpoint_table(connection)
+        weather_data_version.create_version_table(connection)
+        if weather_rollups.WEATHER_ROLLUPS:
+            weather_rollups.create_rollup_tables(connection)
+
+        towns = get_all_towns(connection)
+        if not towns:
+            print("Error: No towns found.")
+            sys.exit(1)
+
+        if args.rebuild_rollups:
+            if not weather_rollups.WEATHER_ROLLUPS:
+                parser.error("--rebuild-rollups needs WEATHER_ROLLUPS enabled")
+            rebuild_rollups(connection, towns, args.start, args.end, args.chunk_days)
+            print(f"\n✅ Rollups rebuilt for {args.start}..{args.end}.")
+            return
+
+        chunks = plan_chunks(plan_grid_cells(towns), args.start, args.end, args.chunk_days)
+        finished = completed_chunks(connection)
+        remaining = [chunk for chunk in chunks if chunk['key'] not in finished]
+        print(f"Planned {len(chunks)} chunks for {len(towns)} towns; "
+              f"{len(chunks) - len(remaining)} already completed, {len(remaining)} to go.")
+
+        started = time.monotonic()
+        done_count, failed_count, rows_total = run_backfill(connection, remaining, args.workers)
+        print(f"\n✅ Backfilled {rows_total} rows in {done_count} chunks ({time.monotonic() - started:.1f}s).")
+        if failed_count:
+            print(f"⚠️  {failed_count} chunks failed; rerun the same command to resume them.")
+
+    except Error as e:
+        print(f"❌ Backfill failed: {e}")
+        sys.exit(1)
+    finally:
+        if connection:
+            connection.close()
+            print("\n✅ Database connection closed.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+End-to-end ingest benchmark against a local Open-Meteo stand-in server.
+The stand-in answers multi-location /v1/forecast `current` requests with
+configurable latency, error rate and 429 rate limiting. For every synthetic
+town set the real fetch and insert path (fetch_towns) runs in a fresh
+process, writing either to MySQL (--mysql, weather tables prefixed
+weather_benchmark by default) or to a recording stand-in connection that
+renders every statement like PyMySQL would. Reports towns/sec, peak RSS and time per stage.
+
+Usage:
+    python benchmark_ingest.py --towns 100 1000 10000 100000 --save baseline.json
+    python benchmark_ingest.py --latency 0.2 --error-rate 0.05 --rate-limit-rate 0.02 --compare baseline.json
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pymysql.converters
+
+RESULT_MARKER = 'BENCHMARK_RESULT '
+DEFAULT_TOWN_COUNTS = [100, 1000, 10000, 100000]
+WEATHER_CODES = [0, 1, 2, 3, 45, 51, 61, 71, 80, 95]
+
+class FakeOpenMeteoHandler(BaseHTTPRequestHandler):
+    """Answers `current` requests in the Open-Meteo multi-location format."""
+
+    # Set by serve()
+    options = None
+
+    def do_GET(self):
+        self.respond(parse_qs(urlparse(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.respond(parse_qs(self.rfile.read(length).decode()))
+
+    def respond(self, query):
+        options = self.options
+        latitudes = query.get('latitude', [''])[0].split(',')
+        longitudes = query.get('longitude', [''])[0].split(',')
+        variables = query.get('current', [''])[0].split(',')
+        time.sleep(options['latency'] + options['latency_per_location'] * len(latitudes))
+
+        roll = random.random()
+        if roll < options['rate_limit_rate']:
+            self.send_json(429, {'error': True, 'reason': 'Too many concurrent requests'},
+                           {'Retry-After': str(options['retry_after'])})
+            return
+        if roll < options['rate_limit_rate'] + options['error_rate']:
+            self.send_json(500, {'error': True, 'reason': 'Simulated server error'})
+            return
+        if len(latitudes) != len(longitudes):
+            self.send_json(400, {'error': True, 'reason': 'Latitude and longitude must have the same length'})
+            return
+        for latitude, longitude in zip(latitudes, longitudes):
+            if is_bad_location(latitude, longitude, options['bad_location_rate']):
+                self.send_json(400, {'error': True, 'reason': f"Cannot process coordinates {latitude},{longitude}"})
+                return
+
+        # Observation time of the current 15-minute model interval, like the real API
+        observed = int(time.time() // 900 * 900)
+        locations = [
+            {
+                'latitude': float(latitude),
+                'longitude': float(longitude),
+                'current': current_values(float(latitude), float(longitude), variables, observed)
+            }
+            for latitude, longitude in zip(latitudes, longitudes)
+        ]
+        self.send_json(200, locations if len(locations) > 1 else locations[0])
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def is_bad_location(latitude, longitude, rate):
+    """Whether the stand-in rejects a coordinate; the same fraction of locations on every request."""
+    return rate > 0 and zlib.crc32(f"{latitude},{longitude}".encode()) / 2 ** 32 < rate
+
+def current_values(latitude, longitude, variables, observed):
+    """Deterministic plausible values per location."""
+    seed = latitude * 1000 + longitude
+    values = {'time': observed, 'interval': 900}
+    for index, name in enumerate(variables):
+        if name == 'weather_code':
+            values[name] = WEATHER_CODES[int(abs(seed)) % len(WEATHER_CODES)]
+        elif name == 'is_day':
+            values[name] = 1
+        elif name in ('relative_humidity_2m', 'wind_direction_10m', 'cloud_cover', 'visibility',
+                      'precipitation_probability', 'pressure_msl'):
+            values[name] = int(abs(math.sin(seed + index)) * 100)
+        else:
+            values[name] = round(math.sin(seed + index) * 20 + 10, 2)
+    return values
+
+def serve(port, options, ready):
+    """Run the stand-in server until the process is terminated."""
+    FakeOpenMeteoHandler.options = options
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeOpenMeteoHandler)
+    server.daemon_threads = True
+    ready.set()
+    server.serve_forever()
+
+def synthetic_towns(count):
+    """`count` towns on distinct coordinates spread over the Alps."""
+    return [
+        {
+            'id': town_id,
+            'name': f"Town {town_id}",
+            'latitude': round(45.8 + (town_id % 1000) * 0.003, 4),
+            'longitude': round(5.9 + (town_id // 1000) * 0.01, 4)
+        }
+        for town_id in range(1, count + 1)
+    ]
+
+class RecordingCursor:
+    """Cursor stand-in that renders statements like PyMySQL and only counts them."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.result = []
+        self.rowcount = 0
+
+    def mogrify(self, query, args=None):
+        if args is None:
+            return query
+        return query % tuple(pymysql.converters.escape_item(value, 'utf8mb4') for value in args)
+
+    def execute(self, query, args=None):
+        statement = self.mogrify(query, args)
+        self.connection.statements += 1
+        self.connection.bytes_sent += len(statement)
+        self.result = ([{'max_allowed_packet': 64 * 1024 * 1024}]
+                       if '@@max_allowed_packet' in query else [])
+        self.rowcount = 1
+        return 1
+
+    def executemany(self, query, rows):
+        for row in rows:
+            self.connection.bytes_sent += len(self.mogrify('(' + ', '.join(['%s'] * len(row)) + ')', row))
+        self.connection.statements += 1
+        self.rowcount = len(rows)
+        return len(rows)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+class RecordingConnection:
+    """Connection stand-in used when no MySQL server is configured."""
+
+    def __init__(self):
+        self.open = True
+        self.statements = 0
+        self.bytes_sent = 0
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.open = False
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+@contextmanager
+def stage(timings, name):
+    """Add the duration of a `with` block to timings[name]."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.monotonic() - started
+
+def run_town_set(town_count, server_url, use_mysql):
+    """One benchmark run in this process; returns the result dict."""
+    # Imported only in the run processes, which get their configuration through the environment
+    import db_pool
+    import fetch_weather_from_openmeteo as fetch
+    import metrics
+    import weather_latest
+    import weather_rollups
+
+    fetch.OPENMETEO_API_URL = server_url
+    timings = {}
+
+    with stage(timings, 'generate'):
+        towns = synthetic_towns(town_count)
+
+    if use_mysql:
+        pool = db_pool.get_pool()
+        with pool.connection() as connection:
+            fetch.setup_schema(connection)
+            cursor = connection.cursor()
+            cursor.execute(f"TRUNCATE TABLE `{fetch.WEATHER_TABLE}`")
+            cursor.execute(f"TRUNCATE TABLE `{weather_latest.LATEST_TABLE}`")
+            if weather_rollups.WEATHER_ROLLUPS:
+                cursor.execute(f"TRUNCATE TABLE `{weather_rollups.HOURLY_TABLE}`")
+                cursor.execute(f"TRUNCATE TABLE `{weather_rollups.DAILY_TABLE}`")
+            cursor.close()
+    else:
+        pool = db_pool.ConnectionPool(factory=RecordingConnection)
+
+    started = time.monotonic()
+    with stage(timings, 'total'):
+        fetched, written = fetch.fetch_towns(pool, towns)
+    elapsed = time.monotonic() - started
+
+    timings['http'] = metrics.HTTP_SECONDS.sum
+    timings['parse'] = metrics.PARSE_SECONDS.sum
+    # The whole write path: weather rows, latest table and rollups
+    timings['insert'] = metrics.INSERT_SECONDS.sum + metrics.LATEST_SECONDS.sum + metrics.ROLLUP_SECONDS.sum
+    return {
+        'towns': town_count,
+        'fetched': fetched,
+        'written': written,
+        'failed': metrics.TOWNS_FAILED.value,
+        'requests': metrics.HTTP_SECONDS.count,
+        'response_mb': metrics.RESPONSE_BYTES.sum / (1024 * 1024),
+        'seconds': elapsed,
+        'towns_per_second': fetched / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': timings,
+        'backend': 'mysql' if use_mysql else 'recording'
+    }
+
+def print_results(results, baseline=None):
+    """Summary table; with a baseline, throughput change per town set."""
+    baseline = {entry['towns']: entry for entry in (baseline or [])}
+    print(f"\n{'towns':>8} {'fetched':>8} {'failed':>7} {'towns/s':>9} {'RSS MB':>8} "
+          f"{'total s':>8} {'http s':>8} {'parse s':>8} {'insert s':>9}  vs baseline")
+    for result in results:
+        stages = result['stages']
+        line = (f"{result['towns']:>8} {result['fetched']:>8} {result['failed']:>7.0f} "
+                f"{result['towns_per_second']:>9.0f} {result['peak_rss_mb']:>8.1f} {stages['total']:>8.2f} "
+                f"{stages['http']:>8.2f} {stages['parse']:>8.2f} {stages['insert']:>9.2f}")
+        previous = baseline.get(result['towns'])
+        if previous and previous['towns_per_second']:
+            change = result['towns_per_second'] / previous['towns_per_second'] - 1
+            line += f"  {change:+.1%}"
+        print(line)
+    print("\nhttp, parse and insert are summed over concurrent batches and writers, "
+          "so they can exceed the wall-clock total.")
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Benchmark the weather ingest path against a local Open-Meteo stand-in.")
+    parser.add_argument('--towns', type=int, nargs='+', default=DEFAULT_TOWN_COUNTS, help="Town set sizes")
+    parser.add_argument('--port', type=int, default=18765, help="Port of the stand-in server")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds per request")
+    parser.add_argument('--latency-per-location', type=float, default=0.0001, help="Extra seconds per location")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument('--bad-location-rate', type=float, default=0.0,
+                        help="Fraction of coordinates rejected with HTTP 400 (exercises batch bisection)")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument('--mysql', action='store_true', help="Write to MySQL instead of the recording stand-in")
+    parser.add_argument('--save', help="Write the results as JSON (e.g. a baseline)")
+    parser.add_argument('--compare', help="Compare towns/sec against a saved baseline")
+    parser.add_argument('--verbose', action='store_true', help="Show the output of the benchmark runs")
+    parser.add_argument('--run', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    server_url = f"http://127.0.0.1:{args.port}/v1/forecast"
+
+    if args.run:
+        result = run_town_set(args.run, server_url, args.mysql)
+        print(RESULT_MARKER + json.dumps(result))
+        return
+
+    options = {
+        'latency': args.latency,
+        'latency_per_location': args.latency_per_location,
+        'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate,
+        'retry_after': args.retry_after,
+        'bad_location_rate': args.bad_location_rate
+    }
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(args.port, options, ready), daemon=True)
+    server.start()
+    ready.wait(10)
+    print(f"Open-Meteo stand-in listening on {server_url} "
+          f"(latency {args.latency:g}s + {args.latency_per_location:g}s/location, "
+          f"{args.error_rate:.0%} errors, {args.rate_limit_rate:.0%} 429s)")
+
+    # Every run gets a fresh process (clean peak RSS and metrics), no response
+    # cache and an API quota that does not throttle the stand-in
+    environment = dict(os.environ)
+    environment.setdefault('OPENMETEO_CACHE', 'false')
+    environment.setdefault('OPENMETEO_CALLS_PER_MINUTE', '100000000')
+    environment.setdefault('OPENMETEO_BACKOFF_FACTOR', '0.1')
+    environment.setdefault('DB_WEATHER_TABLE', 'weather_benchmark')
+    environment.setdefault('DB_WEATHER_LATEST_TABLE', 'weather_benchmark_latest')
+    environment.setdefault('DB_WEATHER_HOURLY_TABLE', 'weather_benchmark_hourly')
+    environment.setdefault('DB_WEATHER_DAILY_TABLE', 'weather_benchmark_daily')
+    environment.setdefault('DB_LOCAL_INFILE', 'false')
+
+    results = []
+    try:
+        for town_count in args.towns:
+            print(f"Running {town_count} towns...")
+            command = [sys.executable, __file__, '--run', str(town_count), '--port', str(args.port)]
+            if args.mysql:
+                command.append('--mysql')
+            completed = subprocess.run(command, env=environment, capture_output=True, text=True)
+            if args.verbose:
+                print(completed.stdout)
+            result_lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+            if completed.returncode != 0 or not result_lines:
+                print(f"❌ Run with {town_count} towns failed:\n{completed.stderr[-2000:]}")
+                continue
+            results.append(json.loads(result_lines[-1][len(RESULT_MARKER):]))
+    finally:
+        server.terminate()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+        print(f"\n✅ Results saved to {args.save}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+One-off migration of the weather table to the compact layout
+(WEATHER_COMPACT=true): DECIMAL values become scaled SMALLINT/TINYINT/
+MEDIUMINT columns and description/weather_main are dropped in favour of the
+WMO code lookup table. The rows are copied into a new table in id ranges,
+which then replaces the old one with an atomic RENAME TABLE; the old table
+is kept as <table>_decimal unless --drop-old is given. The latest table and
+the towns weather views are then rebuilt for the new layout. Reports the
+bytes per row before and after.
+
+Stop the scheduler while migrating; rows changed during the copy are not
+carried over.
+
+Usage:
+    WEATHER_COMPACT=true python compact_weather_table.py
+"""
+
+import argparse
+import sys
+import time
+from pymysql import Error
+import weather_codes
+import weather_rollups
+import weather_variables
+import weather_views
+from fetch_weather_from_openmeteo import (
+    TOWN_TABLE, WEATHER_TABLE, create_connection, create_latest_table, stored_layout, weather_table_query
+)
+from weather_latest import LATEST_TABLE
+
+COPY_CHUNK_ROWS = 50000
+
+def table_size(connection, table):
+    """(rows, data bytes, index bytes) of a table from fresh InnoDB statistics."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"ANALYZE TABLE `{table}`")
+        cursor.fetchall()
+        cursor.execute(f"SELECT COUNT(*) AS row_count FROM `{table}`")
+        rows = cursor.fetchone()['row_count']
+        cursor.execute(
+            "SELECT DATA_LENGTH AS data_length, INDEX_LENGTH AS index_length FROM INFORMATION_SCHEMA.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,)
+        )
+        sizes = cursor.fetchone()
+        return rows, int(sizes['data_length']), int(sizes['index_length'])
+    finally:
+        cursor.close()
+
+def print_size(label, size):
+    """Print the bytes per row of a table_size() result."""
+    rows, data_length, index_length = size
+    per_row = max(rows, 1)
+    print(f"  {label}: {rows} rows, {data_length / per_row:.1f} data + {index_length / per_row:.1f} index "
+          f"bytes per row ({(data_length + index_length) / 1024 / 1024:.1f} MiB)")
+
+def copy_columns():
+    """(target columns, SELECT expressions) copying decimal rows into the compact layout."""
+    targets = ['id', 'town_id', 'timestamp']
+    expressions = ['id', 'town_id', 'timestamp']
+    for variable in weather_variables.VARIABLES:
+        targets.append(variable.column)
+        if variable.scale > 1:
+            expressions.append(f"ROUND({variable.column} * {variable.scale})")
+        else:
+            expressions.append(variable.column)
+    targets += ['created_at', 'updated_at']
+    expressions += ['created_at', 'updated_at']
+    return targets, expressions
+
+def copy_rows(connection, source, target, chunk_rows=COPY_CHUNK_ROWS):
+    """
+    Copy all rows in id ranges of `chunk_rows`, committing each range, until
+    no rows beyond the last copied id are left. Returns the rows copied.
+    """
+    targets, expressions = copy_columns()
+    cursor = connection.cursor()
+    copied = 0
+    last_id = 0
+    started = time.monotonic()
+    try:
+        while True:
+            cursor.execute(f"SELECT MAX(id) AS max_id FROM `{source}`")
+            max_id = cursor.fetchone()['max_id'] or 0
+            if max_id <= last_id:
+                return copied
+            while last_id < max_id:
+                end_id = min(max_id, last_id + chunk_rows)
+                copied += cursor.execute(
+                    f"INSERT INTO `{target}` ({', '.join(targets)}) "
+                    f"SELECT {', '.join(expressions)} FROM `{source}` WHERE id > %s AND id <= %s",
+                    (last_id, end_id)
+                )
+                connection.commit()
+                last_id = end_id
+                print(f"  Copied {copied} rows (up to id {last_id} of {max_id}, "
+                      f"{time.monotonic() - started:.0f}s)")
+    finally:
+        cursor.close()
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Migrate the weather table to the compact layout.")
+    parser.add_argument('--chunk-rows', type=int, default=COPY_CHUNK_ROWS, help="Rows copied per statement")
+    parser.add_argument('--drop-old', action='store_true', help="Drop the old table after the switch")
+    args = parser.parse_args()
+
+    if not weather_variables.WEATHER_COMPACT:
+        print("❌ Set WEATHER_COMPACT=true (in .env) first, so the fetcher writes the compact layout afterwards.")
+        sys.exit(1)
+
+    compact_table = f"{WEATHER_TABLE}_compact"
+    old_table = f"{WEATHER_TABLE}_decimal"
+    connection = None
+    try:
+        connection = create_connection()
+        layout = stored_layout(connection, WEATHER_TABLE)
+        if layout is None:
+            print(f"❌ Table '{WEATHER_TABLE}' does not exist; the fetcher creates it in the compact layout.")
+            sys.exit(1)
+        if layout == 'compact':
+            print(f"✅ Table '{WEATHER_TABLE}' already uses the compact layout.")
+            print_size(WEATHER_TABLE, table_size(connection, WEATHER_TABLE))
+            return
+        if stored_layout(connection, old_table):
+            print(f"❌ Table '{old_table}' already exists; drop or rename it first.")
+            sys.exit(1)
+
+        print(f"Migrating '{WEATHER_TABLE}' to the compact layout...")
+        before = table_size(connection, WEATHER_TABLE)
+        print_size('Before', before)
+
+        weather_codes.create_weather_code_table(connection)
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS `{compact_table}`")
+            cursor.execute(weather_table_query(compact_table, compact=True))
+            connection.commit()
+        finally:
+            cursor.close()
+
+        copied = copy_rows(connection, WEATHER_TABLE, compact_table, args.chunk_rows)
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"RENAME TABLE `{WEATHER_TABLE}` TO `{old_table}`, `{compact_table}` TO `{WEATHER_TABLE}`")
+            if args.drop_old:
+                cursor.execute(f"DROP TABLE `{old_table}`")
+            connection.commit()
+        finally:
+            cursor.close()
+        print(f"✅ Switched '{WEATHER_TABLE}' to the compact layout ({copied} rows copied).")
+        if not args.drop_old:
+            print(f"   The old table is kept as '{old_table}'; drop it once the new one is verified.")
+
+        # Derived tables: the latest table is rebuilt in the new layout, rollups hold values and stay valid
+        create_latest_table(connection)
+        if weather_rollups.WEATHER_ROLLUPS:
+            weather_rollups.create_rollup_tables(connection)
+        # The views decode values through the registry, so they are recreated for the compact layout
+        weather_views.create_views(connection, TOWN_TABLE, WEATHER_TABLE, LATEST_TABLE)
+
+        after = table_size(connection, WEATHER_TABLE)
+        print_size('After', after)
+        before_bytes = (before[1] + before[2]) / max(before[0], 1)
+        after_bytes = (after[1] + after[2]) / max(after[0], 1)
+        if before_bytes:
+            print(f"✅ {before_bytes:.1f} -> {after_bytes:.1f} bytes per row "
+                  f"({(1 - after_bytes / before_bytes) * 100:.0f}% smaller).")
+
+    except Error as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        if connection:
+            connection.close()
+            print("\n✅ Database connection closed.")
+
+if __name__ == '__main__':
+    main()
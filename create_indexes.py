@@ -1,4 +1,6 @@
+import argparse
 import os
+from datetime import datetime, timedelta
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 
@@ -13,89 +15,360 @@ DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 TOWNS_TABLE = os.getenv('DB_TOWN_TABLE', 'towns')
 WEATHER_TABLE = os.getenv('DB_WEATHER_TABLE', 'weather_data')
+LATEST_TABLE = os.getenv('DB_WEATHER_LATEST_TABLE', 'weather_latest')
+HOURLY_TABLE = os.getenv('DB_WEATHER_HOURLY_TABLE', 'weather_hourly')
+DAILY_TABLE = os.getenv('DB_WEATHER_DAILY_TABLE', 'weather_daily')
 
 # Construct MySQL connection URI
 DATABASE_URI = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-def create_search_indexes():
-    """Creates indexes on towns and weather_data tables for optimized search queries."""
+# Tables whose indexes are reviewed
+ADVISED_TABLES = [TOWNS_TABLE, WEATHER_TABLE, LATEST_TABLE, HOURLY_TABLE, DAILY_TABLE]
+
+# Column types this script maintains. The towns table is created by the
+# import scripts with TEXT columns, which can only be indexed by prefix; a
+# prefix index cannot return rows in column order, so sorted (keyset) reads
+# would need a filesort. Lengths stay within InnoDB's 3072 index bytes in utf8mb4.
+COLUMN_TYPES = [
+    {'table': TOWNS_TABLE, 'column': 'country', 'type': 'VARCHAR(64)', 'length': 64},
+    {'table': TOWNS_TABLE, 'column': 'region', 'type': 'VARCHAR(128)', 'length': 128},
+    {'table': TOWNS_TABLE, 'column': 'name', 'type': 'VARCHAR(191)', 'length': 191},
+]
+
+# Indexes this script maintains on top of the ones the table definitions
+# create (weather: unique_town_timestamp and idx_timestamp; rollup and latest
+# tables: their primary keys and time index).
+INDEXES = [
+    {
+        'table': TOWNS_TABLE,
+        'name': f'idx_{TOWNS_TABLE}_country_region_name_id',
+        'columns': 'country, region, name, id',
+        'description': 'Country, region and town lookups, and the keyset order of the read API; '
+                       'its prefixes serve country and country + region searches'
+    },
+]
+
+# Representative read and ingest queries; EXPLAIN shows which index each one uses.
+# Parameters are filled with values sampled from the data (see sample_parameters).
+WORKLOAD = [
+    {
+        'name': 'Ingest: skip observations already stored',
+        'query': f"SELECT town_id FROM {WEATHER_TABLE} WHERE timestamp = :latest AND town_id IN (:town_id)"
+    },
+    {
+        'name': 'Ingest: recompute the hourly rollup of a town',
+        'query': f"SELECT town_id, COUNT(*) FROM {WEATHER_TABLE} "
+                 f"WHERE timestamp >= :hour AND timestamp < :hour_end AND town_id IN (:town_id) GROUP BY town_id"
+    },
+    {
+        'name': 'Time series of a town',
+        'query': f"SELECT timestamp, temperature FROM {WEATHER_TABLE} "
+                 f"WHERE town_id = :town_id AND timestamp >= :since ORDER BY timestamp"
+    },
+    {
+        'name': 'All towns within the last hour',
+        'query': f"SELECT town_id, temperature FROM {WEATHER_TABLE} WHERE timestamp >= :hour"
+    },
+    {
+        'name': 'Latest weather of a town',
+        'query': f"SELECT * FROM {LATEST_TABLE} WHERE town_id = :town_id"
+    },
+    {
+        'name': 'Towns without a recent observation',
+        'query': f"SELECT town_id FROM {LATEST_TABLE} WHERE timestamp < :since"
+    },
+    {
+        'name': 'Towns of a country',
+        'query': f"SELECT id, name FROM {TOWNS_TABLE} WHERE country = :country"
+    },
+    {
+        'name': 'Towns of a region',
+        'query': f"SELECT id, name FROM {TOWNS_TABLE} WHERE country = :country AND region = :region ORDER BY name"
+    },
+    {
+        'name': 'Town by name',
+        'query': f"SELECT id FROM {TOWNS_TABLE} WHERE country = :country AND region = :region AND name = :name"
+    },
+    {
+        'name': 'Next page of latest weather in a country',
+        'query': f"SELECT t.id, t.name, l.timestamp FROM {TOWNS_TABLE} t JOIN {LATEST_TABLE} l ON l.town_id = t.id "
+                 f"WHERE t.country = :country AND (t.region > :region OR (t.region = :region "
+                 f"AND (t.name > :name OR (t.name = :name AND t.id > :town_id)))) "
+                 f"ORDER BY t.region, t.name, t.id LIMIT 100"
+    },
+    {
+        'name': 'Daily rollups of a town',
+        'query': f"SELECT * FROM {DAILY_TABLE} WHERE town_id = :town_id AND day >= :since"
+    },
+    {
+        'name': 'Hourly rollups of all towns',
+        'query': f"SELECT town_id, temperature_max FROM {HOURLY_TABLE} WHERE hour >= :since"
+    },
+]
+
+def existing_tables(connection, tables):
+    """The subset of `tables` that exists in the database."""
+    result = connection.execute(text(
+        "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+    ))
+    names = {row[0] for row in result}
+    return [table for table in tables if table in names]
+
+def column_changes(connection, tables):
+    """
+    Declared column types that differ from the live ones, as [(declaration, live type, longest value)].
+    A column with values longer than the declared length cannot be converted without truncation.
+    """
+    changes = []
+    for declaration in COLUMN_TYPES:
+        if declaration['table'] not in tables:
+            continue
+        live = connection.execute(text(
+            "SELECT COLUMN_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = :column"
+        ), {'table': declaration['table'], 'column': declaration['column']}).scalar()
+        if live is None or live.lower() == declaration['type'].lower():
+            continue
+        longest = connection.execute(text(
+            f"SELECT COALESCE(MAX(CHAR_LENGTH({declaration['column']})), 0) FROM {declaration['table']}"
+        )).scalar()
+        changes.append((declaration, live, longest))
+    return changes
+
+def table_indexes(connection, table):
+    """Indexes of a table: {name: {'columns': [(column, prefix length or None)], 'unique': bool}}."""
+    result = connection.execute(text(
+        "SELECT INDEX_NAME, COLUMN_NAME, SUB_PART, NON_UNIQUE FROM INFORMATION_SCHEMA.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table ORDER BY INDEX_NAME, SEQ_IN_INDEX"
+    ), {'table': table})
+    indexes = {}
+    for name, column, sub_part, non_unique in result:
+        index = indexes.setdefault(name, {'columns': [], 'unique': not non_unique})
+        index['columns'].append((column, sub_part))
+    return indexes
+
+def covers(index, other):
+    """Whether `other` is a left prefix of `index` (so `index` can serve every lookup `other` serves)."""
+    if len(other['columns']) > len(index['columns']):
+        return False
+    for (column, prefix), (other_column, other_prefix) in zip(index['columns'], other['columns']):
+        if column.lower() != other_column.lower():
+            return False
+        if prefix is not None and (other_prefix is None or other_prefix > prefix):
+            return False
+    return True
+
+def declared_index(index):
+    """An INDEXES entry in the shape table_indexes() returns, e.g. 'name(50), id' -> [('name', 50), ('id', None)]."""
+    columns = []
+    for column in index['columns'].split(','):
+        column, _, prefix = column.strip().rstrip(')').partition('(')
+        columns.append((column.strip(), int(prefix) if prefix else None))
+    return {'columns': columns, 'unique': False}
+
+def redundant_indexes(indexes, keep=()):
+    """
+    Non-unique indexes that are a left prefix of another index, as {name: covering index}.
+    Of two identical indexes the unique one, then one named in `keep`, then the first by name survives.
+    """
+    def rank(name):
+        return (name != 'PRIMARY', not indexes[name]['unique'], name not in keep, name)
+
+    redundant = {}
+    # Widest indexes first, so an index is reported as covered by one that survives
+    by_width = sorted(indexes.items(), key=lambda item: (-len(item[1]['columns']), rank(item[0])))
+    for name, index in indexes.items():
+        if index['unique']:
+            continue
+        for other_name, other in by_width:
+            if other_name == name or other_name in redundant or not covers(other, index):
+                continue
+            # Identical indexes cover each other; only the lower ranked one goes
+            if covers(index, other) and rank(name) < rank(other_name):
+                continue
+            redundant[name] = other_name
+            break
+    return redundant
+
+def sample_parameters(connection):
+    """Query parameters taken from the data, so EXPLAIN sees realistic values."""
+    town = connection.execute(text(
+        f"SELECT id, country, region, name FROM {TOWNS_TABLE} ORDER BY id LIMIT 1"
+    )).fetchone()
+    latest = None
+    if existing_tables(connection, [WEATHER_TABLE]):
+        latest = connection.execute(text(f"SELECT MAX(timestamp) FROM {WEATHER_TABLE}")).scalar()
+    latest = latest or datetime.now().replace(minute=0, second=0, microsecond=0)
+    hour = latest.replace(minute=0, second=0, microsecond=0)
+    return {
+        'town_id': town[0] if town else 1,
+        'country': town[1] if town else 'AT',
+        'region': town[2] if town else '',
+        'name': town[3] if town else '',
+        'latest': latest,
+        'hour': hour,
+        'hour_end': hour + timedelta(hours=1),
+        'since': latest - timedelta(days=7),
+    }
+
+def explain_workload(connection, tables, parameters):
+    """
+    EXPLAIN every workload query whose tables exist.
+    Returns [(query name, [(table, access type, key, estimated rows, extra)])].
+    """
+    plans = []
+    for entry in WORKLOAD:
+        referenced = [table for table in ADVISED_TABLES if f" {table} " in f" {entry['query']} "]
+        if any(table not in tables for table in referenced):
+            continue
+        try:
+            result = connection.execute(text(f"EXPLAIN {entry['query']}"), parameters)
+        except Exception as e:
+            print(f"⚠ Cannot explain '{entry['name']}': {e}")
+            continue
+        steps = [(row._mapping['table'], row._mapping['type'], row._mapping['key'], row._mapping['rows'],
+                  row._mapping['Extra'] or '') for row in result]
+        plans.append((entry['name'], steps))
+    return plans
+
+def plan_warnings(steps):
+    """Problems of a query plan: whole-table scans and sorts no index provides."""
+    warnings = set()
+    for _, access, _, _, extra in steps:
+        if access == 'ALL':
+            warnings.add('scans a whole table')
+        if 'Using filesort' in extra:
+            warnings.add('sorts with a filesort')
+    return warnings
+
+def print_plans(plans):
+    """Print the access path of every workload query, flagging table scans and filesorts."""
+    for name, steps in plans:
+        print(f"  {name}:")
+        for table, access, key, rows, extra in steps:
+            marker = '⚠' if plan_warnings([(table, access, key, rows, extra)]) else ' '
+            details = f", {extra}" if extra else ''
+            print(f"   {marker} {table}: {access or '-'} via {key or 'no index'} (~{rows or 0} rows{details})")
+
+def used_keys(plans, aliases):
+    """{table: {index names chosen by EXPLAIN}}; `aliases` maps EXPLAIN table names to tables."""
+    used = {}
+    for _, steps in plans:
+        for table, _, key, _, _ in steps:
+            if key:
+                for name in key.split(','):
+                    used.setdefault(aliases.get(table, table), set()).add(name)
+    return used
+
+def advise_indexes(apply=False, drop_unused=False):
+    """
+    Explain the workload, report unused and redundant indexes and, with
+    `apply`, convert the declared column types, create the declared indexes
+    and drop the redundant ones (and the unused ones with `drop_unused`),
+    then explain the workload again.
+    """
     try:
         engine = create_engine(DATABASE_URI)
 
         print(f"Connecting to MySQL database: {DB_NAME} on {DB_HOST}:{DB_PORT}")
-        print(f"Creating indexes for search optimization...\n")
-
-        indexes_to_create = [
-            # Indexes on towns table for country/region/town searches
-            {
-                'table': TOWNS_TABLE,
-                'name': f'idx_{TOWNS_TABLE}_country',
-                'columns': 'country(50)',
-                'description': 'Single column index on country (first 50 chars)'
-            },
-            {
-                'table': TOWNS_TABLE,
-                'name': f'idx_{TOWNS_TABLE}_country_region',
-                'columns': 'country(50), region(50)',
-                'description': 'Composite index on country and region'
-            },
-            {
-                'table': TOWNS_TABLE,
-                'name': f'idx_{TOWNS_TABLE}_country_region_name',
-                'columns': 'country(50), region(50), name(100)',
-                'description': 'Composite index on country, region, and town name'
-            },
-            # Indexes on weather_data table for time range searches
-            {
-                'table': WEATHER_TABLE,
-                'name': f'idx_{WEATHER_TABLE}_timestamp',
-                'columns': 'timestamp',
-                'description': 'Single column index on timestamp'
-            },
-            {
-                'table': WEATHER_TABLE,
-                'name': f'idx_{WEATHER_TABLE}_town_id_timestamp',
-                'columns': 'town_id, timestamp',
-                'description': 'Composite index on town_id and timestamp for join + time filter'
-            },
-        ]
 
         with engine.connect() as connection:
-            for idx in indexes_to_create:
-                try:
-                    create_index_query = f"""
-                        CREATE INDEX {idx['name']}
-                        ON {idx['table']} ({idx['columns']})
-                    """
-                    connection.execute(text(create_index_query))
-                    connection.commit()
-                    print(f"✓ Created: {idx['name']}")
-                    print(f"  Table: {idx['table']}")
-                    print(f"  Columns: {idx['columns']}")
-                    print(f"  Purpose: {idx['description']}\n")
-
-                except Exception as e:
-                    if 'Duplicate key name' in str(e):
-                        print(f"⚠ Index already exists: {idx['name']}\n")
+            tables = existing_tables(connection, ADVISED_TABLES)
+            parameters = sample_parameters(connection)
+            # EXPLAIN reports the alias of joined tables
+            aliases = {'t': TOWNS_TABLE, 'l': LATEST_TABLE}
+
+            print("\n" + "="*70)
+            print("WORKLOAD PLANS")
+            print("="*70)
+            plans = explain_workload(connection, tables, parameters)
+            print_plans(plans)
+            used = used_keys(plans, aliases)
+
+            keep = {index['name'] for index in INDEXES}
+            drops = []
+            print("\n" + "="*70)
+            print("INDEX REPORT")
+            print("="*70)
+            changes = column_changes(connection, tables)
+            # A full-length index cannot be built on a column that cannot be converted from TEXT
+            blocked = {declaration['table'] for declaration, _, longest in changes if longest > declaration['length']}
+            missing = [index for index in INDEXES if index['table'] in tables and index['table'] not in blocked
+                       and index['name'] not in table_indexes(connection, index['table'])]
+            for table in tables:
+                indexes = table_indexes(connection, table)
+                # Indexes about to be created count as covering, so what they replace is dropped in the same run
+                planned = dict(indexes, **{index['name']: declared_index(index)
+                                           for index in missing if index['table'] == table})
+                redundant = redundant_indexes(planned, keep)
+                secondary = [name for name in indexes if name != 'PRIMARY']
+                print(f"\nIndexes on {table} ({len(secondary)} secondary indexes maintained by every insert):")
+                for name, index in sorted(indexes.items()):
+                    columns = ', '.join(f"{column}({prefix})" if prefix else column for column, prefix in index['columns'])
+                    if name in redundant:
+                        status = f"redundant, covered by {redundant[name]}"
+                        drops.append((table, name, status))
+                    elif name == 'PRIMARY' or index['unique']:
+                        status = 'constraint'
+                    elif name in used.get(table, set()):
+                        status = 'used'
                     else:
-                        print(f"✗ Error creating {idx['name']}: {e}\n")
+                        status = 'unused by the workload'
+                        if drop_unused and name not in keep:
+                            drops.append((table, name, status))
+                    print(f"  - {name}: {columns} [{status}]")
 
-        # Show created indexes
-        print("\n" + "="*70)
-        print("INDEXES SUMMARY")
-        print("="*70)
+            retypes = []
+            for declaration, live, longest in changes:
+                target = f"{declaration['table']}.{declaration['column']}"
+                if longest > declaration['length']:
+                    print(f"\n⚠ Cannot convert {target} ({live}) to {declaration['type']}: "
+                          f"values of up to {longest} characters; its table's declared indexes are skipped")
+                    continue
+                print(f"\n+ Convert: {target} from {live} to {declaration['type']} (longest value {longest})")
+                retypes.append(declaration)
 
-        with engine.connect() as connection:
-            for table in [TOWNS_TABLE, WEATHER_TABLE]:
-                show_indexes_query = f"SHOW INDEX FROM {table}"
-                result = connection.execute(text(show_indexes_query))
-                rows = result.fetchall()
+            for index in missing:
+                print(f"\n+ Missing: {index['name']} on {index['table']} ({index['columns']})")
+                print(f"  Purpose: {index['description']}")
+            for table, name, status in drops:
+                print(f"\n- Drop: {name} on {table} ({status})")
+
+            if not apply:
+                if retypes or missing or drops:
+                    print("\nRun with --apply to make these changes.")
+                else:
+                    print("\n✓ Indexes already match the workload")
+                return True
 
-                print(f"\nIndexes on {table}:")
-                for row in rows:
-                    print(f"  - {row[2]}: {row[4]} (Column: {row[5]})")
+            for declaration in retypes:
+                connection.execute(text(
+                    f"ALTER TABLE {declaration['table']} MODIFY {declaration['column']} {declaration['type']}"
+                ))
+                connection.commit()
+                print(f"✓ Converted: {declaration['table']}.{declaration['column']} to {declaration['type']}")
+            for index in missing:
+                connection.execute(text(f"CREATE INDEX {index['name']} ON {index['table']} ({index['columns']})"))
+                connection.commit()
+                print(f"✓ Created: {index['name']}")
+            for table, name, _ in drops:
+                connection.execute(text(f"DROP INDEX {name} ON {table}"))
+                connection.commit()
+                print(f"✓ Dropped: {name}")
 
-        print("\n✓ Index creation process completed successfully")
+            if retypes or missing or drops:
+                print("\n" + "="*70)
+                print("WORKLOAD PLANS AFTER CHANGES")
+                print("="*70)
+                after = explain_workload(connection, tables, parameters)
+                print_plans(after)
+                before = {name: plan_warnings(steps) for name, steps in plans}
+                for name, steps in after:
+                    for warning in sorted(plan_warnings(steps)):
+                        when = 'still' if warning in before.get(name, set()) else 'now'
+                        print(f"⚠ '{name}' {when} {warning}")
+
+        print("\n✓ Index advisor completed successfully")
         return True
 
     except Exception as e:
@@ -103,4 +376,12 @@ def create_search_indexes():
         return False
 
 if __name__ == "__main__":
-    create_search_indexes()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Explain representative queries and report unused and redundant indexes.")
+    parser.add_argument('--apply', action='store_true',
+                        help="create missing declared indexes and drop redundant ones")
+    parser.add_argument('--drop-unused', action='store_true',
+                        help="with --apply, also drop indexes no workload query uses")
+    args = parser.parse_args()
+
+    advise_indexes(apply=args.apply, drop_unused=args.drop_unused)
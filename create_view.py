@@ -1,6 +1,7 @@
 import os
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
+from weather_views import view_queries
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,70 +14,29 @@ DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 TOWNS_TABLE = os.getenv('DB_TOWN_TABLE', 'towns')
 WEATHER_TABLE = os.getenv('DB_WEATHER_TABLE', 'weather_data')
+LATEST_TABLE = os.getenv('DB_WEATHER_LATEST_TABLE', 'weather_latest')
 
 # Construct MySQL connection URI
 DATABASE_URI = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 def create_towns_weather_view():
-    """Creates a view joining towns and weather_data tables."""
+    """Creates views joining towns with the weather history and with the latest weather per town."""
     try:
         engine = create_engine(DATABASE_URI)
 
         print(f"Connecting to MySQL database: {DB_NAME} on {DB_HOST}:{DB_PORT}")
 
-        # SQL query to create the view
-        # Explicitly select all columns to avoid duplicate 'id' column names
-        create_view_query = f"""
-            CREATE OR REPLACE VIEW towns_weather_view AS
-            SELECT
-                t.id as town_id,
-                t.name,
-                t.population,
-                t.latitude,
-                t.longitude,
-                t.elevation,
-                t.country,
-                t.region,
-                w.id as weather_id,
-                w.town_id as weather_town_id,
-                w.timestamp,
-                w.temperature,
-                w.relative_humidity,
-                w.apparent_temperature,
-                w.weather_code,
-                w.wind_speed,
-                w.wind_direction,
-                w.wind_gusts,
-                w.pressure_msl,
-                w.cloud_cover,
-                w.uv_index,
-                w.is_day,
-                w.precipitation,
-                w.precipitation_probability,
-                w.dew_point,
-                w.visibility,
-                w.soil_temperature_0cm,
-                w.soil_moisture_0_1cm,
-                w.shortwave_radiation,
-                w.direct_radiation,
-                w.diffuse_radiation,
-                w.direct_normal_irradiance,
-                w.description,
-                w.weather_main,
-                w.created_at,
-                w.updated_at
-            FROM {TOWNS_TABLE} t
-            INNER JOIN {WEATHER_TABLE} w ON t.id = w.town_id
-        """
-
-        # Execute the CREATE VIEW statement
+        # Execute the CREATE VIEW statements
         with engine.connect() as connection:
-            connection.execute(text(create_view_query))
+            for _, query in view_queries(TOWNS_TABLE, WEATHER_TABLE, LATEST_TABLE):
+                connection.execute(text(query))
             connection.commit()
 
         print(f"✓ Successfully created view 'towns_weather_view'")
         print(f"  View joins {TOWNS_TABLE} and {WEATHER_TABLE} tables on t.id = w.town_id")
         print(f"  View name: towns_weather_view")
+        print(f"✓ Successfully created view 'towns_weather_latest_view'")
+        print(f"  View joins {TOWNS_TABLE} and {LATEST_TABLE} tables on t.id = l.town_id")
 
         # Query the view to verify and show structure
         import pandas as pd
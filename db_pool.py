@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide pool of long-lived PyMySQL connections.
+Connections are borrowed with `with get_pool().connection() as connection:`,
+pinged (and reconnected) before they are handed out and returned afterwards,
+so scheduler runs reuse connections instead of opening new ones every cycle.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+import pymysql
+from pymysql import Error
+from weather_loader import LOCAL_INFILE
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Database configuration from environment variables
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'database': os.getenv('DB_NAME')
+}
+
+# Maximum open connections and how long a borrower waits for a free one
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 60))
+
+def connect():
+    """Open a new database connection. Raises pymysql.Error on failure."""
+    return pymysql.connect(
+        host=DB_CONFIG['host'],
+        port=DB_CONFIG['port'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        database=DB_CONFIG['database'],
+        charset='utf8mb4',
+        cursorclass=pymysql.cursors.DictCursor,
+        local_infile=LOCAL_INFILE
+    )
+
+class ConnectionPool:
+    """
+    Bounded pool of reusable connections. Idle connections are kept
+    most-recently-used first; every borrowed connection is health-checked
+    with a ping that transparently reconnects if the server dropped it.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, factory=connect):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.factory = factory
+        self.idle = []
+        self.open_count = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Borrow a healthy connection, opening one if the pool is not full."""
+        deadline = time.monotonic() + self.timeout
+        with self.condition:
+            while not self.idle and self.open_count >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Error(f"Timed out after {self.timeout:g}s waiting for a pooled database connection")
+                self.condition.wait(remaining)
+            if self.idle:
+                connection = self.idle.pop()
+            else:
+                connection = None
+                self.open_count += 1
+
+        try:
+            if connection is None:
+                return self.factory()
+            connection.ping(reconnect=True)
+            return connection
+        except Exception:
+            # The slot is freed again, so a later borrower can retry the connect
+            if connection is not None:
+                self._close_quietly(connection)
+            with self.condition:
+                self.open_count -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, connection, discard=False):
+        """Return a connection; broken or discarded connections are closed instead."""
+        if not discard and connection.open:
+            try:
+                # No transaction state leaks into the next borrower
+                connection.rollback()
+            except Error:
+                discard = True
+        else:
+            discard = True
+
+        with self.condition:
+            if discard:
+                self._close_quietly(connection)
+                self.open_count -= 1
+            else:
+                self.idle.append(connection)
+            self.condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a `with` block."""
+        connection = self.acquire()
+        discard = False
+        try:
+            yield connection
+        except (pymysql.OperationalError, pymysql.InterfaceError):
+            # Likely a lost connection; don't hand it out again
+            discard = True
+            raise
+        finally:
+            self.release(connection, discard)
+
+    def close(self):
+        """Close all idle connections."""
+        with self.condition:
+            while self.idle:
+                self._close_quietly(self.idle.pop())
+                self.open_count -= 1
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+
+_pool = None
+_lock = threading.Lock()
+
+def get_pool():
+    """Process-wide connection pool."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fetch hourly forecasts from Open-Meteo API and store them in the database.
+One request returns the whole forecast horizon (48-168 hours) for every
+location of a batch; the per-location arrays are turned into rows with
+vectorized NumPy operations.
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import requests
+from pymysql import Error
+import db_pool
+import openmeteo_client
+import weather_schema
+import weather_variables
+from fetch_weather_from_openmeteo import (
+    ALLOW_POST, BATCH_SIZE, FETCH_MAX_WORKERS, MAX_URL_LENGTH,
+    get_all_towns, max_batch_for_url, plan_grid_cells, request_url_length
+)
+from weather_loader import load_chunks, select_loader
+from weather_parser import READ_CHUNK_SIZE, iter_json_array
+
+# Forecast table and horizon
+FORECAST_TABLE = os.getenv('DB_FORECAST_TABLE', 'weather_forecast')
+FORECAST_HOURS = int(os.getenv('FORECAST_HOURS', 168))
+FORECAST_PROFILE = os.getenv('FORECAST_PROFILE', weather_variables.WEATHER_PROFILE)
+# Forecast runs older than this are deleted after each run (0 keeps all runs)
+FORECAST_RETENTION_HOURS = int(os.getenv('FORECAST_RETENTION_HOURS', 48))
+FORECAST_DELETE_CHUNK_ROWS = 50000
+
+FORECAST_VARIABLES = weather_variables.get_profile(FORECAST_PROFILE)
+HOURLY_VARIABLES = weather_variables.api_parameter(FORECAST_VARIABLES)
+
+# Versioned forecast table migrations the column diff cannot express:
+# (version, description, function(connection, table))
+FORECAST_MIGRATIONS = [
+    (1, "index forecast_run for retention deletes",
+     lambda connection, table: weather_schema.add_index(connection, table, 'idx_forecast_run', 'forecast_run')),
+]
+
+def create_forecast_table(connection):
+    """Create the hourly forecast table keyed by town, forecast run and valid time, or migrate it in place."""
+    create_table_query = f"""
+    CREATE TABLE IF NOT EXISTS `{FORECAST_TABLE}` (
+        town_id INT NOT NULL,
+        forecast_run DATETIME NOT NULL,
+        valid_time DATETIME NOT NULL,
+{weather_variables.column_definitions()},
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (town_id, forecast_run, valid_time),
+        INDEX idx_valid_time (valid_time),
+        INDEX idx_forecast_run (forecast_run)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """
+
+    try:
+        changes = weather_schema.migrate(
+            connection, FORECAST_TABLE, create_table_query,
+            [(variable.column, variable.sql_type) for variable in weather_variables.VARIABLES], after='valid_time',
+            migrations=FORECAST_MIGRATIONS)
+        print(f"✅ Table '{FORECAST_TABLE}' created or up to date ({changes} migrations applied).")
+    except Error as e:
+        print(f"❌ Error creating or migrating table '{FORECAST_TABLE}': {e}")
+        raise
+
+def forecast_params(towns_data):
+    """Build the Open-Meteo hourly forecast parameters for a batch of towns."""
+    return {
+        'latitude': ','.join(str(town['latitude']) for town in towns_data),
+        'longitude': ','.join(str(town['longitude']) for town in towns_data),
+        'hourly': HOURLY_VARIABLES,
+        'forecast_hours': FORECAST_HOURS,
+        'timeformat': 'unixtime',
+        'timezone': 'GMT'
+    }
+
+def hourly_columns(towns_data, locations, variables, compact=False):
+    """
+    Turn the hourly arrays of a batch into column lists.
+    Values, times and town ids are assembled as whole NumPy arrays per batch;
+    grid cells are fanned out to every town id in 'town_ids'. With `compact`
+    values are scaled to the integers of the compact weather layout.
+    Returns (town_ids, times as naive UTC datetimes, one value list per variable)
+    with None for missing values.
+    """
+    value_blocks = []
+    time_blocks = []
+    town_blocks = []
+
+    for town, location in zip(towns_data, locations):
+        hourly = location.get('hourly', {})
+        times = np.asarray(hourly.get('time', []), dtype=np.int64)
+        if not len(times):
+            continue
+        # hours x variables, None (missing) becomes NaN
+        values = np.column_stack([
+            np.asarray(hourly.get(variable.api_name, [None] * len(times)), dtype=np.float64)
+            for variable in variables
+        ])
+        town_ids = town.get('town_ids', [town['id']])
+        value_blocks.append(np.tile(values, (len(town_ids), 1)))
+        time_blocks.append(np.tile(times, len(town_ids)))
+        town_blocks.append(np.repeat(np.asarray(town_ids, dtype=np.int64), len(times)))
+
+    if not value_blocks:
+        return [], [], [[] for _ in variables]
+
+    values = np.concatenate(value_blocks)
+    missing = np.isnan(values)
+    columns = []
+    for index, variable in enumerate(variables):
+        scale = weather_variables.stored_scale(variable, compact)
+        column = values[:, index] * scale if scale > 1 else values[:, index]
+        if weather_variables.is_integer(variable) or scale > 1:
+            column = np.rint(np.nan_to_num(column)).astype(np.int64)
+        columns.append(np.where(missing[:, index], None, column).tolist())
+
+    times = np.concatenate(time_blocks).astype('datetime64[s]').astype(object).tolist()
+    return np.concatenate(town_blocks).tolist(), times, columns
+
+def forecast_rows(towns_data, locations, forecast_run):
+    """
+    Turn the hourly arrays of a batch into forecast table rows;
+    Python only iterates once to hand out the final tuples.
+    """
+    town_ids, valid_times, columns = hourly_columns(towns_data, locations, FORECAST_VARIABLES)
+    runs = [forecast_run] * len(town_ids)
+    return list(zip(town_ids, runs, valid_times, *columns))
+
+def fetch_hourly_batch(towns_data, url, build_params):
+    """
+    Fetch hourly arrays for a batch of towns from an Open-Meteo endpoint.
+    Returns the location objects in request order, or None on failure.
+    """
+    try:
+        params = build_params(towns_data)
+        method = 'POST' if ALLOW_POST and request_url_length(
+            towns_data, build_params, url) > MAX_URL_LENGTH else 'GET'
+        response = openmeteo_client.request(url, params, method=method, stream=True)
+        with response:
+            locations = list(iter_json_array(response.iter_content(chunk_size=READ_CHUNK_SIZE)))
+
+        if len(locations) != len(towns_data):
+            print(f"Error parsing hourly data: expected {len(towns_data)} locations, got {len(locations)}")
+            return None
+        return locations
+
+    except requests.RequestException as e:
+        print(f"Error fetching hourly data from Open-Meteo: {e}")
+        return None
+    except (KeyError, ValueError) as e:
+        print(f"Error parsing hourly data: {e}")
+        return None
+
+def fetch_forecast_batch(towns_data):
+    """Fetch the hourly forecast for a batch of towns. Returns the location objects or None."""
+    return fetch_hourly_batch(towns_data, openmeteo_client.FORECAST_API_URL, forecast_params)
+
+def fetch_and_store_forecasts(connection, cells, forecast_run):
+    """Fetch all cells in concurrent batches and write each batch as it arrives."""
+    limiter = openmeteo_client.get_rate_limiter()
+    columns = ['town_id', 'forecast_run', 'valid_time'] + [variable.column for variable in FORECAST_VARIABLES]
+    limit = min(BATCH_SIZE, openmeteo_client.max_locations_per_request(len(FORECAST_VARIABLES), limiter=limiter))
+
+    batches = []
+    position = 0
+    while position < len(cells):
+        batch_size = limit if ALLOW_POST else max_batch_for_url(
+            cells, position, limit, build_params=forecast_params)
+        batches.append(cells[position:position + batch_size])
+        position += batch_size
+
+    def fetch_limited(towns_batch):
+        openmeteo_client.charge(openmeteo_client.FORECAST_API_URL, forecast_params(towns_batch),
+                                len(FORECAST_VARIABLES), limiter=limiter)
+        return fetch_forecast_batch(towns_batch)
+
+    written = 0
+    with ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS) as executor:
+        futures = {executor.submit(fetch_limited, batch): batch for batch in batches}
+        for completed, future in enumerate(as_completed(futures), 1):
+            towns_batch = futures[future]
+            locations = future.result()
+            if not locations:
+                print(f"  ⚠️  Batch {completed}/{len(batches)} failed ({len(towns_batch)} grid cells skipped)")
+                continue
+
+            rows = forecast_rows(towns_batch, locations, forecast_run)
+            try:
+                loader = select_loader(len(rows))
+                written += load_chunks(connection, loader, FORECAST_TABLE, columns, rows, columns[3:],
+                                       migrate=create_forecast_table)
+                print(f"  Batch {completed}/{len(batches)} done: {len(rows)} forecast rows")
+            except Error as e:
+                print(f"  ❌ Error writing forecast batch {completed}/{len(batches)}: {e}")
+                connection.rollback()
+
+    return written
+
+def prune_forecast_runs(connection, forecast_run, retention_hours=FORECAST_RETENTION_HOURS):
+    """
+    Delete the forecast runs more than `retention_hours` older than
+    `forecast_run`, in chunks so no single delete holds locks for long.
+    Returns the number of rows deleted.
+    """
+    if retention_hours <= 0:
+        return 0
+    cutoff = forecast_run - timedelta(hours=retention_hours)
+    deleted = 0
+    cursor = connection.cursor()
+    try:
+        while True:
+            count = cursor.execute(
+                f"DELETE FROM `{FORECAST_TABLE}` WHERE forecast_run < %s LIMIT {FORECAST_DELETE_CHUNK_ROWS}",
+                (cutoff,)
+            )
+            connection.commit()
+            deleted += count
+            if count < FORECAST_DELETE_CHUNK_ROWS:
+                break
+    finally:
+        cursor.close()
+    if deleted:
+        print(f"✅ Deleted {deleted} forecast rows of runs before {cutoff} ({retention_hours}h retention).")
+    return deleted
+
+def run_forecast_job(pool=None):
+    """
+    One forecast cycle on a borrowed pool connection; runs beyond the
+    retention are deleted once the new run is stored. Never exits the process;
+    database errors propagate to the caller. Returns the number of rows written.
+    """
+    pool = pool or db_pool.get_pool()
+    with pool.connection() as connection:
+        towns = get_all_towns(connection)
+        print(f"Found {len(towns)} towns in database.")
+        if not towns:
+            print("Error: No towns found.")
+            return 0
+
+        cells = plan_grid_cells(towns)
+        # Open-Meteo does not report the model run, so runs are identified by the fetch hour (UTC)
+        forecast_run = datetime.now(timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+        print(f"Fetching forecast run {forecast_run} for {len(cells)} grid cells ({len(towns)} towns)...")
+
+        started = time.monotonic()
+        written = fetch_and_store_forecasts(connection, cells, forecast_run)
+        print(f"\n✅ Stored {written} forecast rows in {time.monotonic() - started:.1f}s.")
+        # Old runs are only dropped once a newer one is stored
+        if written:
+            prune_forecast_runs(connection, forecast_run)
+        return written
+
+def main():
+    """Main function."""
+    print(f"Starting {FORECAST_HOURS}h hourly forecast fetch from Open-Meteo API...\n")
+
+    pool = db_pool.get_pool()
+    try:
+        with pool.connection() as connection:
+            create_forecast_table(connection)
+
+        run_forecast_job(pool)
+
+    except Error as e:
+        print(f"Error while connecting to MySQL: {e}")
+        sys.exit(1)
+    finally:
+        pool.close()
+        print("\n✅ Database connection closed.")
+
+if __name__ == '__main__':
+    main()
@@ -9,124 +9,279 @@ import os
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
-import pymysql
 from pymysql import Error
-from datetime import datetime
 import requests
+import queue
+import threading
 import time
+from contextlib import ExitStack
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import db_pool
+import metrics
+import openmeteo_client
+import shard_lease
+import town_quarantine
+import weather_codes
+import weather_data_version
+import weather_latest
+import weather_partitions
+import weather_rollups
+import weather_schema
+import weather_variables
+from weather_loader import load_chunks, select_loader
+from weather_parser import NAN, READ_CHUNK_SIZE, WeatherColumns, parse_current_chunks
 
 # Load environment variables from .env file
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
-# Database configuration from environment variables
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST'),
-    'port': int(os.getenv('DB_PORT', 3306)),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD'),
-    'database': os.getenv('DB_NAME')
-}
-
 # Table names from environment
 TOWN_TABLE = os.getenv('DB_TOWN_TABLE', 'towns')
 WEATHER_TABLE = os.getenv('DB_WEATHER_TABLE', 'weather')
 
 # Open-Meteo API URL
-OPENMETEO_API_URL = "https://api.open-meteo.com/v1/forecast"
+OPENMETEO_API_URL = openmeteo_client.FORECAST_API_URL
+
+# Fetch concurrency; the API quota itself is enforced by openmeteo_client
+BATCH_SIZE = int(os.getenv('OPENMETEO_BATCH_SIZE', 50))
+FETCH_MAX_WORKERS = int(os.getenv('OPENMETEO_MAX_WORKERS', 4))
+
+# Batch sizing. The comma-joined coordinate lists have to fit into the request
+# URL unless POST is allowed; within that limit the batch size adapts to the
+# observed response times and errors.
+MIN_BATCH_SIZE = int(os.getenv('OPENMETEO_MIN_BATCH_SIZE', 5))
+MAX_BATCH_SIZE = int(os.getenv('OPENMETEO_MAX_BATCH_SIZE', 1000))
+MAX_URL_LENGTH = int(os.getenv('OPENMETEO_MAX_URL_LENGTH', 8000))
+ALLOW_POST = os.getenv('OPENMETEO_ALLOW_POST', 'false').lower() in ('1', 'true', 'yes')
+TARGET_BATCH_SECONDS = float(os.getenv('OPENMETEO_TARGET_BATCH_SECONDS', 5))
+
+# Batches that failed transiently are retried after the main pass, in up to
+# RETRY_ROUNDS rounds with doubling pauses starting at RETRY_BACKOFF_SECONDS
+RETRY_ROUNDS = int(os.getenv('OPENMETEO_RETRY_ROUNDS', 3))
+RETRY_BACKOFF_SECONDS = float(os.getenv('OPENMETEO_RETRY_BACKOFF_SECONDS', 5))
+
+# Towns falling into the same grid cell (in degrees) are fetched only once.
+# 0 merges only towns with identical coordinates; model grids are roughly
+# 0.02 (ICON-D2) to 0.1 degrees, which can be used to merge neighbouring towns.
+GRID_RESOLUTION = float(os.getenv('OPENMETEO_GRID_RESOLUTION', 0))
+
+# Skip rows whose (town, observation time) is already stored, so reruns
+# within the same model interval cost no writes
+SKIP_EXISTING = os.getenv('WEATHER_SKIP_EXISTING', 'true').lower() in ('1', 'true', 'yes')
+
+# Ingest pipeline: fetched batches wait in a bounded queue for the writers,
+# which flush them in INSERT statements sized to fit max_allowed_packet.
+WRITE_QUEUE_SIZE = int(os.getenv('WRITE_QUEUE_SIZE', 8))
+WRITER_WORKERS = int(os.getenv('WRITER_WORKERS', 2))
+WRITE_PACKET_FRACTION = 0.5
+
+# Variables requested and stored by this run (WEATHER_PROFILE)
+PROFILE_VARIABLES = weather_variables.get_profile()
+CURRENT_VARIABLES = weather_variables.api_parameter(PROFILE_VARIABLES)
+
+class AdaptiveBatchSizer:
+    """
+    Adjusts the number of locations per request from measured batch results.
+    Grows while batches are fast and successful, shrinks on slow responses
+    and halves on errors (additive-increase / multiplicative-decrease).
+    """
+
+    def __init__(self, initial=BATCH_SIZE, minimum=MIN_BATCH_SIZE, maximum=MAX_BATCH_SIZE,
+                 target_seconds=TARGET_BATCH_SECONDS):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.target_seconds = target_seconds
+        self.lock = threading.Lock()
+
+    def next_size(self):
+        with self.lock:
+            return self.size
+
+    def record(self, batch_size, elapsed, ok):
+        """Feed back the outcome of one batch request."""
+        with self.lock:
+            if not ok:
+                self.size = max(self.minimum, self.size // 2)
+            elif elapsed > self.target_seconds:
+                self.size = max(self.minimum, int(self.size * 0.75))
+            elif elapsed < self.target_seconds / 2 and batch_size >= self.size:
+                # Only grow on batches that actually used the current size
+                self.size = min(self.maximum, self.size + max(1, self.size // 4))
+
+def grid_cell_key(latitude, longitude, resolution=GRID_RESOLUTION):
+    """Key of the grid cell a coordinate falls into."""
+    if resolution > 0:
+        return (round(float(latitude) / resolution), round(float(longitude) / resolution))
+    return (round(float(latitude), 4), round(float(longitude), 4))
+
+def plan_grid_cells(towns, resolution=GRID_RESOLUTION):
+    """
+    Group towns by grid cell so every cell is requested only once.
+    Each cell is represented by its first town (id, name, coordinates)
+    and carries the ids of all towns sharing it in 'town_ids'.
+    """
+    cells = {}
+    for town in towns:
+        key = grid_cell_key(town['latitude'], town['longitude'], resolution)
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = cell = dict(town, town_ids=[])
+        cell['town_ids'].append(town['id'])
+    return list(cells.values())
+
+def batch_params(towns_data):
+    """Build the Open-Meteo query parameters for a batch of towns."""
+    return {
+        'latitude': ','.join(str(town['latitude']) for town in towns_data),
+        'longitude': ','.join(str(town['longitude']) for town in towns_data),
+        'current': CURRENT_VARIABLES,
+        # Observation times as Unix seconds, i.e. UTC regardless of the location
+        'timeformat': 'unixtime',
+        'timezone': 'GMT'
+    }
+
+def request_url_length(towns_data, build_params=batch_params, url=OPENMETEO_API_URL):
+    """Length of the GET URL a batch request would send for these towns."""
+    return len(url) + 1 + len(urlencode(build_params(towns_data)))
+
+def max_batch_for_url(towns, start, limit, max_url_length=MAX_URL_LENGTH, build_params=batch_params,
+                      url=OPENMETEO_API_URL):
+    """
+    Largest number of towns from towns[start:] (at most `limit`) whose GET
+    request URL stays within `max_url_length`. Always returns at least 1.
+    """
+    length = request_url_length([], build_params, url)
+    count = 0
+    for town in towns[start:start + limit]:
+        # Each further location adds both coordinates plus two encoded commas ('%2C')
+        added = len(str(town['latitude'])) + len(str(town['longitude'])) + (6 if count else 0)
+        if length + added > max_url_length and count:
+            break
+        length += added
+        count += 1
+    return max(1, count)
 
 def create_connection():
-    """Create a database connection using PyMySQL."""
+    """Create a standalone database connection. Raises pymysql.Error on failure."""
     try:
-        connection = pymysql.connect(
-            host=DB_CONFIG['host'],
-            port=DB_CONFIG['port'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            database=DB_CONFIG['database'],
-            charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
+        connection = db_pool.connect()
         print("Successfully connected to MySQL Server")
         return connection
     except Error as e:
         print(f"Error while connecting to MySQL: {e}")
-        sys.exit(1)
+        raise
 
-def drop_weather_table(connection):
-    """Drop weather table if it exists (for schema updates)."""
-    cursor = connection.cursor()
-    try:
-        cursor.execute(f"DROP TABLE IF EXISTS `{WEATHER_TABLE}`")
-        connection.commit()
-        print(f"✅ Dropped existing table '{WEATHER_TABLE}'.")
-    except Error as e:
-        print(f"Error dropping table: {e}")
-    finally:
-        cursor.close()
-
-def create_weather_table(connection):
-    """Create weather table with all available OpenMeteo parameters."""
-    cursor = connection.cursor()
-
-    create_table_query = f"""
-    CREATE TABLE IF NOT EXISTS `{WEATHER_TABLE}` (
-        id INT AUTO_INCREMENT PRIMARY KEY,
+def weather_table_columns(compact=None):
+    """
+    Registry-derived columns of the weather table as (name, sql_type), following
+    `timestamp`. The compact layout stores scaled integers and no descriptions.
+    """
+    compact = weather_variables.WEATHER_COMPACT if compact is None else compact
+    columns = [(variable.column, weather_variables.storage_type(variable, compact))
+               for variable in weather_variables.VARIABLES]
+    if not compact:
+        columns += [('description', 'VARCHAR(255)'), ('weather_main', 'VARCHAR(50)')]
+    return columns
+
+def weather_row_columns(variables, compact=None):
+    """Column names of weather rows built for `variables`, in INSERT order."""
+    compact = weather_variables.WEATHER_COMPACT if compact is None else compact
+    return (['town_id', 'timestamp'] + [variable.column for variable in variables]
+            + ([] if compact else ['description', 'weather_main']))
+
+def weather_table_query(table, compact=None):
+    """CREATE TABLE statement of a weather history table in the decimal or compact layout."""
+    definitions = ',\n'.join(f"        {name} {sql_type}" for name, sql_type in weather_table_columns(compact))
+    # A partitioned table needs the partitioning column in every unique key
+    partitioned = weather_partitions.enabled()
+    return f"""
+    CREATE TABLE IF NOT EXISTS `{table}` (
+        id INT AUTO_INCREMENT,
         town_id INT NOT NULL,
         timestamp DATETIME NOT NULL,
-        temperature DECIMAL(5, 2),
-        relative_humidity INT,
-        apparent_temperature DECIMAL(5, 2),
-        weather_code INT,
-        wind_speed DECIMAL(5, 2),
-        wind_direction INT,
-        wind_gusts DECIMAL(5, 2),
-        pressure_msl INT,
-        cloud_cover INT,
-        uv_index DECIMAL(4, 2),
-        is_day INT,
-        precipitation DECIMAL(5, 2),
-        precipitation_probability INT,
-        dew_point DECIMAL(5, 2),
-        visibility INT,
-        soil_temperature_0cm DECIMAL(5, 2),
-        soil_moisture_0_1cm DECIMAL(5, 2),
-        shortwave_radiation DECIMAL(8, 2),
-        direct_radiation DECIMAL(8, 2),
-        diffuse_radiation DECIMAL(8, 2),
-        direct_normal_irradiance DECIMAL(8, 2),
-        description VARCHAR(255),
-        weather_main VARCHAR(50),
+{definitions},
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY ({'id, timestamp' if partitioned else 'id'}),
         UNIQUE KEY unique_town_timestamp (town_id, timestamp),
-        INDEX idx_town_id (town_id),
         INDEX idx_timestamp (timestamp)
-    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    {weather_partitions.partition_clause() if partitioned else ''};
     """
 
+def stored_layout(connection, table):
+    """Layout of an existing weather table: 'compact', 'decimal', or None if it does not exist."""
+    columns = {name.lower() for name, _ in weather_schema.live_columns(connection, table)}
+    if not columns:
+        return None
+    return 'decimal' if 'description' in columns else 'compact'
+
+# Versioned weather table migrations the column diff cannot express:
+# (version, description, function(connection, table))
+WEATHER_MIGRATIONS = [
+    # Town lookups use the leading column of unique_town_timestamp
+    (1, "drop idx_town_id, redundant with unique_town_timestamp",
+     lambda connection, table: weather_schema.drop_index(connection, table, 'idx_town_id')),
+]
+
+def create_weather_table(connection):
+    """
+    Create the weather table with all available OpenMeteo parameters, or
+    migrate an existing one in place (never dropping it or its history).
+    Switching between the decimal and compact layouts needs the one-off
+    compact_weather_table.py migration, so a mismatch raises ValueError.
+    """
+    layout = stored_layout(connection, WEATHER_TABLE)
+    expected_layout = 'compact' if weather_variables.WEATHER_COMPACT else 'decimal'
+    if layout and layout != expected_layout:
+        raise ValueError(f"Table '{WEATHER_TABLE}' uses the {layout} layout but WEATHER_COMPACT expects "
+                         f"the {expected_layout} layout; run compact_weather_table.py to migrate it")
+
     try:
-        cursor.execute(create_table_query)
-        connection.commit()
-        print(f"✅ Table '{WEATHER_TABLE}' created or already exists.")
+        changes = weather_schema.migrate(connection, WEATHER_TABLE, weather_table_query(WEATHER_TABLE),
+                                         weather_table_columns(), after='timestamp',
+                                         migrations=WEATHER_MIGRATIONS)
+        weather_partitions.ensure_partitioned(connection, WEATHER_TABLE)
+        weather_codes.create_weather_code_table(connection)
+        print(f"✅ Table '{WEATHER_TABLE}' created or up to date ({changes} migrations applied).")
     except Error as e:
-        print(f"⚠️  Error creating table: {e}")
-        print(f"Attempting to recreate table...")
-        try:
-            drop_weather_table(connection)
-            cursor.execute(create_table_query)
-            connection.commit()
-            print(f"✅ Table '{WEATHER_TABLE}' successfully recreated.")
-        except Error as e2:
-            print(f"❌ Error recreating table: {e2}")
-    finally:
-        cursor.close()
+        print(f"❌ Error creating or migrating table '{WEATHER_TABLE}': {e}")
+        raise
+
+def create_latest_table(connection):
+    """
+    Create or migrate the one-row-per-town latest observation table and seed
+    it from the history when it is empty. The table only holds derived rows,
+    so after a layout switch it is dropped and rebuilt from the history.
+    """
+    try:
+        layout = stored_layout(connection, weather_latest.LATEST_TABLE)
+        if layout and layout != stored_layout(connection, WEATHER_TABLE):
+            print(f"Rebuilding '{weather_latest.LATEST_TABLE}' in the layout of '{WEATHER_TABLE}'...")
+            weather_latest.drop_latest_table(connection)
+        changes = weather_schema.migrate(connection, weather_latest.LATEST_TABLE,
+                                         weather_latest.create_query(weather_table_columns()),
+                                         weather_table_columns(), after='timestamp')
+        print(f"✅ Table '{weather_latest.LATEST_TABLE}' created or up to date ({changes} migrations applied).")
+        weather_latest.seed_latest(connection, WEATHER_TABLE,
+                                   ['town_id', 'timestamp'] + [name for name, _ in weather_table_columns()])
+    except Error as e:
+        print(f"❌ Error creating or migrating table '{weather_latest.LATEST_TABLE}': {e}")
+        raise
 
-def get_all_towns(connection):
-    """Get all towns from the database."""
+def get_all_towns(connection, town_range=None):
+    """Get all towns from the database, optionally only ids within town_range (min, max)."""
     cursor = connection.cursor()
     try:
-        cursor.execute(f"SELECT id, latitude, longitude, name FROM `{TOWN_TABLE}`")
+        if town_range:
+            cursor.execute(
+                f"SELECT id, latitude, longitude, name FROM `{TOWN_TABLE}` WHERE id BETWEEN %s AND %s",
+                town_range
+            )
+        else:
+            cursor.execute(f"SELECT id, latitude, longitude, name FROM `{TOWN_TABLE}`")
         towns = cursor.fetchall()
         return towns
     except Error as e:
@@ -135,103 +290,209 @@ def get_all_towns(connection):
     finally:
         cursor.close()
 
+class BatchFetchError(Exception):
+    """
+    A batch request that failed. `bisect` marks failures that splitting the
+    batch can isolate (a rejected coordinate, an unparsable answer or a
+    timeout of a large batch); other failures are transient and retried.
+    """
+
+    def __init__(self, message, bisect=False, timeout=False):
+        super().__init__(message)
+        self.bisect = bisect
+        self.timeout = timeout
+
 def fetch_weather_batch(towns_data):
     """
     Fetch ALL available weather data for multiple coordinates in a single batch request.
     Open-Meteo returns an array of objects, one per location.
-    Returns list of weather data dictionaries with all available parameters.
+    Returns a WeatherColumns buffer with one row per town; raises
+    BatchFetchError on failure.
     """
     try:
-        # Extract coordinates from towns data
-        latitudes = [str(town['latitude']) for town in towns_data]
-        longitudes = [str(town['longitude']) for town in towns_data]
-
         # Request all available current weather parameters from Open-Meteo
-        params = {
-            'latitude': ','.join(latitudes),
-            'longitude': ','.join(longitudes),
-            'current': 'temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m,wind_direction_10m,wind_gusts_10m,pressure_msl,cloud_cover,uv_index,is_day,precipitation_probability,dew_point_2m,visibility,soil_temperature_0cm,soil_moisture_0_1cm,shortwave_radiation,direct_radiation,diffuse_radiation,direct_normal_irradiance',
-            'timezone': 'auto'
-        }
-
-        response = requests.get(OPENMETEO_API_URL, params=params, timeout=30)
-        response.raise_for_status()
-
-        data = response.json()
-        results = []
-
-        # When passing multiple coordinates, Open-Meteo returns an array directly
-        if isinstance(data, list):
-            for location in data:
-                current = location.get('current', {})
-                results.append({
-                    'temperature': current.get('temperature_2m'),
-                    'relative_humidity': current.get('relative_humidity_2m'),
-                    'apparent_temperature': current.get('apparent_temperature'),
-                    'weather_code': current.get('weather_code'),
-                    'wind_speed': current.get('wind_speed_10m'),
-                    'wind_direction': current.get('wind_direction_10m'),
-                    'wind_gusts': current.get('wind_gusts_10m'),
-                    'pressure_msl': current.get('pressure_msl'),
-                    'cloud_cover': current.get('cloud_cover'),
-                    'uv_index': current.get('uv_index'),
-                    'is_day': current.get('is_day'),
-                    'precipitation': current.get('precipitation'),
-                    'precipitation_probability': current.get('precipitation_probability'),
-                    'dew_point': current.get('dew_point_2m'),
-                    'visibility': current.get('visibility'),
-                    'soil_temperature_0cm': current.get('soil_temperature_0cm'),
-                    'soil_moisture_0_1cm': current.get('soil_moisture_0_1cm'),
-                    'shortwave_radiation': current.get('shortwave_radiation'),
-                    'direct_radiation': current.get('direct_radiation'),
-                    'diffuse_radiation': current.get('diffuse_radiation'),
-                    'direct_normal_irradiance': current.get('direct_normal_irradiance'),
-                    'timestamp': datetime.now()
-                })
-
-        return results if results else None
-
+        params = batch_params(towns_data)
+
+        # Very large batches no longer fit into a URL; send them as form body instead
+        method = 'POST' if ALLOW_POST and request_url_length(towns_data) > MAX_URL_LENGTH else 'GET'
+        started = time.monotonic()
+        response = openmeteo_client.request(OPENMETEO_API_URL, params, method=method, stream=True)
+        header_seconds = time.monotonic() - started
+
+        # Stream the location array straight into column buffers; body reads
+        # are timed separately so network and parse time can be told apart
+        with response:
+            chunks = metrics.MeteredChunks(response.iter_content(chunk_size=READ_CHUNK_SIZE))
+            parse_started = time.monotonic()
+            weather = parse_current_chunks(chunks, PROFILE_VARIABLES)
+            parse_seconds = time.monotonic() - parse_started - chunks.read_seconds
+        metrics.HTTP_SECONDS.observe(header_seconds + chunks.read_seconds)
+        metrics.RESPONSE_BYTES.observe(chunks.size)
+        metrics.PARSE_SECONDS.observe(parse_seconds)
+
+        if len(weather) != len(towns_data):
+            raise BatchFetchError(f"Error parsing weather data: expected {len(towns_data)} locations, "
+                                  f"got {len(weather)}", bisect=True)
+        return weather
+
+    except requests.HTTPError as e:
+        # 4xx other than 429 means Open-Meteo rejected something in the request
+        status = e.response.status_code if e.response is not None else None
+        rejected = status is not None and 400 <= status < 500 and status != 429
+        reason = ''
+        if rejected:
+            try:
+                reason = f": {e.response.json().get('reason')}"
+            except ValueError:
+                pass
+        raise BatchFetchError(f"HTTP {status} from Open-Meteo{reason}", bisect=rejected) from e
+    except requests.Timeout as e:
+        raise BatchFetchError(f"Timeout fetching weather from Open-Meteo: {e}", bisect=True, timeout=True) from e
     except requests.RequestException as e:
-        print(f"Error fetching weather from Open-Meteo: {e}")
-        return None
+        raise BatchFetchError(f"Error fetching weather from Open-Meteo: {e}") from e
     except (KeyError, ValueError) as e:
-        print(f"Error parsing weather data: {e}")
-        return None
+        raise BatchFetchError(f"Error parsing weather data: {e}", bisect=True) from e
+
+def fetch_bisecting(towns_batch, fetch_batch, after_timeout=False):
+    """
+    Fetch a batch with fetch_batch(towns), splitting it in halves on
+    failures that bisection can isolate, down to single towns. A timeout
+    splits the batch only once: a half that times out as well goes to the
+    retry queue whole, so an overloaded API costs a few requests per batch
+    instead of one per town. `after_timeout` marks the halves of a batch
+    that timed out.
+    Returns (fetched, retry, failed): (towns, weather) pairs that succeeded,
+    batches that failed transiently, and (town, error) pairs that failed on
+    their own.
+    """
+    try:
+        return [(towns_batch, fetch_batch(towns_batch))], [], []
+    except BatchFetchError as e:
+        if not e.bisect:
+            return [], [towns_batch], []
+        # A single location timing out is more likely the network than its coordinates
+        if e.timeout and (after_timeout or len(towns_batch) == 1):
+            return [], [towns_batch], []
+        if len(towns_batch) == 1:
+            return [], [], [(towns_batch[0], e)]
+        print(f"  Splitting batch of {len(towns_batch)} towns after failure: {e}")
+        middle = len(towns_batch) // 2
+        fetched, retry, failed = fetch_bisecting(towns_batch[:middle], fetch_batch, e.timeout)
+        more_fetched, more_retry, more_failed = fetch_bisecting(towns_batch[middle:], fetch_batch, e.timeout)
+        return fetched + more_fetched, retry + more_retry, failed + more_failed
+
+def fetch_all_weather(towns, max_workers=FETCH_MAX_WORKERS, rate_limiter=None, batch_sizer=None,
+                      on_batch=None):
+    """
+    Fetch weather for all towns with up to `max_workers` batches in flight.
+    A shared token bucket keeps the run within the API quota instead of
+    sleeping a fixed time between batches, and each new batch is sized from
+    the URL limit and the latency/error feedback of the batches before it.
+    Failed batches are bisected to isolate rejected coordinates; transient
+    failures go to a retry queue drained with backoff after the main pass.
+    Returns (towns, weather, failed, unavailable): the fetched towns, a
+    WeatherColumns buffer with one row per town in the same order, (town,
+    error) pairs of the towns bisection isolated as rejected, and (town,
+    reason) pairs of the towns still failing transiently after the retry
+    rounds (an API outage, not a problem of the towns themselves).
+    With `on_batch`, every successful batch is handed to
+    on_batch(towns_batch, weather_batch) instead of being collected; a
+    blocking callback holds back further requests (backpressure).
+    """
+    limiter = rate_limiter or openmeteo_client.get_rate_limiter()
+    sizer = batch_sizer or AdaptiveBatchSizer()
+    variable_count = len(PROFILE_VARIABLES)
+    # Batches never cost more than one full bucket, so no request overdraws the quota by much
+    quota_size = openmeteo_client.max_locations_per_request(variable_count, limiter=limiter)
+
+    def fetch_limited(towns_batch):
+        openmeteo_client.charge(OPENMETEO_API_URL, batch_params(towns_batch), variable_count, limiter=limiter)
+        started = time.monotonic()
+        try:
+            weather_batch = fetch_weather_batch(towns_batch)
+        except BatchFetchError as e:
+            # A rejected coordinate says nothing about the batch size the API can handle
+            if e.timeout or not e.bisect:
+                sizer.record(len(towns_batch), time.monotonic() - started, False)
+            raise
+        sizer.record(len(towns_batch), time.monotonic() - started, True)
+        return weather_batch
+
+    def town_count(towns_batch):
+        return sum(len(town.get('town_ids', ())) or 1 for town in towns_batch)
+
+    all_weather = WeatherColumns(PROFILE_VARIABLES)
+    all_towns = []
+    retry_queue = []
+    failed = []
+    fetched = 0
+    completed = 0
+
+    def collect(towns_batch, result):
+        nonlocal fetched
+        batch_fetched, batch_retry, batch_failed = result
+        for fetched_towns, weather_batch in batch_fetched:
+            fetched += len(fetched_towns)
+            metrics.TOWNS_FETCHED.inc(town_count(fetched_towns))
+            if on_batch:
+                on_batch(fetched_towns, weather_batch)
+            else:
+                all_weather.extend(weather_batch)
+                all_towns.extend(fetched_towns)
+        retry_queue.extend(batch_retry)
+        failed.extend(batch_failed)
+        lost = len(towns_batch) - sum(len(fetched_towns) for fetched_towns, _ in batch_fetched)
+        if lost:
+            print(f"  ⚠️  Batch {completed} partly failed ({lost}/{len(towns_batch)} towns queued for retry "
+                  f"or failed, next batch size {sizer.next_size()})")
+        else:
+            print(f"  Batch {completed} done: {len(towns_batch)} towns "
+                  f"({fetched}/{len(towns)} fetched, next batch size {sizer.next_size()})")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        position = 0
+        in_flight = {}
+        while position < len(towns) or in_flight:
+            # Keep the pool saturated; the rate limiter decides when requests actually go out
+            while position < len(towns) and len(in_flight) < max_workers:
+                batch_size = min(sizer.next_size(), quota_size)
+                if not ALLOW_POST:
+                    batch_size = max_batch_for_url(towns, position, batch_size)
+                towns_batch = towns[position:position + batch_size]
+                position += len(towns_batch)
+                in_flight[executor.submit(fetch_bisecting, towns_batch, fetch_limited)] = towns_batch
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                completed += 1
+                collect(in_flight.pop(future), future.result())
+
+        # Drain the retry queue with growing pauses between rounds
+        for attempt in range(1, RETRY_ROUNDS + 1):
+            if not retry_queue:
+                break
+            retry_batches, retry_queue = retry_queue, []
+            delay = RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            print(f"  Retrying {sum(len(batch) for batch in retry_batches)} towns in {len(retry_batches)} "
+                  f"batches after {delay:g}s (round {attempt}/{RETRY_ROUNDS})...")
+            time.sleep(delay)
+            futures = {executor.submit(fetch_bisecting, batch, fetch_limited): batch for batch in retry_batches}
+            for future in as_completed(futures):
+                completed += 1
+                collect(futures[future], future.result())
+
+    unavailable = [(town, 'still failing after retries') for towns_batch in retry_queue for town in towns_batch]
+    if failed or unavailable:
+        metrics.TOWNS_FAILED.inc(town_count([town for town, _ in failed + unavailable]))
+
+    return all_towns, all_weather, failed, unavailable
 
 def weather_code_to_description(code, is_day=True):
     """
     Convert WMO weather code to German description.
     Based on WMO Weather interpretation codes.
     """
-    wmo_codes = {
-        0: ("Klarer Himmel", "Klar"),
-        1: ("Überwiegend klar", "Klar"),
-        2: ("Teilweise bewölkt", "Bewölkt"),
-        3: ("Bedeckt", "Bewölkt"),
-        45: ("Nebelig", "Nebel"),
-        48: ("Rime-Nebel", "Nebel"),
-        51: ("Leichter Niesel", "Niesel"),
-        53: ("Mäßiger Niesel", "Niesel"),
-        55: ("Dichter Niesel", "Niesel"),
-        61: ("Schwacher Regen", "Regen"),
-        63: ("Mäßiger Regen", "Regen"),
-        65: ("Starker Regen", "Regen"),
-        71: ("Schwacher Schneefall", "Schnee"),
-        73: ("Mäßiger Schneefall", "Schnee"),
-        75: ("Starker Schneefall", "Schnee"),
-        77: ("Schneekörner", "Schnee"),
-        80: ("Schwache Regenschauer", "Regen"),
-        81: ("Mäßige Regenschauer", "Regen"),
-        82: ("Heftige Regenschauer", "Regen"),
-        85: ("Schwache Schneeschauer", "Schnee"),
-        86: ("Starke Schneeschauer", "Schnee"),
-        95: ("Gewitter", "Gewitter"),
-        96: ("Gewitter mit leichtem Hagel", "Gewitter"),
-        99: ("Gewitter mit schweren Hagel", "Gewitter"),
-    }
-
-    description, main = wmo_codes.get(code, ("Unbekannt", "Unbekannt"))
-    return description, main
+    return weather_codes.WMO_CODES.get(code, weather_codes.UNKNOWN)
 
 def insert_or_update_weather(connection, town_id, weather_data):
     """Insert or update weather data for a town."""
@@ -289,240 +550,409 @@ def insert_or_update_weather(connection, town_id, weather_data):
     finally:
         cursor.close()
 
-def insert_all_weather(connection, towns, weather_data_list):
-    """Bulk insert all weather records with all available parameters."""
-    cursor = connection.cursor()
+def build_weather_rows(towns, weather):
+    """
+    Build INSERT parameter rows straight from a WeatherColumns buffer.
+    Entries of `towns` may be grid cells from plan_grid_cells(); their weather
+    is written for every town id in 'town_ids'. In the compact layout values
+    are stored as scaled integers and rows carry no description.
+    """
+    rows = []
+    compact = weather_variables.WEATHER_COMPACT
+    columns = [weather.columns[variable.column] for variable in weather.variables]
+    scales = [weather_variables.stored_scale(variable, compact) for variable in weather.variables]
+    integer_flags = [variable.column in weather.integer_columns or scale > 1
+                     for variable, scale in zip(weather.variables, scales)]
+    codes = weather.columns.get('weather_code')
+    is_day = weather.columns.get('is_day')
+    descriptions = ()
+
+    for i, town in enumerate(towns[:len(weather)]):
+        values = [
+            None if value != value else (round(value * scale) if is_integer else value)
+            for value, is_integer, scale in zip((column[i] for column in columns), integer_flags, scales)
+        ]
+        if not compact:
+            code = codes[i] if codes is not None else NAN
+            day = is_day[i] if is_day is not None else 1
+            descriptions = weather_code_to_description(
+                None if code != code else int(code),
+                True if day != day else bool(day)
+            )
+        for town_id in town.get('town_ids', [town['id']]):
+            rows.append((town_id, weather.observation_time(i), *values, *descriptions))
+    return rows
+
+def filter_new_rows(connection, rows):
+    """
+    Drop rows whose (town_id, timestamp) observation is already stored.
+    Rows of one run share few observation times, so this is one lookup per
+    distinct time on the unique (town_id, timestamp) key.
+    """
+    by_time = {}
+    for row in rows:
+        by_time.setdefault(row[1], []).append(row)
 
+    new_rows = []
+    cursor = connection.cursor()
     try:
-        # Prepare all data for batch insert
-        values_list = []
-        params = []
-
-        for i, town in enumerate(towns):
-            if i < len(weather_data_list) and weather_data_list[i]:
-                weather_data = weather_data_list[i]
-
-                description, weather_main = weather_code_to_description(
-                    weather_data.get('weather_code', 0),
-                    weather_data.get('is_day', True)
-                )
-
-                values_list.append("(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
-                params.extend([
-                    town['id'],
-                    weather_data['timestamp'],
-                    weather_data.get('temperature'),
-                    weather_data.get('relative_humidity'),
-                    weather_data.get('apparent_temperature'),
-                    weather_data.get('weather_code'),
-                    weather_data.get('wind_speed'),
-                    weather_data.get('wind_direction'),
-                    weather_data.get('wind_gusts'),
-                    weather_data.get('pressure_msl'),
-                    weather_data.get('cloud_cover'),
-                    weather_data.get('uv_index'),
-                    weather_data.get('is_day'),
-                    weather_data.get('precipitation'),
-                    weather_data.get('precipitation_probability'),
-                    weather_data.get('dew_point'),
-                    weather_data.get('visibility'),
-                    weather_data.get('soil_temperature_0cm'),
-                    weather_data.get('soil_moisture_0_1cm'),
-                    weather_data.get('shortwave_radiation'),
-                    weather_data.get('direct_radiation'),
-                    weather_data.get('diffuse_radiation'),
-                    weather_data.get('direct_normal_irradiance'),
-                    description,
-                    weather_main
-                ])
-
-        # Build single INSERT with all VALUES
-        if values_list:
-            insert_query = f"""
-            INSERT INTO `{WEATHER_TABLE}`
-            (town_id, timestamp, temperature, relative_humidity, apparent_temperature, weather_code,
-             wind_speed, wind_direction, wind_gusts, pressure_msl, cloud_cover, uv_index, is_day,
-             precipitation, precipitation_probability, dew_point, visibility, soil_temperature_0cm,
-             soil_moisture_0_1cm, shortwave_radiation, direct_radiation, diffuse_radiation,
-             direct_normal_irradiance, description, weather_main)
-            VALUES {','.join(values_list)}
-            ON DUPLICATE KEY UPDATE
-                temperature = VALUES(temperature),
-                relative_humidity = VALUES(relative_humidity),
-                apparent_temperature = VALUES(apparent_temperature),
-                weather_code = VALUES(weather_code),
-                wind_speed = VALUES(wind_speed),
-                wind_direction = VALUES(wind_direction),
-                wind_gusts = VALUES(wind_gusts),
-                pressure_msl = VALUES(pressure_msl),
-                cloud_cover = VALUES(cloud_cover),
-                uv_index = VALUES(uv_index),
-                is_day = VALUES(is_day),
-                precipitation = VALUES(precipitation),
-                precipitation_probability = VALUES(precipitation_probability),
-                dew_point = VALUES(dew_point),
-                visibility = VALUES(visibility),
-                soil_temperature_0cm = VALUES(soil_temperature_0cm),
-                soil_moisture_0_1cm = VALUES(soil_moisture_0_1cm),
-                shortwave_radiation = VALUES(shortwave_radiation),
-                direct_radiation = VALUES(direct_radiation),
-                diffuse_radiation = VALUES(diffuse_radiation),
-                direct_normal_irradiance = VALUES(direct_normal_irradiance),
-                description = VALUES(description),
-                weather_main = VALUES(weather_main),
-                updated_at = CURRENT_TIMESTAMP
-            """
-
-            cursor.execute(insert_query, params)
-            connection.commit()
-            return len(values_list)
-        else:
-            return 0
-
-    except Error as e:
-        print(f"Error inserting bulk weather data: {e}")
-        print(f"Attempting to recreate table and retry...")
-        try:
-            drop_weather_table(connection)
-            create_weather_table(connection)
-            # Retry insert after table recreation
-            cursor = connection.cursor()
-            values_list = []
-            params = []
-
-            for i, town in enumerate(towns):
-                if i < len(weather_data_list) and weather_data_list[i]:
-                    weather_data = weather_data_list[i]
-                    description, weather_main = weather_code_to_description(
-                        weather_data.get('weather_code', 0),
-                        weather_data.get('is_day', True)
-                    )
-                    values_list.append("(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)")
-                    params.extend([
-                        town['id'], weather_data['timestamp'],
-                        weather_data.get('temperature'), weather_data.get('relative_humidity'),
-                        weather_data.get('apparent_temperature'), weather_data.get('weather_code'),
-                        weather_data.get('wind_speed'), weather_data.get('wind_direction'),
-                        weather_data.get('wind_gusts'), weather_data.get('pressure_msl'),
-                        weather_data.get('cloud_cover'), weather_data.get('uv_index'),
-                        weather_data.get('is_day'), weather_data.get('precipitation'),
-                        weather_data.get('precipitation_probability'), weather_data.get('dew_point'),
-                        weather_data.get('visibility'), weather_data.get('soil_temperature_0cm'),
-                        weather_data.get('soil_moisture_0_1cm'), weather_data.get('shortwave_radiation'),
-                        weather_data.get('direct_radiation'), weather_data.get('diffuse_radiation'),
-                        weather_data.get('direct_normal_irradiance'), description, weather_main
-                    ])
-
-            if values_list:
-                insert_query = f"""
-                INSERT INTO `{WEATHER_TABLE}`
-                (town_id, timestamp, temperature, relative_humidity, apparent_temperature, weather_code,
-                 wind_speed, wind_direction, wind_gusts, pressure_msl, cloud_cover, uv_index, is_day,
-                 precipitation, precipitation_probability, dew_point, visibility, soil_temperature_0cm,
-                 soil_moisture_0_1cm, shortwave_radiation, direct_radiation, diffuse_radiation,
-                 direct_normal_irradiance, description, weather_main)
-                VALUES {','.join(values_list)}
-                """
-                cursor.execute(insert_query, params)
-                connection.commit()
-                print(f"✅ Successfully inserted data after table recreation")
-                return len(values_list)
-        except Error as e2:
-            print(f"❌ Failed to recover: {e2}")
-            connection.rollback()
-
-        return 0
+        for timestamp, time_rows in by_time.items():
+            town_ids = [row[0] for row in time_rows]
+            cursor.execute(
+                f"SELECT town_id FROM `{WEATHER_TABLE}` WHERE timestamp = %s AND town_id IN "
+                f"({', '.join(['%s'] * len(town_ids))})",
+                [timestamp] + town_ids
+            )
+            stored = {existing['town_id'] for existing in cursor.fetchall()}
+            new_rows.extend(row for row in time_rows if row[0] not in stored)
     finally:
         cursor.close()
+    return new_rows
 
-def main():
-    """Main function."""
-    print("Starting real weather data fetch from Open-Meteo API...\n")
-
-    # Create connection
-    connection = create_connection()
-
-    if connection:
-        try:
-            # Create weather table
-            create_weather_table(connection)
+def insert_all_weather(connection, towns, weather, chunk_rows=None):
+    """
+    Bulk insert all weather records with all available parameters.
+    `weather` is a WeatherColumns buffer aligned with `towns`; entries of
+    `towns` may be grid cells, fanned out to every town in 'town_ids'.
+    Rows are keyed on the Open-Meteo observation time (UTC); observations
+    already stored are skipped. The bulk-write backend is chosen by row count
+    (see weather_loader); with `chunk_rows`, rows are sent in several
+    statements of at most that size, each retried or narrowed down on its own
+    depending on the error.
+    The latest observation per town is upserted into the latest table as
+    well, only replacing stored rows that are older, and the hourly and
+    daily rollups of the written rows are recomputed.
+    Returns the number of rows stored (written or already present).
+    """
+    columns = weather_row_columns(weather.variables)
+    # Prepare all data for batch insert
+    rows = build_weather_rows(towns, weather)
+    if SKIP_EXISTING and rows:
+        new_rows = filter_new_rows(connection, rows)
+        if len(new_rows) < len(rows):
+            print(f"  Skipped {len(rows) - len(new_rows)} observations already stored.")
+        stored = len(rows) - len(new_rows)
+        metrics.TOWNS_SKIPPED.inc(stored)
+        rows = new_rows
+    else:
+        stored = 0
+    if not rows:
+        return stored
+    loader = select_loader(len(rows))
 
-            # Get all towns
-            towns = get_all_towns(connection)
-            print(f"Found {len(towns)} towns in database.")
+    try:
+        with metrics.INSERT_SECONDS.time():
+            written = load_chunks(connection, loader, WEATHER_TABLE, columns, rows, columns[2:],
+                                  chunk_rows, migrate=create_weather_table)
+    except Error as e:
+        print(f"❌ Error inserting bulk weather data ({loader.name}): {e}")
+        connection.rollback()
+        return stored
+    metrics.TOWNS_WRITTEN.inc(written)
+    stored += written
 
-            if not towns:
-                print("Error: No towns found.")
-                sys.exit(1)
+    try:
+        with metrics.LATEST_SECONDS.time():
+            load_chunks(connection, weather_latest.LATEST_LOADER, weather_latest.LATEST_TABLE, columns,
+                        weather_latest.latest_rows(rows), columns[1:], chunk_rows, migrate=create_latest_table)
+    except Error as e:
+        print(f"❌ Error updating '{weather_latest.LATEST_TABLE}': {e}")
+        connection.rollback()
 
-            # Fetch weather in optimized batches (URL has length limit, so use batch size of 50)
-            print(f"\nFetching weather data for {len(towns)} towns from Open-Meteo (batch requests)...")
+    try:
+        with metrics.ROLLUP_SECONDS.time():
+            weather_rollups.update_rollups(connection, WEATHER_TABLE, rows)
+    except Error as e:
+        print(f"❌ Error updating the weather rollups: {e}")
+        connection.rollback()
+    return stored
 
-            batch_size = 10
-            all_weather = []
-            all_towns = []
-            batch_num = 0
-            total_batches = (len(towns) + batch_size - 1) // batch_size
+def insert_chunk_rows(connection, weather):
+    """
+    Number of weather rows per INSERT statement that stays well below the
+    server's max_allowed_packet, estimated from the size of a rendered row.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT @@max_allowed_packet AS max_allowed_packet")
+        max_packet = int(cursor.fetchone()['max_allowed_packet'])
+        columns = len(weather.variables) + 4
+        # Worst case row: every value as a long number plus description and weather_main
+        sample_row = ['-1234567.123456789'] * (columns - 2) + ['x' * 64, 'x' * 16]
+        row_bytes = len(cursor.mogrify('(' + ', '.join(['%s'] * columns) + '),', sample_row))
+        return max(1, int(max_packet * WRITE_PACKET_FRACTION) // row_bytes)
+    finally:
+        cursor.close()
 
-            for batch_start in range(0, len(towns), batch_size):
-                batch_num += 1
-                batch_end = min(batch_start + batch_size, len(towns))
-                towns_batch = towns[batch_start:batch_end]
+def ingest_weather(cells, writer_connections):
+    """
+    Fetch and write weather as a producer/consumer pipeline.
+    Fetched batches go into a bounded queue (blocking the fetcher when the
+    writers fall behind); one writer thread per connection drains the queue,
+    coalescing batches into INSERT chunks that fit max_allowed_packet.
+    Memory stays bounded by the queue size and rows become visible batch by batch.
+    Returns (towns fetched, rows written, (cell, error) pairs that were
+    rejected, (cell, reason) pairs that failed transiently).
+    """
+    batches = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    chunk_rows = insert_chunk_rows(writer_connections[0], WeatherColumns(PROFILE_VARIABLES))
+    written = []
+    stop = object()
+
+    def writer(connection):
+        rows_written = 0
+        finished = False
+        while not finished:
+            towns_chunk, weather_chunk = batches.get()
+            if towns_chunk is stop:
+                break
+            towns_chunk = list(towns_chunk)
+            # Coalesce whatever else is already waiting, up to one INSERT chunk
+            while len(towns_chunk) < chunk_rows:
+                try:
+                    more_towns, more_weather = batches.get_nowait()
+                except queue.Empty:
+                    break
+                if more_towns is stop:
+                    finished = True
+                    break
+                towns_chunk.extend(more_towns)
+                weather_chunk.extend(more_weather)
+            metrics.WRITE_QUEUE_DEPTH.set(batches.qsize())
+            try:
+                rows_written += insert_all_weather(connection, towns_chunk, weather_chunk, chunk_rows)
+            except Exception as e:
+                # Keep draining the queue so the fetcher never blocks on a dead writer
+                print(f"❌ Writer error, {len(towns_chunk)} grid cells not written: {e}")
+        written.append(rows_written)
+
+    writers = [threading.Thread(target=writer, args=(connection,), daemon=True)
+               for connection in writer_connections]
+    for thread in writers:
+        thread.start()
+
+    fetched = []
+
+    def enqueue(towns_batch, weather_batch):
+        fetched.append(sum(len(cell['town_ids']) for cell in towns_batch))
+        # Blocks while the queue is full, which holds back further fetches
+        batches.put((towns_batch, weather_batch))
+        metrics.WRITE_QUEUE_DEPTH.set(batches.qsize())
 
-                print(f"  Fetching batch {batch_num}/{total_batches} ({batch_end}/{len(towns)} towns)...")
-                weather_batch = fetch_weather_batch(towns_batch)
+    try:
+        _, _, failed, unavailable = fetch_all_weather(cells, on_batch=enqueue)
+    finally:
+        for _ in writers:
+            batches.put((stop, None))
+        for thread in writers:
+            thread.join()
+
+    return sum(fetched), sum(written), failed, unavailable
+
+def setup_schema(connection):
+    """One-time schema setup at startup; fetch cycles issue no DDL."""
+    create_weather_table(connection)
+    maintain_weather_partitions(connection)
+    create_latest_table(connection)
+    if weather_rollups.WEATHER_ROLLUPS:
+        weather_rollups.create_rollup_tables(connection)
+    town_quarantine.create_quarantine_table(connection)
+    weather_data_version.create_version_table(connection)
+    if shard_lease.FETCH_SHARDS > 1:
+        shard_lease.create_lease_table(connection)
+        shard_lease.plan_shards(connection, TOWN_TABLE)
+
+def maintain_weather_partitions(connection):
+    """Create upcoming and drop expired weather partitions (no-op when unpartitioned)."""
+    if weather_partitions.enabled():
+        weather_partitions.maintain_partitions(connection, WEATHER_TABLE)
+
+def fetch_towns(pool, towns):
+    """
+    Fetch and write the current weather of `towns` on pooled connections.
+    Quarantined towns are left out; towns that fail are recorded for the
+    quarantine and recovered ones cleared. Returns (fetched, written).
+    """
+    names = {town['id']: town['name'] for town in towns}
+    with pool.connection() as connection:
+        failing = town_quarantine.failing_towns(connection)
+    quarantined = {town_id for town_id, row in failing.items() if row['quarantined']}
+    if quarantined:
+        fetch_list = [town for town in towns if town['id'] not in quarantined]
+        print(f"Skipping {len(towns) - len(fetch_list)} quarantined towns.")
+        towns = fetch_list
+
+    cells = plan_grid_cells(towns)
+    print(f"Grouped {len(towns)} towns into {len(cells)} grid cells "
+          f"({len(towns) - len(cells)} duplicate requests saved).")
+
+    print(f"\nFetching weather data for {len(cells)} grid cells from Open-Meteo "
+          f"({FETCH_MAX_WORKERS} concurrent batches, {openmeteo_client.API_CALLS_PER_MINUTE:g} API calls/min)...")
+
+    # One pooled connection per writer so writes run in parallel with fetching
+    started = time.monotonic()
+    with ExitStack() as stack:
+        writer_connections = [stack.enter_context(pool.connection())
+                              for _ in range(max(1, min(WRITER_WORKERS, pool.size)))]
+        fetched_count, success_count, failed, unavailable = ingest_weather(cells, writer_connections)
+    print(f"Fetch and write finished in {time.monotonic() - started:.1f}s.")
+
+    # Only towns the API rejected on their own count towards the quarantine;
+    # transient failures say nothing about the towns and are neither recorded nor cleared
+    failed_towns = [
+        ({'id': town_id, 'latitude': cell['latitude'], 'longitude': cell['longitude']}, error)
+        for cell, error in failed for town_id in cell['town_ids']
+    ]
+    failed_ids = {town['id'] for town, _ in failed_towns}
+    unavailable_ids = {town_id for cell, _ in unavailable for town_id in cell['town_ids']}
+    run_ids = {town['id'] for town in towns}
+    with pool.connection() as connection:
+        town_quarantine.record_failures(connection, failed_towns)
+        town_quarantine.clear_towns(connection, [
+            town_id for town_id in failing
+            if town_id in run_ids and town_id not in failed_ids and town_id not in unavailable_ids
+        ])
+        town_quarantine.print_report(connection, names)
+        # Cached API responses of every process go stale once new rows are in
+        if success_count:
+            weather_data_version.bump(connection)
+
+    if fetched_count:
+        error_count = len(towns) - success_count
+
+        print(f"\n✅ Successfully inserted/updated weather for {success_count}/{len(towns)} towns "
+              f"({fetched_count} fetched).")
+        if error_count > 0:
+            print(f"⚠️  {error_count} towns had errors ({len(failed_ids)} rejected by the API, "
+                  f"{len(unavailable_ids)} still failing transiently after retries).")
+    else:
+        print(f"❌ Failed to fetch weather data ({len(failed_ids)} towns rejected by the API, "
+              f"{len(unavailable_ids)} still failing transiently after retries).")
+
+    return fetched_count, success_count
+
+def run_sharded_fetch_job(pool, cycle):
+    """
+    Work through the shards of `cycle` that no other worker holds: claim a
+    shard lease, fetch its towns and mark it done, until every shard is done.
+    While other workers still hold unfinished shards, poll about once per
+    heartbeat so the shard of a worker that dies is taken over when its
+    lease expires, within the same cycle.
+    Returns (towns, towns fetched, rows written) of the shards done here.
+    """
+    town_count = fetched_total = written_total = 0
+    waiting = False
+    while True:
+        with pool.connection() as connection:
+            shard = shard_lease.claim_shard(connection, cycle)
+            pending = shard_lease.pending_shards(connection, cycle) if shard is None else 0
+        if shard is None:
+            if not pending:
+                break
+            if not waiting:
+                print(f"Waiting for {pending} shards held by other workers in cycle {cycle}...")
+                waiting = True
+            time.sleep(shard_lease.SHARD_LEASE_SECONDS / 3)
+            continue
+        waiting = False
+        town_range = (shard['min_town_id'], shard['max_town_id'])
+        print(f"\nWorker {shard_lease.WORKER_ID} claimed shard {shard['shard_id']} (town_id {town_range[0]}..{town_range[1]})")
+        with shard_lease.hold_lease(pool, shard, cycle):
+            with pool.connection() as connection:
+                towns = get_all_towns(connection, town_range)
+            print(f"Found {len(towns)} towns in shard {shard['shard_id']}.")
+            if towns:
+                fetched_count, success_count = fetch_towns(pool, towns)
+                town_count += len(towns)
+                fetched_total += fetched_count
+                written_total += success_count
+
+    print(f"All shards of cycle {cycle} are done; this worker handled {town_count} towns.")
+    if fetched_total:
+        metrics.LAST_SUCCESS.set(time.time())
+    return town_count, fetched_total, written_total
+
+def run_fetch_job(pool=None, cycle=None):
+    """
+    One fetch cycle on borrowed pool connections: read the towns, then fetch
+    and write their current weather. With FETCH_SHARDS > 1 only the shards
+    leased by this worker in `cycle` (default: shard_lease.current_cycle())
+    are fetched. Never exits the process; database errors propagate to the
+    caller. Returns (towns, towns fetched, rows written).
+    """
+    pool = pool or db_pool.get_pool()
+
+    if shard_lease.FETCH_SHARDS > 1:
+        cycle = cycle or shard_lease.current_cycle()
+        return run_sharded_fetch_job(pool, cycle)
+
+    with pool.connection() as connection:
+        towns = get_all_towns(connection)
+    print(f"Found {len(towns)} towns in database.")
+    if not towns:
+        print("Error: No towns found.")
+        return 0, 0, 0
+
+    fetched_count, success_count = fetch_towns(pool, towns)
+    if fetched_count:
+        metrics.LAST_SUCCESS.set(time.time())
+    return len(towns), fetched_count, success_count
+
+def print_latest_weather(connection):
+    """Show the latest 5 weather records."""
+    cursor = connection.cursor()
+    try:
+        shown = [weather_variables.VARIABLES_BY_COLUMN[column] for column in (
+            'temperature', 'relative_humidity', 'apparent_temperature', 'wind_speed', 'wind_direction',
+            'wind_gusts', 'precipitation', 'dew_point', 'visibility'
+        )]
+        cursor.execute(f"""
+            SELECT w.id, w.town_id, t.name,
+{weather_variables.select_list(shown, prefix='w.', indent='                   ')},
+{weather_codes.description_columns(indent='                   ')},
+                   w.timestamp
+            FROM `{WEATHER_TABLE}` w
+            JOIN `{TOWN_TABLE}` t ON w.town_id = t.id
+            {weather_codes.join_clause('w.weather_code')}
+            ORDER BY w.timestamp DESC
+            LIMIT 5
+        """)
+
+        print("\n✅ Latest 5 weather records from database (with all available parameters):")
+        for j, row in enumerate(cursor.fetchall(), 1):
+            print(f"\n{j}. {row['name']}:")
+            print(f"   Temperature: {row['temperature']}°C (feels like {row['apparent_temperature']}°C)")
+            print(f"   Humidity: {row['relative_humidity']}%, Dew Point: {row['dew_point']}°C")
+            print(f"   Wind: {row['wind_speed']} km/h from {row['wind_direction']}°, Gusts: {row['wind_gusts']} km/h")
+            print(f"   Precipitation: {row['precipitation']} mm, Visibility: {row['visibility']} m")
+            print(f"   Condition: {row['description']} ({row['weather_main']})")
+            print(f"   Timestamp: {row['timestamp']}")
+    finally:
+        cursor.close()
 
-                if weather_batch:
-                    all_weather.extend(weather_batch)
-                    all_towns.extend(towns_batch)
+def main():
+    """Main function."""
+    print("Starting real weather data fetch from Open-Meteo API...\n")
 
-                # Delay between batches to respect API rate limits
-                if batch_num < total_batches:
-                    print(f"    Waiting 2 seconds before next batch...")
-                    time.sleep(5)
+    pool = db_pool.get_pool()
+    try:
+        with pool.connection() as connection:
+            print("Successfully connected to MySQL Server")
+            setup_schema(connection)
 
-            if all_weather and all_towns:
-                print(f"✅ Fetched weather data for {len(all_weather)} locations.")
-                print(f"Writing {len(all_weather)} weather records to database...")
+        town_count, fetched_count, _ = run_fetch_job(pool)
+        if not town_count or not fetched_count:
+            sys.exit(1)
 
-                success_count = insert_all_weather(connection, all_towns, all_weather)
-                error_count = len(all_towns) - success_count
+        with pool.connection() as connection:
+            print_latest_weather(connection)
 
-                print(f"\n✅ Successfully inserted/updated weather for {success_count}/{len(all_towns)} towns.")
-                if error_count > 0:
-                    print(f"⚠️  {error_count} towns had errors.")
-            else:
-                print("❌ Failed to fetch weather data.")
-                sys.exit(1)
-
-            # Show sample data
-            cursor = connection.cursor()
-            cursor.execute(f"""
-                SELECT w.id, w.town_id, t.name, w.temperature, w.relative_humidity,
-                       w.apparent_temperature, w.wind_speed, w.wind_direction, w.wind_gusts,
-                       w.precipitation, w.dew_point, w.visibility,
-                       w.description, w.weather_main, w.timestamp
-                FROM `{WEATHER_TABLE}` w
-                JOIN `{TOWN_TABLE}` t ON w.town_id = t.id
-                ORDER BY w.timestamp DESC
-                LIMIT 5
-            """)
-
-            print("\n✅ Latest 5 weather records from database (with all available parameters):")
-            for j, row in enumerate(cursor.fetchall(), 1):
-                print(f"\n{j}. {row['name']}:")
-                print(f"   Temperature: {row['temperature']}°C (feels like {row['apparent_temperature']}°C)")
-                print(f"   Humidity: {row['relative_humidity']}%, Dew Point: {row['dew_point']}°C")
-                print(f"   Wind: {row['wind_speed']} km/h from {row['wind_direction']}°, Gusts: {row['wind_gusts']} km/h")
-                print(f"   Precipitation: {row['precipitation']} mm, Visibility: {row['visibility']} m")
-                print(f"   Condition: {row['description']} ({row['weather_main']})")
-                print(f"   Timestamp: {row['timestamp']}")
-
-            cursor.close()
-
-        finally:
-            connection.close()
-            print("\n✅ Database connection closed.")
+    except Error as e:
+        print(f"Error while connecting to MySQL: {e}")
+        sys.exit(1)
+    finally:
+        pool.close()
+        print("\n✅ Database connection closed.")
 
 if __name__ == '__main__':
     main()
@@ -1,7 +1,10 @@
 import pandas as pd
 from sqlalchemy import create_engine, text
+import argparse
 import os
 from dotenv import load_dotenv
+import weather_codes
+from weather_variables import VARIABLES, select_list
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,28 +17,37 @@ DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 TOWNS_TABLE = os.getenv('DB_TOWN_TABLE', 'towns')
 WEATHER_TABLE = os.getenv('DB_WEATHER_TABLE', 'weather_data')
+LATEST_TABLE = os.getenv('DB_WEATHER_LATEST_TABLE', 'weather_latest')
 
 # Construct MySQL connection URI
 DATABASE_URI = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-def join_towns_and_weather():
-    """Joins towns and weather_data tables on town_id."""
+def join_towns_and_weather(latest=False):
+    """
+    Joins the towns table with the whole weather history, or only with the
+    latest weather per town when `latest` is set.
+    """
+    weather_table = LATEST_TABLE if latest else WEATHER_TABLE
     try:
         engine = create_engine(DATABASE_URI)
 
         print(f"Connecting to MySQL database: {DB_NAME} on {DB_HOST}:{DB_PORT}")
 
-        # SQL query to join the tables
+        # SQL query to join the tables, with values decoded through the registry
+        # and descriptions from the WMO code lookup table
         query = f"""
-            SELECT t.*, w.*
+            SELECT t.*, w.town_id, w.timestamp,
+{select_list(VARIABLES, prefix='w.', indent='                ')},
+{weather_codes.description_columns('c', indent='                ')}
             FROM {TOWNS_TABLE} t
-            INNER JOIN {WEATHER_TABLE} w ON t.id = w.town_id
+            INNER JOIN {weather_table} w ON t.id = w.town_id
+            {weather_codes.join_clause('w.weather_code')}
         """
 
         # Read the joined data into a DataFrame
         df = pd.read_sql(text(query), engine)
 
-        print(f"Successfully joined {TOWNS_TABLE} and {WEATHER_TABLE} tables")
+        print(f"Successfully joined {TOWNS_TABLE} and {weather_table} tables")
         print(f"Total rows: {len(df)}")
         print(f"\nColumns: {list(df.columns)}")
         print(f"\nFirst few rows:")
@@ -48,9 +60,14 @@ def join_towns_and_weather():
         return None
 
 if __name__ == "__main__":
-    result_df = join_towns_and_weather()
+    parser = argparse.ArgumentParser(description="Join towns with their weather.")
+    parser.add_argument('--latest', action='store_true',
+                        help=f"join only the latest weather per town ({LATEST_TABLE}) instead of every row")
+    args = parser.parse_args()
+
+    result_df = join_towns_and_weather(latest=args.latest)
 
     if result_df is not None:
         print("\n✓ Join operation completed successfully")
     else:
-        print("\n✗ Join operation failed")
\ No newline at end of file
+        print("\n✗ Join operation failed")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process metrics for the ingest job, exposed in the Prometheus text format.
+Counters, gauges and histograms are module-level objects updated by the
+fetch pipeline; start_server() serves them on http://0.0.0.0:METRICS_PORT/metrics.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Port of the metrics endpoint served by the scheduler; 0 disables it
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+
+REGISTRY = []
+
+class Counter:
+    """Monotonically increasing value."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0.0
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, '', self.value)]
+
+class Gauge:
+    """Value that goes up and down, or is computed by `function` at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function=None):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.value = 0.0
+        REGISTRY.append(self)
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        return [(self.name, '', self.function() if self.function else self.value)]
+
+class Histogram:
+    """Distribution of observed values over cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value):
+        with self.lock:
+            self.count += 1
+            self.sum += value
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of a `with` block in seconds."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started)
+
+    def samples(self):
+        with self.lock:
+            samples = []
+            cumulative = 0
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", f'{{le="{format_value(bound)}"}}', cumulative))
+            samples.append((f"{self.name}_bucket", '{le="+Inf"}', self.count))
+            samples.append((f"{self.name}_sum", '', self.sum))
+            samples.append((f"{self.name}_count", '', self.count))
+        return samples
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+TOWNS_FETCHED = Counter('openmeteo_towns_fetched_total', 'Towns whose current weather was fetched.')
+TOWNS_FAILED = Counter('openmeteo_towns_failed_total', 'Towns left out because their batch request failed.')
+TOWNS_WRITTEN = Counter('openmeteo_towns_written_total', 'Towns whose weather row was written to the weather table.')
+TOWNS_SKIPPED = Counter('openmeteo_towns_skipped_total', 'Towns whose observation was already stored and not written again.')
+
+HTTP_SECONDS = Histogram('openmeteo_http_batch_seconds',
+                         'Network time of a batch request: time to headers plus body reads.', SECONDS_BUCKETS)
+RESPONSE_BYTES = Histogram('openmeteo_response_bytes', 'Body size of a batch response.', BYTES_BUCKETS)
+PARSE_SECONDS = Histogram('openmeteo_parse_seconds', 'Time spent decoding a batch response, excluding network reads.', SECONDS_BUCKETS)
+INSERT_SECONDS = Histogram('openmeteo_insert_seconds', 'Time to write one writer batch of rows to the weather table.',
+                           SECONDS_BUCKETS)
+LATEST_SECONDS = Histogram('openmeteo_latest_upsert_seconds',
+                           'Time to upsert one writer batch of rows into the latest table.', SECONDS_BUCKETS)
+ROLLUP_SECONDS = Histogram('openmeteo_rollup_seconds', 'Time to recompute the rollups touched by one writer batch.',
+                           SECONDS_BUCKETS)
+
+WRITE_QUEUE_DEPTH = Gauge('openmeteo_write_queue_depth', 'Fetched batches waiting for a database writer.')
+LAST_SUCCESS = Gauge('openmeteo_last_success_timestamp_seconds', 'Unix time of the last successful fetch run.')
+LAST_SUCCESS_AGE = Gauge('openmeteo_last_success_age_seconds', 'Seconds since the last successful fetch run.',
+                         lambda: time.time() - LAST_SUCCESS.value if LAST_SUCCESS.value else float('nan'))
+
+class MeteredChunks:
+    """Iterates over response chunks, accounting the time spent waiting for them and their size."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.read_seconds = 0.0
+        self.size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.monotonic()
+        try:
+            chunk = next(self.chunks)
+        finally:
+            self.read_seconds += time.monotonic() - started
+        self.size += len(chunk)
+        return chunk
+
+def format_value(value):
+    """Sample value as Prometheus expects it (full precision, NaN spelled out)."""
+    value = float(value)
+    return 'NaN' if value != value else repr(value)
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves render() on /metrics."""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are too frequent to log
+        pass
+
+def start_server(port=METRICS_PORT):
+    """Serve the metrics endpoint from a daemon thread. Returns the server, or None if disabled."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    print(f"✅ Metrics served on http://0.0.0.0:{port}/metrics")
+    return server
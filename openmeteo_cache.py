@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache for Open-Meteo responses (SQLite file).
+Multi-location responses are stored one entry per location, keyed by
+endpoint, coordinate, variable set and the model time bucket the request
+falls into, so hits do not depend on how locations were batched. Entries
+expire with the end of their bucket, and the least recently used entries are
+evicted once the cache exceeds its size bound.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+CACHE_ENABLED = os.getenv('OPENMETEO_CACHE', 'true').lower() in ('1', 'true', 'yes')
+CACHE_PATH = os.getenv('OPENMETEO_CACHE_PATH', str(Path(__file__).parent / '.cache' / 'openmeteo.sqlite3'))
+CACHE_MAX_BYTES = int(float(os.getenv('OPENMETEO_CACHE_MAX_MB', 200)) * 1024 * 1024)
+
+# Open-Meteo update cadence per kind of request (seconds per time bucket):
+# `current` values every 15 minutes, forecasts hourly, archive data daily
+CURRENT_BUCKET_SECONDS = 15 * 60
+FORECAST_BUCKET_SECONDS = 60 * 60
+ARCHIVE_BUCKET_SECONDS = 24 * 60 * 60
+
+# Keys per IN (...) lookup, below SQLite's limit on bound parameters
+KEYS_PER_QUERY = 500
+
+class ResponseCache:
+    """Size-bounded LRU cache of response bodies with per-entry expiry."""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self.db.commit()
+
+    def fresh_keys(self, keys):
+        """The subset of `keys` with a fresh entry, without touching their LRU position."""
+        fresh = set()
+        now = time.time()
+        with self.lock:
+            for start in range(0, len(keys), KEYS_PER_QUERY):
+                chunk = keys[start:start + KEYS_PER_QUERY]
+                fresh.update(row[0] for row in self.db.execute(
+                    f"SELECT key FROM responses WHERE key IN ({','.join('?' * len(chunk))}) AND expires_at > ?",
+                    (*chunk, now)
+                ))
+        return fresh
+
+    def get_many(self, keys):
+        """Cached bodies for `keys` in order, None for missing or expired ones."""
+        now = time.time()
+        bodies = {}
+        with self.lock:
+            for start in range(0, len(keys), KEYS_PER_QUERY):
+                chunk = keys[start:start + KEYS_PER_QUERY]
+                placeholders = ','.join('?' * len(chunk))
+                bodies.update((key, body) for key, body in self.db.execute(
+                    f"SELECT key, body FROM responses WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, now)
+                ))
+                self.db.execute(f"UPDATE responses SET last_access = ? WHERE key IN ({placeholders})", (now, *chunk))
+            self.db.commit()
+        return [zlib.decompress(bodies[key]) if key in bodies else None for key in keys]
+
+    def get(self, key):
+        """Cached body for `key`, or None if missing or expired."""
+        return self.get_many([key])[0]
+
+    def put(self, key, body, expires_at):
+        """Store a body, see put_many()."""
+        self.put_many([(key, body, expires_at)])
+
+    def put_many(self, entries):
+        """
+        Store (key, body, expires_at) entries in one transaction, then evict
+        expired and least recently used entries above the size bound.
+        """
+        now = time.time()
+        rows = []
+        for key, body, expires_at in entries:
+            compressed = zlib.compress(body, 1)
+            rows.append((key, compressed, len(compressed), expires_at, now))
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO responses (key, body, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                for entry_key, size in self.db.execute(
+                        "SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self.db.execute("DELETE FROM responses WHERE key = ?", (entry_key,))
+                    total -= size
+            self.db.commit()
+
+def bucket_seconds(url, params):
+    """Length of the model update interval a request's data belongs to."""
+    if 'archive' in url:
+        return ARCHIVE_BUCKET_SECONDS
+    if 'current' in params:
+        return CURRENT_BUCKET_SECONDS
+    return FORECAST_BUCKET_SECONDS
+
+def cache_key(url, params, now=None):
+    """
+    Key and expiry time for a request: the endpoint, all parameters
+    (coordinates, variable set, ranges) and the current model time bucket.
+    Multi-location requests are keyed per location, see location_params().
+    """
+    seconds = bucket_seconds(url, params)
+    bucket = int((now or time.time()) // seconds)
+    canonical = url + '?' + '&'.join(f"{name}={params[name]}" for name in sorted(params))
+    key = hashlib.sha256(f"{canonical}#{bucket}".encode()).hexdigest()
+    return key, (bucket + 1) * seconds
+
+def location_params(params):
+    """
+    One parameter set per location of a multi-location request (comma-joined
+    `latitude`/`longitude` lists), or None if the request has no coordinates.
+    """
+    if 'latitude' not in params or 'longitude' not in params:
+        return None
+    latitudes = str(params['latitude']).split(',')
+    longitudes = str(params['longitude']).split(',')
+    if len(latitudes) != len(longitudes):
+        return None
+    return [dict(params, latitude=latitude, longitude=longitude)
+            for latitude, longitude in zip(latitudes, longitudes)]
+
+_cache = None
+_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide cache instance, or None when caching is disabled."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared HTTP client layer for all Open-Meteo API calls.
+Provides one pooled keep-alive session with gzip and retry/backoff
+(honouring Retry-After on 429/5xx), a process-wide API quota limiter and
+the persistent per-location response cache shared by every fetch path.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from openmeteo_cache import cache_key, get_cache, location_params
+from weather_parser import iter_json_array
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Open-Meteo API URLs
+FORECAST_API_URL = "https://api.open-meteo.com/v1/forecast"
+ARCHIVE_API_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+# Open-Meteo counts every location of a multi-location request as (at least)
+# one API call, and requests with more than 10 variables or more than two
+# weeks of data as several calls.
+API_CALLS_PER_MINUTE = float(os.getenv('OPENMETEO_CALLS_PER_MINUTE', 600))
+
+# Connection pool and retry behaviour
+POOL_SIZE = int(os.getenv('OPENMETEO_POOL_SIZE', 16))
+REQUEST_TIMEOUT = float(os.getenv('OPENMETEO_TIMEOUT', 30))
+MAX_RETRIES = int(os.getenv('OPENMETEO_MAX_RETRIES', 4))
+BACKOFF_FACTOR = float(os.getenv('OPENMETEO_BACKOFF_FACTOR', 1.0))
+BACKOFF_MAX = float(os.getenv('OPENMETEO_BACKOFF_MAX', 60))
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+USER_AGENT = "OpenMeteo-Fetcher/0.1 (+python-requests)"
+
+_session = None
+_rate_limiter = None
+_lock = threading.Lock()
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting API usage to a budget per minute.
+    Workers block in acquire() until enough tokens have been refilled.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        # Allow a burst of roughly ten seconds worth of budget by default
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Block until `tokens` are available, then consume them. Returns seconds waited.
+        A request costing more than the capacity waits for a full bucket and
+        leaves it in debt, so later callers wait until the whole cost is refilled.
+        """
+        needed = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return waited
+                delay = (needed - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+def api_call_cost(location_count, variable_count, days=1):
+    """Number of Open-Meteo API calls a multi-location request is billed as."""
+    return location_count * max(1, -(-variable_count // 10)) * max(1, -(-days // 14))
+
+def max_locations_per_request(variable_count, days=1, limiter=None):
+    """Most locations a request may hold without costing more API calls than the rate limiter's capacity."""
+    limiter = limiter or get_rate_limiter()
+    return max(1, int(limiter.capacity // api_call_cost(1, variable_count, days)))
+
+def get_rate_limiter():
+    """Process-wide token bucket shared by every Open-Meteo caller."""
+    global _rate_limiter
+    with _lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(API_CALLS_PER_MINUTE)
+        return _rate_limiter
+
+def create_session():
+    """Create a requests session with connection pooling, gzip and retry/backoff."""
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        backoff_max=BACKOFF_MAX,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(['GET', 'POST']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive'
+    })
+    return session
+
+def get_session():
+    """Shared session, created on first use. Keeps TLS connections alive across batches."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+class CachedResponse:
+    """Response replayed from the on-disk cache, with the parts of the requests API callers use."""
+
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, body):
+        self.content = body
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class CachingResponse:
+    """
+    Wraps the streamed response for the uncached locations of a request and
+    yields the location array of the whole request: cached locations are
+    spliced in at their positions, fetched ones are passed on as they are
+    decoded and stored per location once the response has been read
+    completely, so callers keep parsing incrementally.
+    """
+
+    from_cache = False
+
+    def __init__(self, response, cache, bodies, keys):
+        self.response = response
+        self.status_code = response.status_code
+        self.cache = cache
+        self.bodies = bodies
+        self.keys = keys
+
+    def iter_content(self, chunk_size=1):
+        fetched = iter_json_array(self.response.iter_content(chunk_size=chunk_size))
+        entries = []
+        yield b'['
+        for index, body in enumerate(self.bodies):
+            if body is None:
+                location = next(fetched, None)
+                if location is None:
+                    # Short response; the caller notices the missing locations
+                    break
+                body = json.dumps(location, separators=(',', ':')).encode()
+                key, expires_at = self.keys[index]
+                entries.append((key, body, expires_at))
+            yield (b',' if index else b'') + body
+        yield b']'
+        if entries:
+            self.cache.put_many(entries)
+
+    def json(self):
+        return json.loads(b''.join(self.iter_content(chunk_size=64 * 1024)))
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def uncached_locations(url, params):
+    """Number of locations of a request the cache cannot answer, i.e. that cost API quota."""
+    locations = location_params(params)
+    count = len(locations) if locations else 1
+    cache = get_cache()
+    if cache is None or locations is None:
+        return count
+    keys = [cache_key(url, location)[0] for location in locations]
+    fresh = cache.fresh_keys(keys)
+    return sum(1 for key in keys if key not in fresh)
+
+def charge(url, params, variable_count, days=1, limiter=None):
+    """
+    Take the API calls a request is billed as from the rate limiter before
+    it is sent. Only locations the cache cannot answer cost quota. Returns
+    seconds waited.
+    """
+    uncached = uncached_locations(url, params)
+    if not uncached:
+        return 0.0
+    return (limiter or get_rate_limiter()).acquire(api_call_cost(uncached, variable_count, days))
+
+def request(url, params, method='GET', timeout=REQUEST_TIMEOUT, stream=False):
+    """
+    Send a request to an Open-Meteo endpoint through the shared session.
+    Locations with a fresh cached response for the same coordinate,
+    variables and model time bucket are answered from the on-disk cache and
+    only the others are requested; the result is always the location array
+    of the whole request. Transient failures are retried with exponential
+    backoff before an exception is raised; the final response is checked
+    with raise_for_status().
+    With stream=True the body is left unread for incremental parsing.
+    """
+    cache = get_cache()
+    locations = location_params(params) if cache is not None else None
+    if locations is not None:
+        keys = [cache_key(url, location) for location in locations]
+        bodies = cache.get_many([key for key, _ in keys])
+        missing = [location for location, body in zip(locations, bodies) if body is None]
+        if not missing:
+            return CachedResponse(b'[' + b','.join(bodies) + b']')
+        params = dict(params,
+                      latitude=','.join(location['latitude'] for location in missing),
+                      longitude=','.join(location['longitude'] for location in missing))
+
+    session = get_session()
+    if method == 'POST':
+        response = session.post(url, data=params, timeout=timeout, stream=stream)
+    else:
+        response = session.get(url, params=params, timeout=timeout, stream=stream)
+    try:
+        response.raise_for_status()
+    except requests.HTTPError:
+        response.close()
+        raise
+
+    if locations is not None:
+        return CachingResponse(response, cache, bodies, keys)
+    return response
@@ -1,37 +1,203 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Schedules the weather data fetcher to run at regular intervals.
+Schedules the weather data fetcher on wall-clock boundaries aligned to the
+Open-Meteo update cadence, without drift and without overlapping runs.
+All jobs share one process-wide database connection pool; the schema is
+set up once at startup and jobs report errors instead of exiting.
 """
 
-import schedule
+import os
+import random
+import threading
 import time
 import sys
-from fetch_weather_from_openmeteo import main as fetch_weather_main
+from datetime import datetime
+from pymysql import Error
+import db_pool
+import metrics
+import weather_api
+import weather_partitions
+from fetch_weather_from_openmeteo import maintain_weather_partitions, run_fetch_job, setup_schema
+from fetch_forecast_from_openmeteo import create_forecast_table, run_forecast_job
+from shard_lease import SCHEDULE_INTERVAL_SECONDS, current_cycle
+
+# Weather ticks fire on wall-clock boundaries of SCHEDULE_INTERVAL_SECONDS
+# (the Open-Meteo `current` update interval, :00/:15/:30/:45, by default),
+# OFFSET seconds later to give the new data time to be published, plus up to
+# JITTER random seconds.
+SCHEDULE_OFFSET_SECONDS = float(os.getenv('SCHEDULE_OFFSET_SECONDS', 60))
+SCHEDULE_JITTER_SECONDS = float(os.getenv('SCHEDULE_JITTER_SECONDS', 15))
+# What a tick does while the previous run is still going:
+# 'skip' drops it, 'merge' runs once more right after the current run
+SCHEDULE_OVERLAP = os.getenv('SCHEDULE_OVERLAP', 'merge')
+
+# Partition maintenance interval (with WEATHER_PARTITIONING)
+PARTITION_MAINTENANCE_HOURS = int(os.getenv('PARTITION_MAINTENANCE_HOURS', 24))
+
+# Hourly forecast refresh interval; 0 disables the forecast job
+FORECAST_EVERY_HOURS = int(os.getenv('FORECAST_EVERY_HOURS', 0))
+
+def next_boundary(now, interval, offset=0.0):
+    """First wall-clock time after `now` that is a multiple of `interval` plus `offset` (epoch seconds)."""
+    return ((now - offset) // interval + 1) * interval + offset
+
+class AlignedJob:
+    """
+    Runs a function on wall-clock-aligned ticks in its own thread.
+    Every tick target is derived from the wall clock rather than from the
+    previous run, so the schedule never drifts by the job's runtime, and at
+    most one run is in progress at any time.
+    """
+
+    def __init__(self, name, func, interval, offset=SCHEDULE_OFFSET_SECONDS,
+                 jitter=SCHEDULE_JITTER_SECONDS, overlap=SCHEDULE_OVERLAP):
+        if overlap not in ('skip', 'merge'):
+            raise ValueError(f"Unknown overlap policy '{overlap}', expected 'skip' or 'merge'")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.offset = offset
+        self.jitter = jitter
+        self.overlap = overlap
+        self.lock = threading.Lock()
+        self.running = False
+        self.merged = False
+        self.plan(time.time())
+
+    def plan(self, now):
+        """Pick the next tick: the scheduled boundary and the jittered start time."""
+        self.scheduled = next_boundary(now, self.interval, self.offset)
+        self.due = self.scheduled + random.uniform(0, self.jitter)
+
+    def tick(self, now):
+        """Start a run for the due tick, or skip/merge it while a run is in progress."""
+        label = datetime.fromtimestamp(self.scheduled).strftime('%H:%M:%S')
+        lag = now - self.due
+        with self.lock:
+            if self.running:
+                if self.overlap == 'merge':
+                    self.merged = True
+                    print(f"⏱️  {self.name} tick {label}: previous run still in progress, merged into a follow-up run")
+                else:
+                    print(f"⚠️  {self.name} tick {label}: previous run still in progress, skipped")
+                self.plan(now)
+                return
+            self.running = True
+        print(f"⏱️  {self.name} tick {label}: started {lag:.2f}s after its due time")
+        self.plan(now)
+        threading.Thread(target=self.run, name=self.name, daemon=True).start()
+
+    def run(self):
+        """Run the job, then any tick merged into it while it was running."""
+        while True:
+            started = time.monotonic()
+            self.func()
+            print(f"⏱️  {self.name} run took {time.monotonic() - started:.1f}s")
+            with self.lock:
+                if not self.merged:
+                    self.running = False
+                    return
+                self.merged = False
+
+    def start_now(self):
+        """Run once immediately (at startup), outside the tick schedule."""
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self.run, name=self.name, daemon=True).start()
+
+def run_scheduler(jobs, stop=None):
+    """Sleep until the next due tick and fire it, until `stop` is set."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        now = time.time()
+        due_jobs = [job for job in jobs if job.due <= now]
+        for job in due_jobs:
+            job.tick(now)
+        if not due_jobs:
+            # Wake at the due time; capped so wall-clock jumps are picked up
+            stop.wait(min(60.0, min(job.due for job in jobs) - now))
+
+schema_ready = False
+
+def ensure_schema():
+    """Create the tables once; retried by the next job if the database was unreachable."""
+    global schema_ready
+    if schema_ready:
+        return
+    with db_pool.get_pool().connection() as connection:
+        setup_schema(connection)
+        if FORECAST_EVERY_HOURS > 0:
+            create_forecast_table(connection)
+    schema_ready = True
 
 def job():
     """Defines the job to be scheduled."""
     print("Running scheduled weather data fetch...")
     try:
-        fetch_weather_main()
+        ensure_schema()
+        # Workers sharing shard leases agree on the cycle through the aligned wall clock
+        _, _, written = run_fetch_job(db_pool.get_pool(), cycle=current_cycle())
+        # Cached API responses are stale once new rows are in
+        if written:
+            weather_api.invalidate()
         print("Scheduled weather data fetch finished successfully.")
     except Exception as e:
         print(f"An error occurred during the scheduled job: {e}")
 
+def forecast_job():
+    """Fetches the hourly forecast, one request per batch covering the whole horizon."""
+    print("Running scheduled forecast fetch...")
+    try:
+        ensure_schema()
+        run_forecast_job(db_pool.get_pool())
+        print("Scheduled forecast fetch finished successfully.")
+    except Exception as e:
+        print(f"An error occurred during the scheduled forecast job: {e}")
+
+def partition_job():
+    """Creates upcoming and drops expired weather table partitions."""
+    print("Running scheduled partition maintenance...")
+    try:
+        ensure_schema()
+        with db_pool.get_pool().connection() as connection:
+            maintain_weather_partitions(connection)
+        print("Scheduled partition maintenance finished successfully.")
+    except Exception as e:
+        print(f"An error occurred during partition maintenance: {e}")
+
 if __name__ == "__main__":
-    # Schedule the job every 60 minutes
-    schedule.every(60).minutes.do(job)
+    metrics.start_server()
+    weather_api.start_server()
+
+    try:
+        ensure_schema()
+    except Error as e:
+        print(f"⚠️  Database not available for schema setup, retrying with the first job: {e}")
 
-    print("Scheduler started. The weather data will be updated every 60 minutes.")
+    jobs = [AlignedJob('weather', job, SCHEDULE_INTERVAL_SECONDS)]
+    if FORECAST_EVERY_HOURS > 0:
+        jobs.append(AlignedJob('forecast', forecast_job, FORECAST_EVERY_HOURS * 3600))
+        print(f"Hourly forecasts will be refreshed every {FORECAST_EVERY_HOURS} hours.")
+    # Partitions are already maintained by the schema setup, so this job only runs on its ticks
+    partition_jobs = []
+    if weather_partitions.enabled():
+        partition_jobs.append(AlignedJob('partitions', partition_job, PARTITION_MAINTENANCE_HOURS * 3600))
+
+    print(f"Scheduler started. The weather data will be updated every {SCHEDULE_INTERVAL_SECONDS // 60} minutes "
+          f"on the clock, {SCHEDULE_OFFSET_SECONDS:g}s after each boundary (+ up to {SCHEDULE_JITTER_SECONDS:g}s jitter).")
     print("Press Ctrl+C to exit.")
 
-    # Run the job immediately for the first time
-    job()
+    # Run the jobs immediately for the first time
+    for scheduled_job in jobs:
+        scheduled_job.start_now()
 
-    while True:
-        try:
-            schedule.run_pending()
-            time.sleep(1)
-        except KeyboardInterrupt:
-            print("\nScheduler stopped by user.")
-            sys.exit(0)
+    try:
+        run_scheduler(jobs + partition_jobs)
+    except KeyboardInterrupt:
+        db_pool.get_pool().close()
+        weather_api.get_pool().close()
+        print("\nScheduler stopped by user.")
+        sys.exit(0)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DB-backed shard leases for running the fetch job on several workers.
+The town set is split into FETCH_SHARDS town_id ranges stored in a lease
+table. Every fetch cycle each worker claims shards not yet done in that
+cycle, keeps its lease alive with a heartbeat while it works, and marks the
+shard done afterwards. A lease that is not renewed expires, so the shards
+of a dead worker are taken over by the others.
+"""
+
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+from pymysql import Error
+from openmeteo_cache import CURRENT_BUCKET_SECONDS
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+SHARD_LEASE_TABLE = os.getenv('DB_SHARD_LEASE_TABLE', 'weather_shard_lease')
+# Number of town_id ranges; 1 disables sharding (one worker fetches everything)
+FETCH_SHARDS = int(os.getenv('FETCH_SHARDS', 1))
+# Lease duration; the heartbeat renews it every third of that
+SHARD_LEASE_SECONDS = int(os.getenv('SHARD_LEASE_SECONDS', 120))
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+# Length of a fetch cycle: the scheduler's tick interval, aligned to the Open-Meteo `current`
+# update interval by default. Manual runs number their cycles on the same scale
+SCHEDULE_INTERVAL_SECONDS = int(os.getenv('SCHEDULE_INTERVAL_SECONDS', CURRENT_BUCKET_SECONDS))
+
+# Upper bound of the last shard, so towns added later are always covered
+MAX_TOWN_ID = 2 ** 31 - 1
+
+def create_lease_table(connection):
+    """Create the shard lease table."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{SHARD_LEASE_TABLE}` (
+            shard_id INT PRIMARY KEY,
+            min_town_id INT NOT NULL,
+            max_town_id INT NOT NULL,
+            owner VARCHAR(128) NULL,
+            lease_until DATETIME(3) NULL,
+            done_cycle BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        connection.commit()
+        print(f"✅ Table '{SHARD_LEASE_TABLE}' created or already exists.")
+    finally:
+        cursor.close()
+
+def current_cycle(now=None):
+    """Number of the fetch cycle at `now` (default: the current time), shared by every worker."""
+    return int((time.time() if now is None else now) // SCHEDULE_INTERVAL_SECONDS)
+
+def split_ranges(town_ids, shard_count):
+    """Split sorted town ids into `shard_count` contiguous (min, max) ranges of about equal size."""
+    if not town_ids:
+        return [(0, MAX_TOWN_ID)]
+    shard_count = max(1, min(shard_count, len(town_ids)))
+    starts = [town_ids[len(town_ids) * index // shard_count] for index in range(shard_count)]
+    starts[0] = 0
+    ends = [start - 1 for start in starts[1:]] + [MAX_TOWN_ID]
+    return list(zip(starts, ends))
+
+def plan_shards(connection, town_table, shard_count=FETCH_SHARDS):
+    """
+    Store the shard ranges unless the table already holds `shard_count` shards.
+    A named lock keeps workers starting at the same time from planning twice.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 30) AS locked", (SHARD_LEASE_TABLE,))
+        if not cursor.fetchone()['locked']:
+            raise Error(f"Could not lock '{SHARD_LEASE_TABLE}' for shard planning")
+        try:
+            cursor.execute(f"SELECT COUNT(*) AS shards FROM `{SHARD_LEASE_TABLE}`")
+            if cursor.fetchone()['shards'] == shard_count:
+                return
+            cursor.execute(f"SELECT id FROM `{town_table}` ORDER BY id")
+            ranges = split_ranges([row['id'] for row in cursor.fetchall()], shard_count)
+            cursor.execute(f"DELETE FROM `{SHARD_LEASE_TABLE}`")
+            cursor.executemany(
+                f"INSERT INTO `{SHARD_LEASE_TABLE}` (shard_id, min_town_id, max_town_id) VALUES (%s, %s, %s)",
+                [(shard_id, low, high) for shard_id, (low, high) in enumerate(ranges)]
+            )
+            connection.commit()
+            print(f"✅ Planned {len(ranges)} town_id shards in '{SHARD_LEASE_TABLE}'.")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (SHARD_LEASE_TABLE,))
+            cursor.fetchall()
+    finally:
+        cursor.close()
+
+def claim_shard(connection, cycle, owner=WORKER_ID, lease_seconds=SHARD_LEASE_SECONDS):
+    """
+    Lease one shard that is not done in `cycle` and not leased by a live worker.
+    Returns the shard row (shard_id, min_town_id, max_town_id) or None when
+    nothing is left to claim.
+    """
+    cursor = connection.cursor()
+    try:
+        # SKIP LOCKED lets concurrent workers claim different shards without waiting
+        cursor.execute(f"""
+            SELECT shard_id, min_town_id, max_town_id, owner
+            FROM `{SHARD_LEASE_TABLE}`
+            WHERE done_cycle < %s AND (owner IS NULL OR lease_until < NOW(3))
+            ORDER BY shard_id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """, (cycle,))
+        shard = cursor.fetchone()
+        if shard is None:
+            connection.commit()
+            return None
+        cursor.execute(
+            f"UPDATE `{SHARD_LEASE_TABLE}` SET owner = %s, lease_until = NOW(3) + INTERVAL %s SECOND "
+            f"WHERE shard_id = %s",
+            (owner, lease_seconds, shard['shard_id'])
+        )
+        connection.commit()
+        if shard['owner'] and shard['owner'] != owner:
+            print(f"⚠️  Took over shard {shard['shard_id']} from expired worker {shard['owner']}")
+        return shard
+    except Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def pending_shards(connection, cycle):
+    """Number of shards not done in `cycle`, whether leased or not."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT COUNT(*) AS pending FROM `{SHARD_LEASE_TABLE}` WHERE done_cycle < %s", (cycle,))
+        pending = cursor.fetchone()['pending']
+        connection.commit()
+        return pending
+    finally:
+        cursor.close()
+
+def renew_lease(connection, shard_id, owner=WORKER_ID, lease_seconds=SHARD_LEASE_SECONDS):
+    """Extend a held lease. Returns False if the lease was lost to another worker."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"UPDATE `{SHARD_LEASE_TABLE}` SET lease_until = NOW(3) + INTERVAL %s SECOND "
+            f"WHERE shard_id = %s AND owner = %s",
+            (lease_seconds, shard_id, owner)
+        )
+        connection.commit()
+        return cursor.rowcount == 1
+    finally:
+        cursor.close()
+
+def finish_shard(connection, shard_id, cycle=None, owner=WORKER_ID):
+    """Release a held lease, marking the shard done for `cycle` if given."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"UPDATE `{SHARD_LEASE_TABLE}` SET owner = NULL, lease_until = NULL, "
+            f"done_cycle = GREATEST(done_cycle, %s) WHERE shard_id = %s AND owner = %s",
+            (cycle or 0, shard_id, owner)
+        )
+        connection.commit()
+        return cursor.rowcount == 1
+    finally:
+        cursor.close()
+
+@contextmanager
+def hold_lease(pool, shard, cycle, owner=WORKER_ID, lease_seconds=SHARD_LEASE_SECONDS):
+    """
+    Keep a claimed shard's lease alive while the block runs, then mark the
+    shard done for `cycle`; if the block fails the lease is released so
+    another worker can retry the shard in the same cycle.
+    """
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(lease_seconds / 3):
+            try:
+                with pool.connection() as connection:
+                    if not renew_lease(connection, shard['shard_id'], owner, lease_seconds):
+                        print(f"⚠️  Lease on shard {shard['shard_id']} was taken over by another worker")
+                        return
+            except Error as e:
+                print(f"⚠️  Could not renew lease on shard {shard['shard_id']}: {e}")
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    completed = False
+    try:
+        yield
+        completed = True
+    finally:
+        stop.set()
+        thread.join()
+        with pool.connection() as connection:
+            finish_shard(connection, shard['shard_id'], cycle if completed else None, owner)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Quarantine for towns whose coordinates keep failing at Open-Meteo.
+Every run records the towns it could not fetch; after QUARANTINE_AFTER
+consecutive failed runs a town is left out of the fetch for QUARANTINE_HOURS
+and then tried again. A successful fetch clears its record.
+"""
+
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+QUARANTINE_TABLE = os.getenv('DB_QUARANTINE_TABLE', 'weather_fetch_quarantine')
+QUARANTINE_AFTER = int(os.getenv('QUARANTINE_AFTER', 3))
+QUARANTINE_HOURS = int(os.getenv('QUARANTINE_HOURS', 24))
+
+def create_quarantine_table(connection):
+    """Create the table of failing towns."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{QUARANTINE_TABLE}` (
+            town_id INT PRIMARY KEY,
+            latitude DECIMAL(10, 7) NOT NULL,
+            longitude DECIMAL(10, 7) NOT NULL,
+            failures INT NOT NULL DEFAULT 0,
+            last_error VARCHAR(255),
+            first_failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            quarantined_until DATETIME NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        connection.commit()
+        print(f"✅ Table '{QUARANTINE_TABLE}' created or already exists.")
+    finally:
+        cursor.close()
+
+def failing_towns(connection):
+    """All recorded towns: {town_id: row} with failures and quarantined_until."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"SELECT town_id, failures, last_error, quarantined_until, "
+            f"quarantined_until > NOW() AS quarantined FROM `{QUARANTINE_TABLE}`"
+        )
+        return {row['town_id']: row for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def record_failures(connection, failures):
+    """
+    Count one more failed run for every (town, error) in `failures`; towns
+    reaching QUARANTINE_AFTER failures are quarantined for QUARANTINE_HOURS.
+    """
+    if not failures:
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.executemany(
+            f"INSERT INTO `{QUARANTINE_TABLE}` (town_id, latitude, longitude, failures, last_error) "
+            f"VALUES (%s, %s, %s, 1, %s) "
+            f"ON DUPLICATE KEY UPDATE failures = failures + 1, last_error = VALUES(last_error), "
+            f"latitude = VALUES(latitude), longitude = VALUES(longitude)",
+            [(town['id'], town['latitude'], town['longitude'], str(error)[:255]) for town, error in failures]
+        )
+        cursor.execute(
+            f"UPDATE `{QUARANTINE_TABLE}` SET quarantined_until = NOW() + INTERVAL %s HOUR "
+            f"WHERE failures >= %s AND (quarantined_until IS NULL OR quarantined_until <= NOW())",
+            (QUARANTINE_HOURS, QUARANTINE_AFTER)
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+
+def clear_towns(connection, town_ids):
+    """Forget the failure record of towns that were fetched successfully."""
+    if not town_ids:
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"DELETE FROM `{QUARANTINE_TABLE}` WHERE town_id IN ({', '.join(['%s'] * len(town_ids))})",
+            list(town_ids)
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+
+def print_report(connection, names=None):
+    """Print the currently quarantined towns."""
+    names = names or {}
+    quarantined = [row for row in failing_towns(connection).values() if row['quarantined']]
+    if not quarantined:
+        return
+    print(f"⚠️  {len(quarantined)} towns are quarantined after {QUARANTINE_AFTER}+ failed runs:")
+    for row in sorted(quarantined, key=lambda row: row['town_id']):
+        print(f"   {row['town_id']} {names.get(row['town_id'], '')}: {row['failures']} failures, "
+              f"until {row['quarantined_until']} ({row['last_error']})")
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Read-only HTTP/JSON API for current and historical weather.
+
+    GET /latest?country=AT&region=Tirol&limit=100&after=<cursor>
+        Latest weather of every town, optionally of one country or region,
+        ordered by country, region and name.
+    GET /towns/<id>/latest
+        Latest weather of one town.
+    GET /towns/<id>/series?since=2024-01-01&until=2024-02-01&limit=500&after=<cursor>
+        Observations of one town in time order.
+
+Lists are paginated with keysets instead of offsets: the response's `next`
+cursor holds the sort key of its last row and the next page continues after
+it, so every page is an index range scan on the towns (country, region, name,
+id) index that create_indexes.py --apply builds, or on the weather table's
+(town_id, timestamp) key. The keyset is spelled out as ORs and ANDs because
+MySQL does not use an index range for a row comparison such as
+(region, name, id) > (...). At startup the API explains a page query and
+warns if it would sort the towns instead of reading them in index order.
+
+Rendered responses are kept in an in-process LRU cache. The scheduler clears
+it after every run that wrote rows (invalidate()); a standalone API process
+notices new data, from ingest runs and backfills alike, by reading the
+version row of weather_data_version every API_CACHE_CHECK_SECONDS.
+
+Usage:
+    python weather_api.py [--port 8080]
+"""
+
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from pymysql import Error
+import db_pool
+import weather_codes
+import weather_data_version
+import weather_variables
+from fetch_weather_from_openmeteo import TOWN_TABLE, WEATHER_TABLE
+from weather_latest import LATEST_TABLE
+
+# Port of the API; 0 keeps the scheduler from serving it
+API_PORT = int(os.getenv('API_PORT', 0))
+# Cached responses, and how often a standalone API polls for new data (0 = only invalidate())
+API_CACHE_ENTRIES = int(os.getenv('API_CACHE_ENTRIES', 2000))
+API_CACHE_CHECK_SECONDS = float(os.getenv('API_CACHE_CHECK_SECONDS', 5))
+# The API's own connection pool, so bursts of reads and ingest runs never wait for each other's
+# connections; a request waits at most API_POOL_TIMEOUT for one before answering 503
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', 4))
+API_POOL_TIMEOUT = float(os.getenv('API_POOL_TIMEOUT', 5))
+# Page sizes of the list endpoints
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 1000))
+API_SERIES_PAGE_SIZE = int(os.getenv('API_SERIES_PAGE_SIZE', 500))
+API_SERIES_MAX_PAGE_SIZE = int(os.getenv('API_SERIES_MAX_PAGE_SIZE', 5000))
+
+# Sort key of the latest weather lists; `id` breaks ties between towns of the same name
+TOWN_KEY = ('country', 'region', 'name', 'id')
+TOWN_COLUMNS = ('id', 'name', 'country', 'region', 'population', 'latitude', 'longitude', 'elevation')
+
+class ResponseCache:
+    """Thread-safe LRU of rendered response bodies, keyed by request path and query."""
+
+    def __init__(self, max_entries=API_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+CACHE = ResponseCache()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Connection pool of the API, separate from the ingest pool (db_pool.get_pool())."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = db_pool.ConnectionPool(size=API_POOL_SIZE, timeout=API_POOL_TIMEOUT)
+        return _pool
+
+class DataVersion:
+    """
+    Clears the cache when the weather data version changed, checked at most
+    every `interval` seconds by whichever request comes first.
+    """
+
+    def __init__(self, interval=API_CACHE_CHECK_SECONDS):
+        self.interval = interval
+        self.checked = 0.0
+        self.version = None
+        self.lock = threading.Lock()
+
+    def check(self, connection_source):
+        if self.interval <= 0 or time.monotonic() - self.checked < self.interval:
+            return
+        # One request probes while the others keep serving from the cache
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            with connection_source() as connection:
+                version = weather_data_version.current(connection)
+            if version != self.version:
+                self.version = version
+                CACHE.clear()
+            self.checked = time.monotonic()
+        finally:
+            self.lock.release()
+
+DATA_VERSION = DataVersion()
+
+def invalidate():
+    """Drop all cached responses; called by ingest after a run that wrote rows."""
+    CACHE.clear()
+
+class BadRequest(ValueError):
+    """Invalid request parameter, answered with 400."""
+
+def encode_cursor(values):
+    """Opaque pagination cursor holding the sort key of the last row of a page."""
+    return base64.urlsafe_b64encode(json.dumps(values, default=json_value).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, length):
+    """Sort key values of a cursor from encode_cursor(); raises BadRequest if it is not one."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise BadRequest("invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise BadRequest("invalid cursor")
+    return values
+
+def json_value(value):
+    """JSON representation of the DECIMAL and DATETIME values PyMySQL returns."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def page_size(params, default, maximum):
+    """The `limit` parameter, bounded by `maximum`."""
+    try:
+        limit = int(params.get('limit', default))
+    except ValueError:
+        raise BadRequest("limit must be an integer")
+    if limit < 1:
+        raise BadRequest("limit must be positive")
+    return min(limit, maximum)
+
+def parse_time(params, name):
+    """An ISO 8601 date or datetime parameter (UTC), or None if absent."""
+    if name not in params:
+        return None
+    try:
+        return datetime.fromisoformat(params[name])
+    except ValueError:
+        raise BadRequest(f"{name} must be an ISO 8601 date or datetime")
+
+def weather_columns(alias, indent):
+    """Decoded weather values and descriptions of the weather table joined as `alias`."""
+    return (f"{weather_variables.select_list(weather_variables.VARIABLES, prefix=f'{alias}.', indent=indent)},\n"
+            f"{weather_codes.description_columns('c', indent=indent)}")
+
+def latest_query(where, order_by=None, limit=False):
+    """SELECT of towns with their latest weather."""
+    indent = ' ' * 12
+    town_columns = ', '.join(f"t.{column}" for column in TOWN_COLUMNS)
+    query = f"""
+            SELECT {town_columns}, l.timestamp,
+{weather_columns('l', indent)}
+            FROM `{TOWN_TABLE}` t
+            JOIN `{LATEST_TABLE}` l ON l.town_id = t.id
+            {weather_codes.join_clause('l.weather_code')}
+            WHERE {where}
+    """
+    if order_by:
+        query += f"            ORDER BY {', '.join(f't.{column}' for column in order_by)}\n"
+    if limit:
+        query += "            LIMIT %s\n"
+    return query
+
+def keyset_condition(columns, values):
+    """
+    SQL and parameters for "(columns) > (values)" in ORDER BY order, expanded
+    to `a > %s OR (a = %s AND (b > %s OR ...))` so MySQL can use it as an
+    index range. The town columns are nullable and MySQL sorts NULL first,
+    so a NULL cursor value continues with `a IS NOT NULL OR (a IS NULL AND ...)`
+    instead of a comparison with NULL that is never true.
+    """
+    column, *rest = columns
+    value = values[0]
+    if value is None:
+        greater, equal, value_parameters = f"t.{column} IS NOT NULL", f"t.{column} IS NULL", []
+    else:
+        greater, equal, value_parameters = f"t.{column} > %s", f"t.{column} = %s", [value]
+    if not rest:
+        return greater, value_parameters
+    condition, parameters = keyset_condition(rest, values[1:])
+    return f"({greater} OR ({equal} AND {condition}))", value_parameters * 2 + parameters
+
+def latest_page(connection, params):
+    """
+    One page of the latest weather of all towns, or of a country or region.
+    The filters fix a prefix of TOWN_KEY and the page continues after the
+    cursor on the remaining key columns, which keeps the filter and the
+    keyset one range of the (country, region, name, id) index.
+    """
+    filters = []
+    if 'country' in params:
+        filters.append(params['country'])
+        if 'region' in params:
+            filters.append(params['region'])
+    elif 'region' in params:
+        raise BadRequest("region requires country")
+    limit = page_size(params, API_PAGE_SIZE, API_MAX_PAGE_SIZE)
+
+    fixed = TOWN_KEY[:len(filters)]
+    remaining = TOWN_KEY[len(filters):]
+    conditions = [f"t.{column} = %s" for column in fixed]
+    values = list(filters)
+    if 'after' in params:
+        condition, parameters = keyset_condition(remaining, decode_cursor(params['after'], len(remaining)))
+        conditions.append(condition)
+        values += parameters
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(latest_query(' AND '.join(conditions) or 'TRUE', remaining, limit=True), values + [limit + 1])
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    # One extra row tells whether there is a next page
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][column] for column in remaining])
+    return {'items': rows, 'next': next_cursor}
+
+def check_page_plan(connection):
+    """
+    EXPLAIN a first and a follow-up page of /latest and return warnings if
+    either would read the towns without an index or sort them with a filesort.
+    """
+    condition, parameters = keyset_condition(TOWN_KEY, ['', '', '', 0])
+    pages = [('first page', 'TRUE', []), ('next page', condition, parameters)]
+    warnings = []
+    cursor = connection.cursor()
+    try:
+        for page, where, values in pages:
+            cursor.execute("EXPLAIN " + latest_query(where, TOWN_KEY, limit=True), values + [API_PAGE_SIZE + 1])
+            steps = cursor.fetchall()
+            if any('filesort' in (step['Extra'] or '') for step in steps):
+                warnings.append(f"the {page} of /latest sorts with a filesort")
+            if any(step['table'] == 't' and not step['key'] for step in steps):
+                warnings.append(f"the {page} of /latest reads {TOWN_TABLE} without an index")
+    finally:
+        cursor.close()
+    return warnings
+
+def report_page_plan():
+    """Print the warnings of check_page_plan(), pointing at create_indexes.py."""
+    try:
+        with get_pool().connection() as connection:
+            warnings = check_page_plan(connection)
+    except Error as e:
+        print(f"⚠️  Could not explain the /latest page query: {e}")
+        return
+    for warning in warnings:
+        print(f"⚠️  {warning}; run create_indexes.py --apply for the (country, region, name, id) index")
+
+def town_latest(connection, town_id):
+    """Latest weather of one town, or None if the town has none."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(latest_query('t.id = %s'), (town_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+def town_series(connection, town_id, params):
+    """One page of the observations of a town between `since` and `until`, oldest first."""
+    limit = page_size(params, API_SERIES_PAGE_SIZE, API_SERIES_MAX_PAGE_SIZE)
+    since = parse_time(params, 'since')
+    until = parse_time(params, 'until')
+
+    conditions = ['w.town_id = %s']
+    values = [town_id]
+    if 'after' in params:
+        after = decode_cursor(params['after'], 1)[0]
+        try:
+            since = datetime.fromisoformat(after)
+        except (TypeError, ValueError):
+            raise BadRequest("invalid cursor")
+        conditions.append('w.timestamp > %s')
+        values.append(since)
+    elif since:
+        conditions.append('w.timestamp >= %s')
+        values.append(since)
+    if until:
+        conditions.append('w.timestamp < %s')
+        values.append(until)
+
+    indent = ' ' * 12
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT w.timestamp,
+{weather_columns('w', indent)}
+            FROM `{WEATHER_TABLE}` w
+            {weather_codes.join_clause('w.weather_code')}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY w.timestamp
+            LIMIT %s
+        """, values + [limit + 1])
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]['timestamp']])
+    return {'town_id': town_id, 'items': rows, 'next': next_cursor}
+
+def route(path, params):
+    """
+    The handler of a request path: a function taking a connection and
+    returning the response object, or None if the path is unknown.
+    """
+    parts = [part for part in path.split('/') if part]
+    if parts == ['latest']:
+        return lambda connection: latest_page(connection, params)
+    if len(parts) == 3 and parts[0] == 'towns':
+        try:
+            town_id = int(parts[1])
+        except ValueError:
+            raise BadRequest("town id must be an integer")
+        if parts[2] == 'latest':
+            return lambda connection: town_latest(connection, town_id)
+        if parts[2] == 'series':
+            return lambda connection: town_series(connection, town_id, params)
+    return None
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Serves the read API as JSON, from CACHE where possible."""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/health':
+            self.send_json(200, b'{"status": "ok"}')
+            return
+        # Repeated parameters keep their last value
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        key = (url.path, tuple(sorted(params.items())))
+
+        try:
+            DATA_VERSION.check(get_pool().connection)
+        except Error as e:
+            # Stale answers beat none; the next request checks again
+            print(f"⚠️  API could not check for new weather data: {e}")
+
+        body = CACHE.get(key)
+        if body is None:
+            try:
+                handler = route(url.path, params)
+                if handler is None:
+                    self.send_json(404, b'{"error": "not found"}')
+                    return
+                with get_pool().connection() as connection:
+                    result = handler(connection)
+            except BadRequest as e:
+                self.send_json(400, json.dumps({'error': str(e)}).encode())
+                return
+            except Error as e:
+                print(f"❌ API query for {self.path} failed: {e}")
+                self.send_json(503, b'{"error": "database unavailable"}')
+                return
+            if result is None:
+                self.send_json(404, b'{"error": "no weather for this town"}')
+                return
+            body = json.dumps(result, default=json_value, ensure_ascii=False).encode()
+            CACHE.put(key, body)
+        self.send_json(200, body)
+
+    def send_json(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Requests are too frequent to log
+        pass
+
+def start_server(port=API_PORT):
+    """Serve the API from a daemon thread. Returns the server, or None if disabled."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(('0.0.0.0', port), ApiHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='weather-api', daemon=True).start()
+    print(f"✅ Weather API served on http://0.0.0.0:{port}/latest")
+    report_page_plan()
+    return server
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Serve the weather read API.")
+    parser.add_argument('--port', type=int, default=API_PORT or 8080, help="Port to listen on")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('0.0.0.0', args.port), ApiHandler)
+    server.daemon_threads = True
+    print(f"✅ Weather API served on http://0.0.0.0:{args.port}/latest")
+    report_page_plan()
+    print("Press Ctrl+C to exit.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nWeather API stopped by user.")
+    finally:
+        server.server_close()
+        get_pool().close()
+        print("\n✅ Database connection closed.")
+
+if __name__ == '__main__':
+    main()
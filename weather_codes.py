@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+German descriptions of the WMO weather interpretation codes, as a module
+constant and as a small lookup table that views and queries join on
+weather_code (the compact weather layout stores no description per row).
+"""
+
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+WEATHER_CODE_TABLE = os.getenv('DB_WEATHER_CODE_TABLE', 'weather_codes')
+
+# WMO code: (description, weather_main)
+WMO_CODES = {
+    0: ("Klarer Himmel", "Klar"),
+    1: ("Überwiegend klar", "Klar"),
+    2: ("Teilweise bewölkt", "Bewölkt"),
+    3: ("Bedeckt", "Bewölkt"),
+    45: ("Nebelig", "Nebel"),
+    48: ("Rime-Nebel", "Nebel"),
+    51: ("Leichter Niesel", "Niesel"),
+    53: ("Mäßiger Niesel", "Niesel"),
+    55: ("Dichter Niesel", "Niesel"),
+    61: ("Schwacher Regen", "Regen"),
+    63: ("Mäßiger Regen", "Regen"),
+    65: ("Starker Regen", "Regen"),
+    71: ("Schwacher Schneefall", "Schnee"),
+    73: ("Mäßiger Schneefall", "Schnee"),
+    75: ("Starker Schneefall", "Schnee"),
+    77: ("Schneekörner", "Schnee"),
+    80: ("Schwache Regenschauer", "Regen"),
+    81: ("Mäßige Regenschauer", "Regen"),
+    82: ("Heftige Regenschauer", "Regen"),
+    85: ("Schwache Schneeschauer", "Schnee"),
+    86: ("Starke Schneeschauer", "Schnee"),
+    95: ("Gewitter", "Gewitter"),
+    96: ("Gewitter mit leichtem Hagel", "Gewitter"),
+    99: ("Gewitter mit schweren Hagel", "Gewitter"),
+}
+
+UNKNOWN = ("Unbekannt", "Unbekannt")
+
+def create_weather_code_table(connection):
+    """Create the WMO code lookup table and bring its rows in line with WMO_CODES."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{WEATHER_CODE_TABLE}` (
+            code TINYINT UNSIGNED PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            weather_main VARCHAR(50) NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        cursor.executemany(
+            f"INSERT INTO `{WEATHER_CODE_TABLE}` (code, description, weather_main) VALUES (%s, %s, %s) "
+            f"ON DUPLICATE KEY UPDATE description = VALUES(description), weather_main = VALUES(weather_main)",
+            [(code, description, main) for code, (description, main) in WMO_CODES.items()]
+        )
+        connection.commit()
+        print(f"✅ Table '{WEATHER_CODE_TABLE}' created or up to date ({len(WMO_CODES)} codes).")
+    finally:
+        cursor.close()
+
+def description_columns(alias='c', indent=''):
+    """SELECT columns for description and weather_main from a lookup table joined as `alias`."""
+    return (f"{indent}COALESCE({alias}.description, '{UNKNOWN[0]}') AS description,\n"
+            f"{indent}COALESCE({alias}.weather_main, '{UNKNOWN[1]}') AS weather_main")
+
+def join_clause(code_column, alias='c'):
+    """LEFT JOIN of the lookup table on a weather code column."""
+    return f"LEFT JOIN `{WEATHER_CODE_TABLE}` {alias} ON {alias}.code = {code_column}"
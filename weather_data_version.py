@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Version counter of the stored weather, one row bumped by every ingest run
+and backfill chunk that wrote rows. Readers that cache query results (the
+weather API) compare it by primary key instead of scanning the data tables
+to notice new rows.
+"""
+
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+DATA_VERSION_TABLE = os.getenv('DB_DATA_VERSION_TABLE', 'weather_data_version')
+# Key of the single row; the table could version other data sets later
+WEATHER_KEY = 'weather'
+
+def create_version_table(connection):
+    """Create the data version table."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{DATA_VERSION_TABLE}` (
+            name VARCHAR(32) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        connection.commit()
+        print(f"✅ Table '{DATA_VERSION_TABLE}' created or already exists.")
+    finally:
+        cursor.close()
+
+def bump(connection):
+    """Count one more change of the stored weather."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"INSERT INTO `{DATA_VERSION_TABLE}` (name, version) VALUES (%s, 1) "
+            f"ON DUPLICATE KEY UPDATE version = version + 1",
+            (WEATHER_KEY,)
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+
+def current(connection):
+    """The current version of the stored weather; 0 before the first bump."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT version FROM `{DATA_VERSION_TABLE}` WHERE name = %s", (WEATHER_KEY,))
+        row = cursor.fetchone()
+        return row['version'] if row else 0
+    finally:
+        cursor.close()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+One-row-per-town table holding the latest observation of every town.
+Ingest upserts it next to the history table, replacing a town's row only
+with an observation at least as new as the stored one, so late or
+out-of-order writes never move it back in time. "Current weather" reads go
+to this table (a few thousand rows) instead of grouping the history.
+"""
+
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+LATEST_TABLE = os.getenv('DB_WEATHER_LATEST_TABLE', 'weather_latest')
+
+def create_query(columns):
+    """CREATE TABLE statement of the latest table with the weather table's columns [(name, sql_type)]."""
+    definitions = ',\n'.join(f"        {name} {sql_type}" for name, sql_type in columns)
+    return f"""
+    CREATE TABLE IF NOT EXISTS `{LATEST_TABLE}` (
+        town_id INT NOT NULL PRIMARY KEY,
+        timestamp DATETIME NOT NULL,
+{definitions},
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_timestamp (timestamp)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """
+
+def drop_latest_table(connection):
+    """Drop the latest table; it only holds rows derived from the history."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS `{LATEST_TABLE}`")
+        connection.commit()
+    finally:
+        cursor.close()
+
+def newer_upsert_clause(update_columns):
+    """
+    ON DUPLICATE KEY UPDATE clause that only takes the new values when the
+    new timestamp is not older. Assignments are evaluated left to right, so
+    `timestamp` has to be assigned last.
+    """
+    newer = "VALUES(timestamp) >= timestamp"
+    assignments = [f"    {column} = IF({newer}, VALUES({column}), {column})"
+                   for column in update_columns if column != 'timestamp']
+    assignments.append(f"    updated_at = IF({newer}, CURRENT_TIMESTAMP, updated_at)")
+    assignments.append("    timestamp = GREATEST(timestamp, VALUES(timestamp))")
+    return "ON DUPLICATE KEY UPDATE\n" + ',\n'.join(assignments)
+
+class LatestLoader:
+    """
+    Multi-row upsert into the latest table, usable with
+    weather_loader.load_chunks() for its per-chunk error handling.
+    """
+
+    name = 'latest'
+
+    def load(self, connection, table, columns, rows, update_columns, chunk_rows=None):
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        cursor = connection.cursor()
+        try:
+            for start in range(0, len(rows), chunk_rows or len(rows) or 1):
+                chunk = rows[start:start + chunk_rows] if chunk_rows else rows
+                cursor.execute(f"""
+                INSERT INTO `{table}`
+                ({', '.join(columns)})
+                VALUES {','.join([placeholders] * len(chunk))}
+                {newer_upsert_clause(update_columns)}
+                """, [value for row in chunk for value in row])
+                connection.commit()
+            return len(rows)
+        finally:
+            cursor.close()
+
+LATEST_LOADER = LatestLoader()
+
+def latest_rows(rows):
+    """Keep only the newest of several rows per town ((town_id, timestamp, ...) tuples)."""
+    newest = {}
+    for row in rows:
+        current = newest.get(row[0])
+        if current is None or row[1] >= current[1]:
+            newest[row[0]] = row
+    return list(newest.values())
+
+def seed_latest(connection, history_table, columns):
+    """
+    Fill an empty latest table from the newest history row of every town,
+    e.g. on the first start after upgrading. Returns the number of rows copied.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT 1 FROM `{LATEST_TABLE}` LIMIT 1")
+        if cursor.fetchone():
+            return 0
+        column_list = ', '.join(columns)
+        history_columns = ', '.join(f"w.{column}" for column in columns)
+        copied = cursor.execute(f"""
+            INSERT INTO `{LATEST_TABLE}` ({column_list})
+            SELECT {history_columns}
+            FROM `{history_table}` w
+            JOIN (
+                SELECT town_id, MAX(timestamp) AS timestamp
+                FROM `{history_table}`
+                GROUP BY town_id
+            ) newest ON newest.town_id = w.town_id AND newest.timestamp = w.timestamp
+        """)
+        connection.commit()
+        if copied:
+            print(f"✅ Seeded '{LATEST_TABLE}' with the latest observation of {copied} towns.")
+        return copied
+    finally:
+        cursor.close()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pluggable bulk-write backends for weather rows.
+All loaders upsert rows (tuples in `columns` order) into a table keyed by a
+unique key, updating `update_columns` on duplicates:
+
+- multirow:    multi-row INSERT ... ON DUPLICATE KEY UPDATE statements
+- executemany: chunked cursor.executemany() (PyMySQL batches the rows itself)
+- load_data:   TSV file streamed with LOAD DATA LOCAL INFILE into a temporary
+               staging table, then merged with one INSERT ... SELECT
+
+select_loader() picks one by row count unless WEATHER_LOADER forces a backend;
+load_chunks() writes chunk by chunk and handles errors per chunk.
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+from pymysql import Error
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Forced backend (multirow, executemany, load_data) or 'auto'
+WEATHER_LOADER = os.getenv('WEATHER_LOADER', 'auto')
+# Row counts from which the faster backends are used
+EXECUTEMANY_MIN_ROWS = int(os.getenv('LOADER_EXECUTEMANY_MIN_ROWS', 500))
+LOAD_DATA_MIN_ROWS = int(os.getenv('LOADER_LOAD_DATA_MIN_ROWS', 20000))
+# LOAD DATA LOCAL INFILE must also be enabled on the server (local_infile=ON)
+LOCAL_INFILE = os.getenv('DB_LOCAL_INFILE', 'false').lower() in ('1', 'true', 'yes')
+# Retries of a chunk after a transient error, with doubling pauses
+LOAD_RETRIES = int(os.getenv('LOADER_RETRIES', 3))
+LOAD_RETRY_SECONDS = float(os.getenv('LOADER_RETRY_SECONDS', 0.5))
+
+# MySQL error codes by how a failed chunk is handled:
+# transient (deadlock, lock wait timeout, server gone away, lost connection) are retried,
+TRANSIENT_ERRORS = {1205, 1213, 2006, 2013}
+CONNECTION_ERRORS = {2006, 2013}
+# bad values are isolated by splitting the chunk and skipping the offending rows,
+DATA_ERRORS = {1048, 1264, 1265, 1292, 1366, 1406}
+# and an unknown column triggers a schema migration before retrying
+UNKNOWN_COLUMN = 1054
+
+def upsert_clause(update_columns, indent='    '):
+    """ON DUPLICATE KEY UPDATE clause refreshing `update_columns` and updated_at."""
+    assignments = [f"{indent}{column} = VALUES({column})" for column in update_columns]
+    assignments.append(f"{indent}updated_at = CURRENT_TIMESTAMP")
+    return "ON DUPLICATE KEY UPDATE\n" + ',\n'.join(assignments)
+
+class MultiRowLoader:
+    """One multi-row INSERT per chunk of `chunk_rows` rows."""
+
+    name = 'multirow'
+
+    def load(self, connection, table, columns, rows, update_columns, chunk_rows=None):
+        placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+        cursor = connection.cursor()
+        try:
+            for start in range(0, len(rows), chunk_rows or len(rows) or 1):
+                chunk = rows[start:start + chunk_rows] if chunk_rows else rows
+                insert_query = f"""
+                INSERT INTO `{table}`
+                ({', '.join(columns)})
+                VALUES {','.join([placeholders] * len(chunk))}
+                {upsert_clause(update_columns)}
+                """
+                cursor.execute(insert_query, [value for row in chunk for value in row])
+                connection.commit()
+            return len(rows)
+        finally:
+            cursor.close()
+
+class ExecuteManyLoader:
+    """
+    Chunked executemany(). PyMySQL rewrites an INSERT ... VALUES executemany
+    into multi-row statements itself, without building a parameter list
+    per statement in Python.
+    """
+
+    name = 'executemany'
+
+    def load(self, connection, table, columns, rows, update_columns, chunk_rows=None):
+        insert_query = (
+            f"INSERT INTO `{table}` ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"{upsert_clause(update_columns, indent=' ')}"
+        )
+        cursor = connection.cursor()
+        try:
+            for start in range(0, len(rows), chunk_rows or len(rows) or 1):
+                chunk = rows[start:start + chunk_rows] if chunk_rows else rows
+                cursor.executemany(insert_query, chunk)
+                connection.commit()
+            return len(rows)
+        finally:
+            cursor.close()
+
+def tsv_value(value):
+    """Render one value in LOAD DATA's default TSV format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    text = str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+class LoadDataLoader:
+    """
+    Stream rows as TSV through LOAD DATA LOCAL INFILE into a temporary
+    staging table, then merge them in one set-based INSERT ... SELECT.
+    PyMySQL reads LOCAL INFILE data from a file path, so the TSV goes to a
+    temporary file instead of an in-memory buffer.
+    """
+
+    name = 'load_data'
+
+    def load(self, connection, table, columns, rows, update_columns, chunk_rows=None):
+        staging_table = f"{table}_staging"
+        column_list = ', '.join(columns)
+        cursor = connection.cursor()
+        path = None
+        try:
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tsv', delete=False) as tsv:
+                path = tsv.name
+                for row in rows:
+                    tsv.write('\t'.join(tsv_value(value) for value in row))
+                    tsv.write('\n')
+
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{staging_table}`")
+            # Temporary tables cannot be partitioned, so copy the column types only (not CREATE ... LIKE)
+            cursor.execute(f"CREATE TEMPORARY TABLE `{staging_table}` SELECT {column_list} FROM `{table}` LIMIT 0")
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE `{staging_table}` "
+                f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                f"({column_list})",
+                (path,)
+            )
+            cursor.execute(f"""
+                INSERT INTO `{table}` ({column_list})
+                SELECT {column_list} FROM `{staging_table}`
+                {upsert_clause(update_columns)}
+            """)
+            connection.commit()
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{staging_table}`")
+            return len(rows)
+        finally:
+            cursor.close()
+            if path:
+                os.unlink(path)
+
+LOADERS = {loader.name: loader for loader in (MultiRowLoader(), ExecuteManyLoader(), LoadDataLoader())}
+
+def select_loader(row_count, name=None):
+    """Loader for `row_count` rows: forced by WEATHER_LOADER, otherwise by size."""
+    name = name or WEATHER_LOADER
+    if name != 'auto':
+        if name not in LOADERS:
+            raise ValueError(f"Unknown loader '{name}', expected one of {sorted(LOADERS)} or 'auto'")
+        return LOADERS[name]
+    if LOCAL_INFILE and row_count >= LOAD_DATA_MIN_ROWS:
+        return LOADERS['load_data']
+    if row_count >= EXECUTEMANY_MIN_ROWS:
+        return LOADERS['executemany']
+    return LOADERS['multirow']
+
+def error_code(error):
+    """MySQL error number of a PyMySQL exception, or None."""
+    return error.args[0] if error.args and isinstance(error.args[0], int) else None
+
+def load_chunk(connection, loader, table, columns, rows, update_columns, migrate=None):
+    """
+    Write one chunk, handling failures by error class: transient errors are
+    retried with backoff (reconnecting after a lost connection), an unknown
+    column runs `migrate(connection)` once and retries, and data errors are
+    narrowed down by splitting the chunk until the bad rows can be skipped.
+    Other errors propagate. Returns the number of rows written.
+    """
+    migrated = False
+    attempt = 0
+    while True:
+        try:
+            return loader.load(connection, table, columns, rows, update_columns)
+        except Error as e:
+            code = error_code(e)
+            try:
+                connection.rollback()
+            except Error:
+                pass
+
+            if code in TRANSIENT_ERRORS and attempt < LOAD_RETRIES:
+                attempt += 1
+                print(f"  ⚠️  Transient error writing {len(rows)} rows to '{table}' ({e}), "
+                      f"retry {attempt}/{LOAD_RETRIES}")
+                time.sleep(LOAD_RETRY_SECONDS * 2 ** (attempt - 1))
+                if code in CONNECTION_ERRORS:
+                    connection.ping(reconnect=True)
+                continue
+
+            if code == UNKNOWN_COLUMN and migrate and not migrated:
+                print(f"  ⚠️  {e}; migrating '{table}' and retrying")
+                migrate(connection)
+                migrated = True
+                continue
+
+            if code in DATA_ERRORS:
+                if len(rows) == 1:
+                    print(f"  ❌ Skipping row rejected by '{table}' ({e}): {rows[0][:2]}")
+                    return 0
+                middle = len(rows) // 2
+                return (load_chunk(connection, loader, table, columns, rows[:middle], update_columns, migrate)
+                        + load_chunk(connection, loader, table, columns, rows[middle:], update_columns, migrate))
+            raise
+
+def load_chunks(connection, loader, table, columns, rows, update_columns, chunk_rows=None, migrate=None):
+    """
+    Write rows in chunks of `chunk_rows` with per-chunk error handling
+    (see load_chunk), so a failing chunk neither loses the committed ones
+    nor aborts the rest. Returns the number of rows written.
+    """
+    written = 0
+    step = chunk_rows or len(rows) or 1
+    for start in range(0, len(rows), step):
+        written += load_chunk(connection, loader, table, columns, rows[start:start + step], update_columns, migrate)
+    return written
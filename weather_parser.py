@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming, columnar parsing of multi-location Open-Meteo responses.
+Locations are decoded one at a time from the response stream and their
+values appended to one array.array per variable, so no per-location
+result dict is built and the full document is never held in memory.
+"""
+
+import codecs
+import json
+import math
+import time
+from array import array
+from datetime import datetime, timezone
+from functools import lru_cache
+from weather_variables import get_profile, is_integer
+
+NAN = math.nan
+READ_CHUNK_SIZE = 64 * 1024
+
+class WeatherColumns:
+    """
+    Columnar buffer of weather observations: one float array per column,
+    missing values stored as NaN, plus the observation time of every row
+    as Unix seconds (UTC). `variables` defaults to the configured weather profile.
+    """
+
+    def __init__(self, variables=None):
+        self.variables = variables or get_profile()
+        self.columns = {variable.column: array('d') for variable in self.variables}
+        self.integer_columns = {variable.column for variable in self.variables if is_integer(variable)}
+        self.timestamps = array('d')
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append_current(self, current):
+        """
+        Append one location's `current` block. Its `time` (requested with
+        timeformat=unixtime) is the model's observation time; the current
+        time is only used if the response lacks it.
+        """
+        for variable in self.variables:
+            value = current.get(variable.api_name)
+            self.columns[variable.column].append(NAN if value is None else value)
+        observed = current.get('time')
+        self.timestamps.append(time.time() if observed is None else observed)
+
+    def observation_time(self, row):
+        """Observation time of a row as naive UTC datetime (DATETIME column value)."""
+        return utc_datetime(self.timestamps[row])
+
+    def extend(self, other):
+        """Append all rows of another buffer with the same fields."""
+        for column, values in self.columns.items():
+            values.extend(other.columns[column])
+        self.timestamps.extend(other.timestamps)
+
+    def value(self, column, row):
+        """Value of one cell as a database parameter (None for missing)."""
+        value = self.columns[column][row]
+        if value != value:
+            return None
+        return int(value) if column in self.integer_columns else value
+
+@lru_cache(maxsize=1024)
+def utc_datetime(unix_seconds):
+    """Naive UTC datetime for Unix seconds; cached since a run shares few distinct times."""
+    return datetime.fromtimestamp(unix_seconds, timezone.utc).replace(tzinfo=None)
+
+def iter_json_array(chunks):
+    """
+    Decode the elements of a top-level JSON array from an iterable of byte
+    chunks, yielding each element as soon as it is complete. A top-level
+    object (single-location response) is yielded as the only element.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    in_array = None
+
+    for chunk in chunks:
+        buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+        if in_array is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                continue
+            in_array = stripped[0] == '['
+            pos = len(buffer) - len(stripped) + (1 if in_array else 0)
+        if not in_array:
+            continue
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer) or buffer[pos] == ']':
+                break
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element continues in the next chunk
+                break
+            yield element
+            pos = end
+
+    buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+    if in_array is None:
+        raise ValueError("Empty response body")
+    if not in_array:
+        yield json.loads(buffer)
+    elif buffer.strip() != ']':
+        raise ValueError(f"Truncated JSON array in response: {buffer[:80]!r}")
+
+def parse_current_chunks(chunks, variables=None):
+    """Decode the body chunks of a multi-location `current` response into a WeatherColumns buffer."""
+    weather = WeatherColumns(variables)
+    for location in iter_json_array(chunks):
+        weather.append_current(location.get('current', {}))
+    return weather
+
+def parse_current_response(response, variables=None):
+    """Stream a multi-location `current` response into a WeatherColumns buffer."""
+    return parse_current_chunks(response.iter_content(chunk_size=READ_CHUNK_SIZE), variables)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Optional RANGE partitioning of the weather table on `timestamp`, by month
+or by week, with partition maintenance: future partitions are created ahead
+of time and partitions older than the retention period are dropped, which
+is an instant metadata operation instead of a large DELETE.
+
+Partitions are named p<YYYYMMDD> after their exclusive upper bound; the
+first one holds all older rows and `pmax` catches rows beyond the last bound.
+"""
+
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# '' (unpartitioned), 'month' or 'week'
+WEATHER_PARTITIONING = os.getenv('WEATHER_PARTITIONING', '').lower()
+# Partitions whose rows are all older than this are dropped; 0 keeps everything
+WEATHER_RETENTION_DAYS = int(os.getenv('WEATHER_RETENTION_DAYS', 0))
+# Number of future periods that always have a partition
+PARTITIONS_AHEAD = int(os.getenv('WEATHER_PARTITIONS_AHEAD', 3))
+
+MAX_PARTITION = 'pmax'
+
+def enabled():
+    """Whether the weather table is partitioned."""
+    if WEATHER_PARTITIONING not in ('', 'month', 'week'):
+        raise ValueError(f"Unknown WEATHER_PARTITIONING '{WEATHER_PARTITIONING}', expected 'month' or 'week'")
+    return bool(WEATHER_PARTITIONING)
+
+def period_start(day, unit=None):
+    """First day of the month or week (Monday) containing `day`."""
+    unit = unit or WEATHER_PARTITIONING
+    if unit == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def next_period(start, unit=None):
+    """First day of the period after the one starting at `start`."""
+    unit = unit or WEATHER_PARTITIONING
+    if unit == 'week':
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+def partition_name(bound):
+    """Name of the partition with exclusive upper bound `bound`."""
+    return f"p{bound:%Y%m%d}"
+
+def partition_definition(bound):
+    """Definition of the partition holding rows below `bound`."""
+    return f"PARTITION {partition_name(bound)} VALUES LESS THAN ('{bound:%Y-%m-%d}')"
+
+def upcoming_bounds(today=None, ahead=PARTITIONS_AHEAD):
+    """Upper bounds of the current period and the next `ahead` periods."""
+    bound = next_period(period_start(today or date.today()))
+    bounds = [bound]
+    for _ in range(ahead):
+        bound = next_period(bound)
+        bounds.append(bound)
+    return bounds
+
+def partition_clause(today=None):
+    """PARTITION BY clause for a new table: older rows, current and upcoming periods, catch-all."""
+    today = today or date.today()
+    bounds = [period_start(today)] + upcoming_bounds(today)
+    definitions = [partition_definition(bound) for bound in bounds]
+    definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return "PARTITION BY RANGE COLUMNS(timestamp) (\n        " + ",\n        ".join(definitions) + "\n    )"
+
+def existing_partitions(connection, table):
+    """Partition bounds of `table`: {name: upper bound date or None for MAXVALUE}; empty if unpartitioned."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound FROM INFORMATION_SCHEMA.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            (table,)
+        )
+        partitions = {}
+        for row in cursor.fetchall():
+            bound = row['bound'].strip("'")
+            partitions[row['name']] = None if bound == 'MAXVALUE' else datetime.strptime(bound[:10], '%Y-%m-%d').date()
+        return partitions
+    finally:
+        cursor.close()
+
+def partition_table(connection, table, today=None):
+    """
+    Partition an existing unpartitioned table. The primary key has to
+    include the partitioning column, so it becomes (id, timestamp) first.
+    This rebuilds the table (copying rows) once.
+    """
+    cursor = connection.cursor()
+    try:
+        print(f"Partitioning '{table}' by {WEATHER_PARTITIONING} (rebuilds the table once)...")
+        cursor.execute(f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+        cursor.execute(f"ALTER TABLE `{table}` {partition_clause(today)}")
+        connection.commit()
+        print(f"✅ Table '{table}' partitioned by {WEATHER_PARTITIONING}.")
+    finally:
+        cursor.close()
+
+def ensure_partitioned(connection, table, today=None):
+    """Partition the table if partitioning is enabled and it is not partitioned yet."""
+    if enabled() and not existing_partitions(connection, table):
+        partition_table(connection, table, today)
+
+def maintain_partitions(connection, table, today=None):
+    """
+    Create the partitions of the upcoming periods (split off the empty
+    catch-all partition) and drop the partitions past the retention period.
+    Returns (partitions added, partitions dropped).
+    """
+    partitions = existing_partitions(connection, table)
+    if not partitions:
+        return 0, 0
+    today = today or date.today()
+    cursor = connection.cursor()
+    try:
+        last_bound = max(bound for bound in partitions.values() if bound)
+        missing = [bound for bound in upcoming_bounds(today) if bound > last_bound]
+        if missing:
+            definitions = [partition_definition(bound) for bound in missing]
+            definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+            cursor.execute(
+                f"ALTER TABLE `{table}` REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(definitions)})"
+            )
+            print(f"✅ Added partitions {', '.join(partition_name(bound) for bound in missing)} to '{table}'.")
+
+        expired = []
+        if WEATHER_RETENTION_DAYS > 0:
+            cutoff = today - timedelta(days=WEATHER_RETENTION_DAYS)
+            # Every partition holds rows below its bound, so it expires once the bound passes the cutoff
+            expired = [name for name, bound in partitions.items() if bound and bound <= cutoff]
+            if expired:
+                cursor.execute(f"ALTER TABLE `{table}` DROP PARTITION {', '.join(expired)}")
+                print(f"✅ Dropped expired partitions {', '.join(expired)} from '{table}'.")
+        connection.commit()
+        return len(missing), len(expired)
+    finally:
+        cursor.close()
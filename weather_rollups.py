@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hourly and daily rollups of the weather history per town: temperature
+min/max/mean, precipitation sums, gust maxima and radiation totals.
+Ingest recomputes only the buckets its rows fall into, hourly buckets from
+the raw rows and daily buckets from the hourly ones, so reruns and late
+rows keep the rollups exact and long-range reports read a few rows per day
+instead of every observation.
+"""
+
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+from dotenv import load_dotenv
+import weather_schema
+import weather_variables
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+WEATHER_ROLLUPS = os.getenv('WEATHER_ROLLUPS', 'true').lower() in ('1', 'true', 'yes')
+HOURLY_TABLE = os.getenv('DB_WEATHER_HOURLY_TABLE', 'weather_hourly')
+DAILY_TABLE = os.getenv('DB_WEATHER_DAILY_TABLE', 'weather_daily')
+# Town ids per recompute statement
+ROLLUP_TOWNS_PER_STATEMENT = int(os.getenv('ROLLUP_TOWNS_PER_STATEMENT', 1000))
+
+# column:   rollup table column
+# hourly:   aggregate over the raw rows of an hour ({column} reads a weather column's value)
+# daily:    aggregate over the hourly rows of a day (samples = raw rows per hour)
+# sql_type: MySQL column type
+Rollup = namedtuple('Rollup', ['column', 'hourly', 'daily', 'sql_type'])
+
+# Radiation is a mean power (W/m²), so the hourly mean is the energy of that
+# hour in Wh/m² and the daily total is the sum of the hourly ones.
+ROLLUPS = [
+    Rollup('temperature_min', 'MIN({temperature})', 'MIN(temperature_min)', 'DECIMAL(5, 2)'),
+    Rollup('temperature_max', 'MAX({temperature})', 'MAX(temperature_max)', 'DECIMAL(5, 2)'),
+    Rollup('temperature_mean', 'AVG({temperature})',
+           'SUM(temperature_mean * samples) / SUM(IF(temperature_mean IS NULL, 0, samples))', 'DECIMAL(5, 2)'),
+    Rollup('precipitation_sum', 'SUM({precipitation})', 'SUM(precipitation_sum)', 'DECIMAL(7, 2)'),
+    Rollup('wind_gusts_max', 'MAX({wind_gusts})', 'MAX(wind_gusts_max)', 'DECIMAL(5, 2)'),
+    Rollup('shortwave_radiation_sum', 'AVG({shortwave_radiation})',
+           'SUM(shortwave_radiation_sum)', 'DECIMAL(9, 2)'),
+    Rollup('direct_radiation_sum', 'AVG({direct_radiation})',
+           'SUM(direct_radiation_sum)', 'DECIMAL(9, 2)'),
+    Rollup('diffuse_radiation_sum', 'AVG({diffuse_radiation})',
+           'SUM(diffuse_radiation_sum)', 'DECIMAL(9, 2)'),
+]
+
+def rollup_columns():
+    """Aggregate columns of both rollup tables as (name, sql_type), following `samples`."""
+    return [(rollup.column, rollup.sql_type) for rollup in ROLLUPS]
+
+def create_rollup_tables(connection):
+    """Create or migrate the hourly and daily rollup tables."""
+    definitions = ',\n'.join(f"            {rollup.column} {rollup.sql_type}" for rollup in ROLLUPS)
+    for table, bucket, bucket_type in ((HOURLY_TABLE, 'hour', 'DATETIME'), (DAILY_TABLE, 'day', 'DATE')):
+        create_table_query = f"""
+        CREATE TABLE IF NOT EXISTS `{table}` (
+            town_id INT NOT NULL,
+            {bucket} {bucket_type} NOT NULL,
+            samples INT NOT NULL,
+{definitions},
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (town_id, {bucket}),
+            INDEX idx_{bucket} ({bucket})
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """
+        changes = weather_schema.migrate(connection, table, create_table_query, rollup_columns(), after='samples')
+        print(f"✅ Table '{table}' created or up to date ({changes} migrations applied).")
+
+def hour_start(timestamp):
+    """Start of the hour containing `timestamp`."""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def day_start(timestamp):
+    """Start of the day containing `timestamp`."""
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+def touched_spans(timestamps_by_town, bucket_start, bucket_length):
+    """
+    Group towns by the span of buckets their timestamps fall into:
+    {(first bucket start, end of last bucket): [town_id]}. Rows of one
+    ingest share their observation times, so this yields a few groups only.
+    """
+    spans = {}
+    for town_id, timestamps in timestamps_by_town.items():
+        span = (bucket_start(min(timestamps)), bucket_start(max(timestamps)) + bucket_length)
+        spans.setdefault(span, []).append(town_id)
+    return spans
+
+def refresh_buckets(cursor, spans, table, bucket, bucket_expression, source_table, time_column, aggregates):
+    """Recompute the rollup rows of every town in `spans` within its span, chunk by chunk."""
+    columns = [rollup.column for rollup in ROLLUPS]
+    assignments = ',\n'.join(f"                {column} = VALUES({column})" for column in ['samples'] + columns)
+    for (start, end), town_ids in spans.items():
+        for offset in range(0, len(town_ids), ROLLUP_TOWNS_PER_STATEMENT):
+            chunk = town_ids[offset:offset + ROLLUP_TOWNS_PER_STATEMENT]
+            cursor.execute(f"""
+                INSERT INTO `{table}` (town_id, {bucket}, samples, {', '.join(columns)})
+                SELECT town_id, {bucket_expression}, {aggregates[0]}, {', '.join(aggregates[1:])}
+                FROM `{source_table}`
+                WHERE {time_column} >= %s AND {time_column} < %s
+                  AND town_id IN ({', '.join(['%s'] * len(chunk))})
+                GROUP BY town_id, {bucket_expression}
+                ON DUPLICATE KEY UPDATE
+{assignments}
+            """, [start, end] + chunk)
+
+def update_rollups(connection, weather_table, rows):
+    """
+    Recompute the hourly and daily rollups touched by written weather rows
+    ((town_id, timestamp, ...) tuples): hours from the raw rows in
+    `weather_table`, then days from the hourly table.
+    """
+    if not WEATHER_ROLLUPS or not rows:
+        return
+    timestamps_by_town = {}
+    for row in rows:
+        timestamps_by_town.setdefault(row[0], []).append(row[1])
+
+    cursor = connection.cursor()
+    try:
+        # Aggregate the values, not the scaled integers of the compact layout
+        values = {variable.column: weather_variables.value_expression(variable)
+                  for variable in weather_variables.VARIABLES}
+        refresh_buckets(
+            cursor, touched_spans(timestamps_by_town, hour_start, timedelta(hours=1)),
+            HOURLY_TABLE, 'hour', 'TIMESTAMP(DATE(timestamp), MAKETIME(HOUR(timestamp), 0, 0))',
+            weather_table, 'timestamp', ['COUNT(*)'] + [rollup.hourly.format(**values) for rollup in ROLLUPS]
+        )
+        refresh_buckets(
+            cursor, touched_spans(timestamps_by_town, day_start, timedelta(days=1)),
+            DAILY_TABLE, 'day', 'DATE(hour)',
+            HOURLY_TABLE, 'hour', ['SUM(samples)'] + [rollup.daily for rollup in ROLLUPS]
+        )
+        connection.commit()
+    finally:
+        cursor.close()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Non-destructive schema migration for the tables generated from the
+variable registry. Tables are never dropped: the live columns are read from
+INFORMATION_SCHEMA, compared with the expected definition, and differences
+are applied with ALTER TABLE using online DDL (ALGORITHM=INSTANT, then
+INPLACE with LOCK=NONE) where the server supports it. Versioned migrations
+for changes a column diff cannot express are recorded per table in
+SCHEMA_VERSION_TABLE.
+"""
+
+import os
+import re
+from pathlib import Path
+from dotenv import load_dotenv
+from pymysql import Error
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+SCHEMA_VERSION_TABLE = os.getenv('DB_SCHEMA_VERSION_TABLE', 'schema_version')
+
+# Online DDL variants tried in order; the last one lets the server pick
+ALTER_ALGORITHMS = [', ALGORITHM=INSTANT', ', ALGORITHM=INPLACE, LOCK=NONE', '']
+
+INTEGER_DISPLAY_WIDTH = re.compile(r'^(tinyint|smallint|mediumint|int|bigint)\(\d+\)')
+
+def normalize_type(sql_type):
+    """Comparable form of a column type ('DECIMAL(5, 2)' and 'decimal(5,2)' are equal)."""
+    normalized = sql_type.lower().replace(' ', '')
+    # MySQL < 8.0.19 reports integer display widths, e.g. int(11)
+    return INTEGER_DISPLAY_WIDTH.sub(r'\1', normalized)
+
+def live_columns(connection, table):
+    """Columns of an existing table in ordinal order: [(name, column type)]."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT COLUMN_NAME AS name, COLUMN_TYPE AS type FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (table,)
+        )
+        return [(row['name'], row['type']) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def column_changes(live, expected, after=None):
+    """
+    ALTER TABLE clauses turning the live columns into the expected ones.
+    `expected` is [(name, sql_type)] in table order, following column `after`.
+    Missing columns are added after their predecessor and columns whose type
+    differs are modified; columns not in `expected` are kept untouched.
+    """
+    live_types = {name.lower(): column_type for name, column_type in live}
+    changes = []
+    previous = after
+    for name, sql_type in expected:
+        if name.lower() not in live_types:
+            position = f" AFTER `{previous}`" if previous else ""
+            changes.append(f"ADD COLUMN `{name}` {sql_type}{position}")
+        elif normalize_type(live_types[name.lower()]) != normalize_type(sql_type):
+            changes.append(f"MODIFY COLUMN `{name}` {sql_type}")
+        previous = name
+    return changes
+
+def alter_table(connection, table, clause):
+    """Apply one ALTER TABLE clause with the least locking algorithm the server accepts."""
+    cursor = connection.cursor()
+    try:
+        for index, algorithm in enumerate(ALTER_ALGORITHMS):
+            try:
+                cursor.execute(f"ALTER TABLE `{table}` {clause}{algorithm}")
+                connection.commit()
+                return algorithm.lstrip(', ') or 'default'
+            except Error:
+                if index == len(ALTER_ALGORITHMS) - 1:
+                    raise
+    finally:
+        cursor.close()
+
+def sync_columns(connection, table, expected, after=None):
+    """Add missing and retype changed columns of `table`. Returns the applied clauses."""
+    changes = column_changes(live_columns(connection, table), expected, after)
+    for clause in changes:
+        algorithm = alter_table(connection, table, clause)
+        print(f"✅ Migrated '{table}': {clause} ({algorithm})")
+    return changes
+
+def index_names(connection, table):
+    """Names of the indexes of an existing table."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            "SELECT DISTINCT INDEX_NAME AS name FROM INFORMATION_SCHEMA.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,)
+        )
+        return {row['name'] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def drop_index(connection, table, name):
+    """Drop an index if it exists (online where supported). Returns whether it was dropped."""
+    if name not in index_names(connection, table):
+        return False
+    algorithm = alter_table(connection, table, f"DROP INDEX `{name}`")
+    print(f"✅ Migrated '{table}': DROP INDEX `{name}` ({algorithm})")
+    return True
+
+def add_index(connection, table, name, columns):
+    """Add an index if it does not exist (online where supported). Returns whether it was added."""
+    if name in index_names(connection, table):
+        return False
+    algorithm = alter_table(connection, table, f"ADD INDEX `{name}` ({columns})")
+    print(f"✅ Migrated '{table}': ADD INDEX `{name}` ({algorithm})")
+    return True
+
+def create_version_table(connection):
+    """Create the table recording the schema version per table."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{SCHEMA_VERSION_TABLE}` (
+            table_name VARCHAR(64) PRIMARY KEY,
+            version INT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+        """)
+        connection.commit()
+    finally:
+        cursor.close()
+
+def schema_version(connection, table):
+    """Recorded schema version of `table`, 0 if none."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT version FROM `{SCHEMA_VERSION_TABLE}` WHERE table_name = %s", (table,))
+        row = cursor.fetchone()
+        return row['version'] if row else 0
+    finally:
+        cursor.close()
+
+def set_schema_version(connection, table, version):
+    """Record the schema version of `table`."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"INSERT INTO `{SCHEMA_VERSION_TABLE}` (table_name, version) VALUES (%s, %s) "
+            f"ON DUPLICATE KEY UPDATE version = VALUES(version)",
+            (table, version)
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+
+def migrate(connection, table, create_query, expected, after=None, migrations=()):
+    """
+    Bring `table` up to date without dropping it: create it if missing,
+    apply the versioned `migrations` ((version, description, function(connection, table)))
+    newer than the recorded version, then sync the columns with `expected`
+    ([(name, sql_type)] following column `after`).
+    Returns the number of changes applied.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(create_query)
+        connection.commit()
+    finally:
+        cursor.close()
+
+    create_version_table(connection)
+    version = schema_version(connection, table)
+    applied = 0
+    for migration_version, description, function in sorted(migrations, key=lambda migration: migration[0]):
+        if migration_version <= version:
+            continue
+        print(f"Migrating '{table}' to version {migration_version}: {description}...")
+        function(connection, table)
+        set_schema_version(connection, table, migration_version)
+        applied += 1
+
+    applied += len(sync_columns(connection, table, expected, after))
+    return applied
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Single registry of the Open-Meteo weather variables stored by this project.
+The request parameters, response parsing, weather table schema, INSERT
+statements and views are all generated from VARIABLES, and named profiles
+select the subset a run requests and stores.
+"""
+
+import os
+from collections import namedtuple
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+env_path = Path(__file__).parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# api_name:     Open-Meteo variable name
+# column:       weather table column
+# sql_type:     MySQL column type
+# scale:        fixed-point factor of the stored value (10 ** decimal places)
+# compact_type: integer column type holding value * scale in the compact layout
+WeatherVariable = namedtuple('WeatherVariable', ['api_name', 'column', 'sql_type', 'scale', 'compact_type'])
+
+VARIABLES = [
+    WeatherVariable('temperature_2m', 'temperature', 'DECIMAL(5, 2)', 100, 'SMALLINT'),
+    WeatherVariable('relative_humidity_2m', 'relative_humidity', 'INT', 1, 'TINYINT UNSIGNED'),
+    WeatherVariable('apparent_temperature', 'apparent_temperature', 'DECIMAL(5, 2)', 100, 'SMALLINT'),
+    WeatherVariable('weather_code', 'weather_code', 'INT', 1, 'TINYINT UNSIGNED'),
+    WeatherVariable('wind_speed_10m', 'wind_speed', 'DECIMAL(5, 2)', 100, 'SMALLINT UNSIGNED'),
+    WeatherVariable('wind_direction_10m', 'wind_direction', 'INT', 1, 'SMALLINT UNSIGNED'),
+    WeatherVariable('wind_gusts_10m', 'wind_gusts', 'DECIMAL(5, 2)', 100, 'SMALLINT UNSIGNED'),
+    WeatherVariable('pressure_msl', 'pressure_msl', 'INT', 1, 'SMALLINT UNSIGNED'),
+    WeatherVariable('cloud_cover', 'cloud_cover', 'INT', 1, 'TINYINT UNSIGNED'),
+    WeatherVariable('uv_index', 'uv_index', 'DECIMAL(4, 2)', 100, 'SMALLINT UNSIGNED'),
+    WeatherVariable('is_day', 'is_day', 'INT', 1, 'TINYINT UNSIGNED'),
+    WeatherVariable('precipitation', 'precipitation', 'DECIMAL(5, 2)', 100, 'SMALLINT UNSIGNED'),
+    WeatherVariable('precipitation_probability', 'precipitation_probability', 'INT', 1, 'TINYINT UNSIGNED'),
+    WeatherVariable('dew_point_2m', 'dew_point', 'DECIMAL(5, 2)', 100, 'SMALLINT'),
+    WeatherVariable('visibility', 'visibility', 'INT', 1, 'MEDIUMINT UNSIGNED'),
+    WeatherVariable('soil_temperature_0cm', 'soil_temperature_0cm', 'DECIMAL(5, 2)', 100, 'SMALLINT'),
+    WeatherVariable('soil_moisture_0_1cm', 'soil_moisture_0_1cm', 'DECIMAL(5, 2)', 100, 'SMALLINT UNSIGNED'),
+    WeatherVariable('shortwave_radiation', 'shortwave_radiation', 'DECIMAL(8, 2)', 100, 'MEDIUMINT UNSIGNED'),
+    WeatherVariable('direct_radiation', 'direct_radiation', 'DECIMAL(8, 2)', 100, 'MEDIUMINT UNSIGNED'),
+    WeatherVariable('diffuse_radiation', 'diffuse_radiation', 'DECIMAL(8, 2)', 100, 'MEDIUMINT UNSIGNED'),
+    WeatherVariable('direct_normal_irradiance', 'direct_normal_irradiance', 'DECIMAL(8, 2)', 100,
+                    'MEDIUMINT UNSIGNED'),
+]
+
+VARIABLES_BY_COLUMN = {variable.column: variable for variable in VARIABLES}
+
+# Named variable profiles (weather table columns). Every profile keeps
+# weather_code so description and weather_main can still be derived.
+PROFILES = {
+    'full': [variable.column for variable in VARIABLES],
+    'light': ['temperature', 'relative_humidity', 'weather_code', 'wind_speed', 'precipitation'],
+}
+
+# Variables the historical archive API does not provide (forecast-only
+# fields, or soil layers archived at different depths); backfilled rows leave them NULL
+ARCHIVE_UNAVAILABLE = {
+    'uv_index', 'precipitation_probability', 'visibility', 'soil_temperature_0cm', 'soil_moisture_0_1cm'
+}
+
+# Profile requested and stored by the fetch job
+WEATHER_PROFILE = os.getenv('WEATHER_PROFILE', 'full')
+
+# Opt-in compact weather table layout: every value stored as the integer
+# value * scale in its compact_type, and description/weather_main looked
+# up from weather_code instead of being stored per row
+WEATHER_COMPACT = os.getenv('WEATHER_COMPACT', 'false').lower() in ('1', 'true', 'yes')
+
+def get_profile(name=None):
+    """Variables of a named profile, in registry order."""
+    name = name or WEATHER_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown weather profile '{name}', expected one of {sorted(PROFILES)}")
+    columns = set(PROFILES[name])
+    return [variable for variable in VARIABLES if variable.column in columns]
+
+def archive_profile(name=None):
+    """Variables of a named profile that the archive API can backfill."""
+    return [variable for variable in get_profile(name) if variable.column not in ARCHIVE_UNAVAILABLE]
+
+def is_integer(variable):
+    """Whether the variable is stored in an integer column."""
+    return variable.sql_type.split('(')[0].upper() in ('TINYINT', 'SMALLINT', 'MEDIUMINT', 'INT', 'BIGINT')
+
+def api_parameter(variables):
+    """Comma-separated variable list for the `current=` / `hourly=` request parameter."""
+    return ','.join(variable.api_name for variable in variables)
+
+def storage_type(variable, compact=False):
+    """Column type of the variable in the decimal or compact layout."""
+    return variable.compact_type if compact else variable.sql_type
+
+def stored_scale(variable, compact=None):
+    """Factor between a value and its stored form (1 outside the compact layout)."""
+    compact = WEATHER_COMPACT if compact is None else compact
+    return variable.scale if compact else 1
+
+def column_definitions(variables=VARIABLES, indent='        ', compact=False):
+    """Column definitions for CREATE TABLE, one per line."""
+    return ',\n'.join(f"{indent}{variable.column} {storage_type(variable, compact)}" for variable in variables)
+
+def value_expression(variable, prefix='', compact=None):
+    """SQL expression reading a stored weather column back as a value of its sql_type."""
+    if stored_scale(variable, compact) > 1:
+        return f"CAST({prefix}{variable.column} / {variable.scale} AS {variable.sql_type})"
+    return f"{prefix}{variable.column}"
+
+def select_list(variables=VARIABLES, prefix='', indent='', compact=None):
+    """Comma-separated decoded weather columns for a SELECT, named after the columns."""
+    return ',\n'.join(
+        f"{indent}{value_expression(variable, prefix, compact)} AS {variable.column}" for variable in variables
+    )
+
+def column_list(variables, prefix=''):
+    """Comma-separated column names, optionally qualified with a table alias."""
+    return ', '.join(f"{prefix}{variable.column}" for variable in variables)
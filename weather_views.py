@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DDL of the views joining towns with their weather: towns_weather_view over
+the history and towns_weather_latest_view over the latest table. Values are
+read back through the variable registry, so the views have to be recreated
+whenever the weather table changes layout (create_view.py,
+compact_weather_table.py).
+"""
+
+import weather_codes
+from weather_variables import VARIABLES, select_list
+
+HISTORY_VIEW = 'towns_weather_view'
+LATEST_VIEW = 'towns_weather_latest_view'
+
+def view_queries(town_table, weather_table, latest_table):
+    """CREATE OR REPLACE VIEW statements as [(view name, query)] for the current layout."""
+    indent = ' ' * 16
+    # Explicitly select all columns to avoid duplicate 'id' column names
+    # Values are read back through the registry (scaled integers in the compact
+    # layout) and the descriptions come from the WMO code lookup table
+    history = f"""
+            CREATE OR REPLACE VIEW {HISTORY_VIEW} AS
+            SELECT
+                t.id as town_id,
+                t.name,
+                t.population,
+                t.latitude,
+                t.longitude,
+                t.elevation,
+                t.country,
+                t.region,
+                w.id as weather_id,
+                w.town_id as weather_town_id,
+                w.timestamp,
+{select_list(VARIABLES, prefix='w.', indent=indent)},
+{weather_codes.description_columns('c', indent=indent)},
+                w.created_at,
+                w.updated_at
+            FROM {town_table} t
+            INNER JOIN {weather_table} w ON t.id = w.town_id
+            {weather_codes.join_clause('w.weather_code')}
+        """
+
+    # Current weather per town from the one-row-per-town latest table
+    latest = f"""
+            CREATE OR REPLACE VIEW {LATEST_VIEW} AS
+            SELECT
+                t.id as town_id,
+                t.name,
+                t.population,
+                t.latitude,
+                t.longitude,
+                t.elevation,
+                t.country,
+                t.region,
+                l.timestamp,
+{select_list(VARIABLES, prefix='l.', indent=indent)},
+{weather_codes.description_columns('c', indent=indent)},
+                l.updated_at
+            FROM {town_table} t
+            INNER JOIN {latest_table} l ON t.id = l.town_id
+            {weather_codes.join_clause('l.weather_code')}
+        """
+    return [(HISTORY_VIEW, history), (LATEST_VIEW, latest)]
+
+def create_views(connection, town_table, weather_table, latest_table):
+    """Recreate both views on a PyMySQL connection."""
+    cursor = connection.cursor()
+    try:
+        for name, query in view_queries(town_table, weather_table, latest_table):
+            cursor.execute(query)
+            print(f"✅ View '{name}' recreated.")
+        connection.commit()
+    finally:
+        cursor.close()